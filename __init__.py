@@ -1,30 +1,99 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-import uuid
 import os
-from dotenv import load_dotenv
-from .db.models import Database, Feed, Article, Narrative, MCPEntry
+import json
+import time
+import threading
+from .metrics import REGISTRY, histogram, start_trace, finish_trace, recent_traces
+
+# Importing the package does no work: Flask, the models and the web modules are
+# imported by create_app(), so workers and CLI jobs that only need app.db or
+# app.agents don't pay for them, and the application is only built when asked for.
+
+HTTP_REQUEST_SECONDS = histogram('blackstrap_http_request_seconds', 'Time handling requests, by route',
+                                 ['endpoint', 'method', 'status'])
+
+def get_db():
+    """Connection for the current request, released when the app context ends"""
+    from flask import g
+    from .db.models import Database
+    if 'db' not in g:
+        g.db = Database().get_connection()
+    return g.db
 
 def create_app():
+    from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, g, stream_with_context
+    from dotenv import load_dotenv
+    from .db.models import Feed, Narrative, Feedback, Job, Search, Rating, LIST_SORTS
+    from .jobs import SynthesisJobQueue
+    from .api import api
+    from .pagecache import PageCache
+    
     # Load environment variables from .env file
     load_dotenv()
     
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     
-    # Initialize database
-    Database()
+    # Background synthesis workers
+    app.extensions['synthesis_jobs'] = SynthesisJobQueue()
+    
+    # JSON API
+    app.register_blueprint(api)
+    
+    # Rendered pages, dropped when the data behind them changes
+    page_cache = PageCache()
+    app.extensions['page_cache'] = page_cache
+    
+    def list_sort() -> str:
+        """?sort= for feed and narrative listings: newest (default) or rating"""
+        sort = request.args.get('sort', 'newest')
+        return sort if sort in LIST_SORTS else 'newest'
+    
+    # METRICS_TRACE: 1 (default) traces requests sent with "X-Trace: 1", all traces every request, 0 none
+    trace_mode = os.environ.get('METRICS_TRACE', '1')
+    
+    @app.before_request
+    def start_request_timing():
+        g.request_started = time.perf_counter()
+        if trace_mode == 'all' or (trace_mode == '1' and request.headers.get('X-Trace') == '1'):
+            g.trace_token = start_trace(f"{request.method} {request.full_path}")
+    
+    @app.after_request
+    def record_request_timing(response):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                     endpoint=endpoint, method=request.method, status=response.status_code)
+        token = g.pop('trace_token', None)
+        if token is not None:
+            # Per-stage totals for browser dev tools; the full trace is at /metrics/traces
+            response.headers['Server-Timing'] = finish_trace(token).server_timing()
+        return response
+    
+    @app.teardown_request
+    def finish_failed_trace(exception):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            finish_trace(token)
+    
+    @app.teardown_appcontext
+    def release_db(exception):
+        conn = g.pop('db', None)
+        if conn is not None:
+            conn.close()
     
     @app.route('/')
+    @page_cache.cached(lambda: ["feeds"])
     def index():
         """Main dashboard showing feeds and recent narratives"""
-        feeds = Feed.get_all()
-        return render_template('index.html', feeds=feeds)
+        sort = list_sort()
+        page = Feed.list_page(cursor=request.args.get('cursor'), sort=sort)
+        return render_template('index.html', feeds=page['items'], next_cursor=page['next_cursor'], sort=sort)
     
     @app.route('/feeds')
     def feeds():
         """Feed management page"""
-        feeds = Feed.get_all()
-        return render_template('feeds.html', feeds=feeds)
+        sort = list_sort()
+        page = Feed.list_page(cursor=request.args.get('cursor'), sort=sort)
+        return render_template('feeds.html', feeds=page['items'], next_cursor=page['next_cursor'], sort=sort)
     
     @app.route('/feeds/new', methods=['GET', 'POST'])
     def new_feed():
@@ -34,46 +103,145 @@ def create_app():
             topic = request.form.get('topic')
             guidance = request.form.get('guidance', '')
             sources = request.form.getlist('sources')
+            source_urls = [line.strip() for line in request.form.get('source_urls', '').splitlines() if line.strip()]
             
-            if name and topic:
-                feed_id = Feed.create(name, topic, guidance, sources)
+            if not (name and topic):
+                flash('Name and topic are required.', 'error')
+            elif any(not url.startswith(('http://', 'https://')) for url in source_urls):
+                flash('RSS feed URLs must start with http:// or https://.', 'error')
+            else:
+                # Listing feed URLs implies wanting the RSS source
+                if source_urls and 'rss' not in sources:
+                    sources.append('rss')
+                feed_id = Feed.create(name, topic, guidance, sources, source_urls)
                 flash(f'Feed "{name}" created successfully!', 'success')
                 return redirect(url_for('index'))
-            else:
-                flash('Name and topic are required.', 'error')
         
         return render_template('new_feed.html')
     
     @app.route('/narratives/<feed_id>')
+    @page_cache.cached(lambda feed_id: [f"feed:{feed_id}"])
     def narratives(feed_id):
         """View narratives for a specific feed"""
-        narratives = Narrative.get_by_feed(feed_id)
-        return render_template('narratives.html', narratives=narratives, feed_id=feed_id)
+        sort = list_sort()
+        page = Narrative.list_by_feed(feed_id, cursor=request.args.get('cursor'), sort=sort)
+        active_job = Job.get_active(SynthesisJobQueue.JOB_TYPE, feed_id)
+        return render_template('narratives.html', narratives=page['items'], next_cursor=page['next_cursor'],
+                               feed_id=feed_id, active_job=active_job, sort=sort)
+    
+    @app.route('/narrative/<narrative_id>')
+    @page_cache.cached(lambda narrative_id: [f"narrative:{narrative_id}"])
+    def narrative(narrative_id):
+        """Read one narrative in full"""
+        narrative = Narrative.get(narrative_id)
+        if not narrative:
+            flash('Narrative not found', 'error')
+            return redirect(url_for('index'))
+        return render_template('narrative.html', narrative=narrative, rating=Rating.for_narrative(narrative_id))
     
     @app.route('/synthesize/<feed_id>', methods=['POST'])
     def synthesize(feed_id):
-        """Trigger synthesis for a feed"""
-        try:
-            # Get feed details
-            conn = Database().get_connection()
-            feed_row = conn.execute('SELECT name, topic, guidance FROM feeds WHERE id = ?', (feed_id,)).fetchone()
-            conn.close()
+        """Queue synthesis for a feed; the work runs in the background"""
+        wants_json = request.accept_mimetypes.best == 'application/json'
+        
+        feed_row = get_db().execute('SELECT name, topic, guidance FROM feeds WHERE id = ?', (feed_id,)).fetchone()
+        if not feed_row:
+            app.logger.warning(f"Feed not found: {feed_id}")
+            if wants_json:
+                return jsonify({'error': 'Feed not found'}), 404
+            flash('Feed not found', 'error')
+            return redirect(url_for('narratives', feed_id=feed_id))
+        
+        job = app.extensions['synthesis_jobs'].submit(feed_id)
+        if wants_json:
+            return jsonify(job), 202
+        
+        if job['created']:
+            flash('Synthesis has begun. The new narrative will appear here when it is ready.', 'success')
+        else:
+            flash('A synthesis for this feed is already under way.', 'info')
+        return redirect(url_for('narratives', feed_id=feed_id))
+    
+    @app.route('/synthesize/<feed_id>/stream')
+    def synthesize_stream(feed_id):
+        """Run synthesis inside the request and stream the narrative as Server-Sent Events"""
+        feed = Feed.get(feed_id)
+        if not feed:
+            return jsonify({'error': 'Feed not found'}), 404
+        
+        # Registered as a job so it can't overlap a background synthesis of the same feed
+        job = Job.create(SynthesisJobQueue.JOB_TYPE, feed_id)
+        
+        def event(name, data):
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+        
+        def generate():
+            if not job['created']:
+                yield event('busy', {'job_id': job['id'], 'status_url': url_for('job_status', job_id=job['id'])})
+                return
             
-            if feed_row:
-                app.logger.info(f"Starting synthesis for feed {feed_id}: {feed_row['topic']}")
+            from .agents.llm import LLMError
+            Job.mark_running(job['id'])
+            finished = False
+            try:
                 from .agents.synthesizer import SynthesizerAgent
                 synthesizer = SynthesizerAgent()
-                narrative_id = synthesizer.synthesize_narrative(feed_id, feed_row['topic'], feed_row['guidance'] or "")
-                app.logger.info(f"Synthesis completed successfully. Narrative ID: {narrative_id}")
-                flash('New narrative synthesized successfully!', 'success')
-            else:
-                app.logger.warning(f"Feed not found: {feed_id}")
-                flash('Feed not found', 'error')
-        except Exception as e:
-            app.logger.exception(f"Synthesis failed for feed {feed_id}")
-            flash(f'Synthesis failed: {str(e)}', 'error')
+                for kind, value in synthesizer.stream_narrative(feed_id, feed['topic'], feed['guidance'] or ""):
+                    if kind == 'token':
+                        yield event('token', {'text': value})
+                    else:
+                        Job.mark_finished(job['id'], result_id=value)
+                        finished = True
+                        yield event('done', {'narrative_id': value})
+            except LLMError as e:
+                # Nothing was saved; tokens already shown are discarded by the page
+                app.logger.warning(f"Streaming synthesis failed for feed {feed_id}: {str(e)}")
+                Job.mark_finished(job['id'], error=str(e))
+                finished = True
+                yield event('error', {'error': str(e)})
+            except Exception as e:
+                app.logger.exception(f"Streaming synthesis failed for feed {feed_id}")
+                Job.mark_finished(job['id'], error=str(e) or type(e).__name__)
+                finished = True
+                yield event('error', {'error': str(e) or type(e).__name__})
+            finally:
+                if not finished:
+                    # The browser went away mid-stream; nothing was saved
+                    Job.mark_finished(job['id'], error='Client disconnected before synthesis finished')
         
-        return redirect(url_for('narratives', feed_id=feed_id))
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    @app.route('/search')
+    def search():
+        """Full-text search over articles and narratives"""
+        query = request.args.get('q', '').strip()
+        articles = Search.articles(query) if query else []
+        narratives = Search.narratives(query) if query else []
+        return render_template('search.html', query=query, articles=articles, narratives=narratives)
+    
+    @app.route('/cache/stats')
+    def cache_stats():
+        """Page cache size and hit rate"""
+        return jsonify(page_cache.stats())
+    
+    @app.route('/metrics')
+    def metrics():
+        """Counters and timing histograms in the Prometheus text format"""
+        return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    
+    @app.route('/metrics/traces')
+    def traces():
+        """The most recent request and synthesis job traces, span by span"""
+        return jsonify(recent_traces())
+    
+    @app.route('/jobs/<job_id>')
+    def job_status(job_id):
+        """Poll the status of a background job"""
+        job = Job.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
 
     @app.route('/feedback/<narrative_id>', methods=['POST'])
     def feedback(narrative_id):
@@ -82,32 +250,35 @@ def create_app():
         rating = request.form.get('rating')
         
         if notes or rating:
-            from .db.models import Database
-            conn = Database().get_connection()
-            conn.execute('''
-                INSERT INTO feedback (id, narrative_id, notes, rating)
-                VALUES (?, ?, ?, ?)
-            ''', (str(uuid.uuid4()), narrative_id, notes, int(rating) if rating else None))
-            conn.commit()
-            conn.close()
+            Feedback.create(narrative_id, notes, int(rating) if rating else None)
             flash('Thank you for your feedback!', 'success')
         
-        # Redirect back to narratives page
-        conn = Database().get_connection()
-        narrative_row = conn.execute('SELECT feed_id FROM narratives WHERE id = ?', (narrative_id,)).fetchone()
-        conn.close()
+        # Redirect back to the narrative
+        narrative_row = get_db().execute('SELECT 1 FROM narratives WHERE id = ?', (narrative_id,)).fetchone()
         
         if narrative_row:
-            return redirect(url_for('narratives', feed_id=narrative_row['feed_id']))
+            return redirect(url_for('narrative', narrative_id=narrative_id))
         else:
             return redirect(url_for('index'))
 
     return app
 
+_app = None
+_app_lock = threading.Lock()
+
+def __getattr__(name: str):
+    """
+    `from app import app` (WSGI servers, check_env.py) builds the application
+    on first access instead of at import time, and reuses it afterwards.
+    """
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
 
-# Create the app instance for import
-app = create_app()
 if __name__ == '__main__':
-    app = create_app()
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
 
@@ -0,0 +1,136 @@
+import gzip
+import json
+import hashlib
+from typing import Callable, Tuple
+from flask import Blueprint, Response, request, jsonify
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+from .db.models import Feed, Article, Narrative, Search, LIST_SORTS
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# Largest page any list endpoint returns
+MAX_LIMIT = 100
+SEARCH_TYPES = ('all', 'articles', 'narratives')
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 500
+
+def _limit(default: int = 20) -> int:
+    """?limit= clamped to 1..MAX_LIMIT"""
+    try:
+        return max(1, min(int(request.args.get('limit', default)), MAX_LIMIT))
+    except ValueError:
+        return default
+
+def _sort() -> str:
+    """?sort= for feed and narrative listings: newest (default) or rating"""
+    sort = request.args.get('sort', 'newest')
+    return sort if sort in LIST_SORTS else 'newest'
+
+def _conditional(version: Tuple, build: Callable) -> Response:
+    """
+    Answer with a weak ETag derived from the request URL and a version
+    fingerprint of the rows behind it. If the client already holds that
+    ETag, return 304 without calling build(); otherwise build() the JSON body.
+    Clients must revalidate (no-cache), so a poll that finds nothing new
+    costs one small version query.
+    """
+    etag = hashlib.sha1(json.dumps([request.full_path, *version], default=str).encode("utf-8")).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@api.after_request
+def compress(response: Response) -> Response:
+    """Brotli or gzip JSON responses for clients that accept them"""
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if BROTLI_AVAILABLE and accepted['br']:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@api.route('/feeds')
+def feeds():
+    """Feeds with their mean rating, newest or best rated first: ?sort=newest|rating&cursor=&limit="""
+    return _conditional(
+        Feed.version(),
+        lambda: Feed.list_page(limit=_limit(), cursor=request.args.get('cursor'), sort=_sort())
+    )
+
+@api.route('/feeds/<feed_id>')
+def feed(feed_id):
+    version = Feed.version(feed_id)
+    if not version[0]:
+        return jsonify({'error': 'Feed not found'}), 404
+
+    def build():
+        feed = Feed.get(feed_id)
+        feed['sources'] = json.loads(feed['sources']) if feed['sources'] else []
+        feed['source_urls'] = json.loads(feed['source_urls']) if feed['source_urls'] else []
+        return feed
+    return _conditional(version, build)
+
+@api.route('/feeds/<feed_id>/narratives')
+def feed_narratives(feed_id):
+    """
+    A feed's narratives (id, title, created_at, mean rating), newest or best
+    rated first: ?sort=newest|rating&cursor=&limit=
+    """
+    return _conditional(
+        Narrative.version(feed_id=feed_id),
+        lambda: Narrative.list_by_feed(feed_id, limit=_limit(), cursor=request.args.get('cursor'), sort=_sort())
+    )
+
+@api.route('/feeds/<feed_id>/articles')
+def feed_articles(feed_id):
+    """A feed's articles without abstracts, most recently fetched first: ?cursor=&limit="""
+    return _conditional(
+        Article.version(feed_id),
+        lambda: Article.list_by_feed(feed_id, limit=_limit(), cursor=request.args.get('cursor'))
+    )
+
+@api.route('/narratives/<narrative_id>')
+def narrative(narrative_id):
+    """One narrative with its full content"""
+    version = Narrative.version(narrative_id=narrative_id)
+    if not version[0]:
+        return jsonify({'error': 'Narrative not found'}), 404
+
+    return _conditional(version, lambda: Narrative.get(narrative_id))
+
+@api.route('/search')
+def search():
+    """Full-text search: ?q=<words>&type=all|articles|narratives&feed_id=&limit="""
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'all')
+    if kind not in SEARCH_TYPES:
+        return jsonify({'error': f"type must be one of {', '.join(SEARCH_TYPES)}"}), 400
+
+    feed_id = request.args.get('feed_id') or None
+    limit = _limit()
+    results = {'query': query}
+    if kind in ('all', 'articles'):
+        results['articles'] = Search.articles(query, limit=limit, feed_id=feed_id)
+    if kind in ('all', 'narratives'):
+        results['narratives'] = Search.narratives(query, limit=limit, feed_id=feed_id)
+    return jsonify(results)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Page-load benchmark for Blackstrap's database layer.
+Seeds a throwaway database and measures requests/sec on the dashboard (/)
+and a feed's narratives page (/narratives/<feed_id>) through Flask's test
+client. The page cache is switched off (PAGE_CACHE_MAX_BYTES=0) so every
+request renders from the database, which also keeps runs comparable with
+trees that predate the cache; --page-cache leaves it on to measure cached
+page loads instead. The app is imported from the working directory, so
+to compare against an earlier commit, check that commit out in a worktree
+and run this script from there:
+
+    git worktree add /tmp/before <base-commit>
+    (cd /tmp/before && python "$OLDPWD/bench_db.py" --label before)
+    python bench_db.py --label after
+    git worktree remove /tmp/before
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+def seed(feeds: int, narratives: int) -> str:
+    """Create feeds plus narratives for one of them; returns that feed's ID"""
+    from app.db.models import Feed, Narrative
+
+    feed_id = None
+    for i in range(feeds):
+        feed_id = Feed.create(f"Feed {i}", f"Topic {i}", "Some guidance", ["arxiv"])
+    for i in range(narratives):
+        Narrative.create(feed_id, f"Narrative {i}", "Lorem ipsum dolor sit amet. " * 40, [])
+    return feed_id
+
+def measure(client, path: str, requests: int) -> float:
+    """Return requests/sec for GETs against path"""
+    client.get(path)  # warm up templates and connections
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200, f"{path} returned {response.status_code}"
+    return requests / (time.perf_counter() - start)
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--label", default="current", help="Name for this run in the output")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per route")
+    parser.add_argument("--feeds", type=int, default=20)
+    parser.add_argument("--narratives", type=int, default=20)
+    parser.add_argument("--page-cache", action="store_true",
+                        help="Leave the page cache on, so repeated requests are served from it")
+    args = parser.parse_args()
+
+    # The app writes blackstrap.db into the working directory, so work in a scratch one
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="blackstrap-bench-"))
+    if not args.page_cache:
+        os.environ["PAGE_CACHE_MAX_BYTES"] = "0"
+
+    from app import create_app
+    flask_app = create_app()
+    feed_id = seed(args.feeds, args.narratives)
+    client = flask_app.test_client()
+
+    results = {
+        "label": args.label,
+        "requests": args.requests,
+        "page_cache": args.page_cache,
+        "index_rps": round(measure(client, "/", args.requests), 1),
+        "narratives_rps": round(measure(client, f"/narratives/{feed_id}", args.requests), 1),
+    }
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the seek -> synthesize pipeline and the web app.
+Runs entirely offline: the scholarly library and the arXiv and RSS HTTP
+sessions are replaced by the fakes in stubs.py (install_fake_sources) and
+OpenAI by FakeOpenAIClient, each with configurable latency. Three phases run under concurrent load in a
+throwaway database:
+
+  seek        SeekerAgent.seek_articles for each feed
+  synthesize  SynthesizerAgent.synthesize_narrative (seeking first, by default)
+  routes      GETs on the dashboard, narrative pages, JSON API and search
+
+The page cache is switched off (PAGE_CACHE_MAX_BYTES=0) so route timings
+include rendering; --page-cache leaves it on.
+
+Each phase reports p50/p95/p99 latency, throughput, errors and the write
+statements and commits it issued; row counts per table are reported at the
+end. Output is one JSON object, so runs can be saved and diffed. The app is
+imported from the working directory, so to compare against an earlier
+commit, check that commit out in a worktree and run this script from there:
+
+    git worktree add /tmp/before <base-commit>
+    (cd /tmp/before && python "$OLDPWD/bench_pipeline.py" --label before > "$OLDPWD/before.json")
+    python bench_pipeline.py --label after > after.json
+    git worktree remove /tmp/before
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+WRITE_STATEMENT = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+class WriteCounter:
+    """Counts write statements and commits on every pooled connection, via sqlite3 trace callbacks"""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+
+    def install(self):
+        from app.db.models import Database
+
+        get_connection = Database.get_connection
+
+        def counting_get_connection(database):
+            conn = get_connection(database)
+            if not getattr(conn, "write_counter", None):
+                conn.write_counter = self
+                conn.set_trace_callback(self._trace)
+            return conn
+        Database.get_connection = counting_get_connection
+
+    def _trace(self, statement: str):
+        is_write = WRITE_STATEMENT.match(statement) is not None
+        is_commit = statement.strip().upper() == "COMMIT"
+        if is_write or is_commit:
+            with self._lock:
+                self.statements += is_write
+                self.commits += is_commit
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"write_statements": self.statements, "commits": self.commits}
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    ordered = sorted(latencies)
+    stats = {
+        "calls": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+    if ordered:
+        stats.update({
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        })
+    return stats
+
+def run_phase(calls: List[Callable], concurrency: int, writes: WriteCounter) -> Dict:
+    """Run the calls on `concurrency` threads; latency stats plus the writes made meanwhile"""
+    latencies, errors = [], []
+
+    def timed(call):
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {str(e)}")
+        else:
+            latencies.append(time.perf_counter() - start)
+
+    before = writes.snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as executor:
+        list(executor.map(timed, calls))
+    elapsed = time.perf_counter() - start
+    after = writes.snapshot()
+
+    stats = summarize(latencies, len(errors), elapsed)
+    stats["db"] = {key: after[key] - before[key] for key in after}
+    if errors:
+        stats["first_error"] = errors[0]
+    return stats
+
+def table_rows() -> Dict[str, int]:
+    from app.db.models import Database
+
+    conn = Database().get_connection()
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+        "AND name NOT LIKE '%_fts%' ORDER BY name")]
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+def bench_seek(feeds: List[Dict], args, writes: WriteCounter) -> Dict:
+    from app.agents.seeker import SeekerAgent
+
+    def seek(feed):
+        return lambda: SeekerAgent().seek_articles(feed["id"], feed["topic"], sources=args.sources,
+                                                   rss_urls=feed["rss_urls"])
+    calls = [seek(feeds[i % len(feeds)]) for i in range(args.seeks)]
+    return run_phase(calls, args.concurrency, writes)
+
+def bench_synthesize(feeds: List[Dict], args, writes: WriteCounter) -> Dict:
+    from app.agents.synthesizer import SynthesizerAgent
+    from app.agents.stubs import FakeOpenAIClient
+
+    client = FakeOpenAIClient(first_token_latency=args.llm_latency, token_delay=args.token_delay,
+                              error_rate=args.llm_error_rate)
+
+    def synthesize(feed):
+        return lambda: SynthesizerAgent(client=client).synthesize_narrative(feed["id"], feed["topic"],
+                                                                           seek=args.synthesis_seek)
+    calls = [synthesize(feeds[i % len(feeds)]) for i in range(args.syntheses)]
+    stats = run_phase(calls, args.concurrency, writes)
+    stats["llm_calls"] = client.calls
+    return stats
+
+def bench_routes(flask_app, feeds: List[Dict], args, writes: WriteCounter) -> Dict:
+    from app.db.models import Narrative
+
+    paths = {"/": ["/"]}
+    for feed in feeds:
+        narrative_ids = [item["id"] for item in Narrative.list_by_feed(feed["id"])["items"]]
+        paths.setdefault("/narratives/<feed_id>", []).append(f"/narratives/{feed['id']}")
+        paths.setdefault("/api/feeds/<feed_id>/narratives", []).append(f"/api/feeds/{feed['id']}/narratives")
+        paths.setdefault("/narrative/<narrative_id>", []).extend(f"/narrative/{i}" for i in narrative_ids)
+    paths["/search"] = [f"/search?q={word}" for word in ("learning", "graph", "privacy", "reasoning")]
+    paths = {route: targets for route, targets in paths.items() if targets}
+
+    local = threading.local()
+
+    def get(path):
+        def call():
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = flask_app.test_client()
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+        return call
+
+    results = {}
+    for route, targets in paths.items():
+        calls = [get(targets[i % len(targets)]) for i in range(args.requests)]
+        results[route] = run_phase(calls, args.concurrency, writes)
+    mixed = [get(targets[i % len(targets)]) for i in range(args.requests) for targets in paths.values()]
+    results["mixed"] = run_phase(mixed, args.concurrency, writes)
+    return results
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--label", default="current", help="Name for this run in the output")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads issuing calls in each phase")
+    parser.add_argument("--feeds", type=int, default=8)
+    parser.add_argument("--seeks", type=int, default=32, help="seek_articles calls")
+    parser.add_argument("--syntheses", type=int, default=16, help="synthesize_narrative calls")
+    parser.add_argument("--requests", type=int, default=200, help="GETs per route")
+    parser.add_argument("--sources", nargs="+", default=["scholar", "arxiv", "rss"])
+    parser.add_argument("--rss-urls", type=int, default=2, help="Fake RSS feeds per feed")
+    parser.add_argument("--source-latency", type=float, default=0.05, help="Seconds per fake source request")
+    parser.add_argument("--source-jitter", type=float, default=0.05, help="Extra random seconds, up to this")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds to a fake completion's first token")
+    parser.add_argument("--token-delay", type=float, default=0.001, help="Seconds per fake completion word")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of fake LLM calls returning 429")
+    parser.add_argument("--synthesis-seek", action=argparse.BooleanOptionalAction, default=True,
+                        help="Seek sources as part of each synthesis, as the web app does")
+    parser.add_argument("--page-cache", action="store_true",
+                        help="Leave the page cache on, so repeated route GETs are served from it")
+    args = parser.parse_args()
+
+    # Measure the pipeline rather than the production rate limits and completion cache
+    os.environ.setdefault("LLM_RPM", "1000000")
+    os.environ.setdefault("LLM_TPM", "1000000000")
+    os.environ.setdefault("LLM_CACHE_TTL", "0")
+    if not args.page_cache:
+        os.environ["PAGE_CACHE_MAX_BYTES"] = "0"
+
+    # The app writes blackstrap.db into the working directory, so work in a scratch one
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="blackstrap-bench-"))
+
+    from app import create_app
+    from app.db.models import Feed
+    from app.agents.stubs import install_fake_sources
+
+    flask_app = create_app()
+    writes = WriteCounter()
+    writes.install()
+
+    feeds = []
+    for i in range(args.feeds):
+        topic = f"federated learning {i}"
+        rss_urls = [f"https://feed{j}.fake.example/{i}" for j in range(args.rss_urls)]
+        feed_id = Feed.create(f"Feed {i}", topic, "", args.sources, rss_urls)
+        feeds.append({"id": feed_id, "topic": topic, "rss_urls": rss_urls})
+
+    with install_fake_sources(args.source_latency, args.source_jitter) as sources:
+        results = {
+            "label": args.label,
+            "config": {key: value for key, value in vars(args).items() if key != "label"},
+            "seek": bench_seek(feeds, args, writes),
+            "synthesize": bench_synthesize(feeds, args, writes),
+            "routes": bench_routes(flask_app, feeds, args, writes),
+        }
+        results["source_calls"] = {"scholar": sources.scholarly.calls, "arxiv": sources.arxiv.calls,
+                                   "rss": sources.rss.calls}
+    results["rows"] = table_rows()
+    flask_app.extensions['synthesis_jobs'].shutdown()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for Blackstrap's entry points.
+Each import is timed in a fresh interpreter with `python -X importtime`
+(median of --repeat runs), and so is building the app and serving the
+first request. Every target has a time budget and a list of heavy
+libraries it must not import; with --check the script exits non-zero when
+a budget is exceeded or a heavy library is imported, so it can gate CI.
+
+    python bench_startup.py --label after --check
+
+Budgets are startup milliseconds over a bare interpreter's, with headroom
+for a slow laptop; scale them for other machines with --budget-scale. The
+heavy-import check doesn't depend on the machine.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Libraries that take a large share of a second to import and are only needed by some code paths
+HEAVY_MODULES = ("flask", "openai", "numpy", "scholarly", "arxiv", "feedparser", "requests", "tiktoken")
+
+# target: (statement, budget in ms, heavy libraries it is allowed to import)
+TARGETS = {
+    "import app": ("import app", 150, ()),
+    "import app.db.models": ("import app.db.models", 200, ()),
+    "import app.agents.seeker": ("import app.agents.seeker", 200, ()),
+    "import app.agents.synthesizer": ("import app.agents.synthesizer", 250, ()),
+    "import app.scheduler": ("import app.scheduler", 200, ()),
+    "create_app + first request": (
+        "from app import create_app; create_app().test_client().get('/')", 800, ("flask",)),
+}
+
+def import_profile(statement: str, env: dict) -> dict:
+    """Run statement under -X importtime; total import milliseconds and the top-level packages imported"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr[-2000:]}")
+
+    total_us, packages = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        packages.add(name.strip().split(".")[0])
+        # Nested imports are indented; the unindented ones add up to the whole statement
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return {"import_ms": total_us / 1000, "packages": packages}
+
+def wall_time(statement: str, env: dict) -> float:
+    """Milliseconds for a fresh interpreter to run statement and exit"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], env=env, check=True, capture_output=True)
+    return (time.perf_counter() - start) * 1000
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--label", default="current", help="Name for this run in the output")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per target; the median is reported")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiply every budget by this")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any target is over budget or imports a heavy library")
+    args = parser.parse_args()
+
+    # The app writes blackstrap.db into the working directory, so work in a scratch one
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+    os.chdir(tempfile.mkdtemp(prefix="blackstrap-bench-"))
+
+    baseline_ms = statistics.median(wall_time("pass", env) for _ in range(args.repeat))
+    results = {"label": args.label, "repeat": args.repeat, "interpreter_ms": round(baseline_ms, 1), "targets": {}}
+    failures = []
+    for target, (statement, budget_ms, allowed) in TARGETS.items():
+        profiles = [import_profile(statement, env) for _ in range(args.repeat)]
+        walls = [wall_time(statement, env) for _ in range(args.repeat)]
+        heavy = sorted(set(HEAVY_MODULES) & profiles[0]["packages"] - set(allowed))
+        budget_ms *= args.budget_scale
+        import_ms = statistics.median(profile["import_ms"] for profile in profiles)
+        # Imports plus whatever the statement runs, over the bare interpreter's startup
+        startup_ms = statistics.median(walls) - baseline_ms
+        results["targets"][target] = {
+            "import_ms": round(import_ms, 1),
+            "startup_ms": round(startup_ms, 1),
+            "budget_ms": round(budget_ms, 1),
+            "heavy_imports": heavy,
+        }
+        if startup_ms > budget_ms:
+            failures.append(f"{target}: {startup_ms:.0f}ms over its {budget_ms:.0f}ms budget")
+        if heavy:
+            failures.append(f"{target}: imports {', '.join(heavy)}")
+
+    results["failures"] = failures
+    print(json.dumps(results, indent=2))
+    if args.check and failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Storage benchmark: database size and read latency before and after
+compaction, on a synthetic dataset (1M articles by default).
+The dataset is written the way older releases stored it (plain-text
+abstracts and narrative bodies, JSON author and article ID lists), then:
+
+  before    file size, bytes per table and index, and read latencies
+  compact   Storage.compact() re-encodes every row, a full Storage.vacuum() repacks the file
+  after     the same measurements on the compacted file
+  archive   Storage.archive_articles() moves articles older than --archive-days out
+
+Reads timed: a feed's article list page, the articles a synthesis prompt is
+built from, an embedding backfill batch, full-text search and a narrative
+page's narrative. Output is one JSON object; runs can be saved and diffed:
+
+    python bench_storage.py --articles 1000000 > storage.json
+    STORAGE_CODEC=zstd python bench_storage.py --label zstd > zstd.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List
+
+def make_vocabulary(rng: random.Random, size: int) -> List[str]:
+    """Pronounceable made-up words, so text compresses about as well as English rather than absurdly well"""
+    consonants, vowels = "bcdfghklmnprstvz", "aeiou"
+    return ["".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(1, 4)))
+            for _ in range(size)]
+
+class TextGenerator:
+    """Sentences of vocabulary words drawn with Zipf-like frequencies"""
+
+    def __init__(self, seed: int = 1, vocabulary: int = 5000):
+        self.rng = random.Random(seed)
+        self.words = make_vocabulary(self.rng, vocabulary)
+        self.weights = [1 / rank for rank in range(1, vocabulary + 1)]
+        self.cumulative = list(self._accumulate(self.weights))
+
+    @staticmethod
+    def _accumulate(weights):
+        total = 0.0
+        for weight in weights:
+            total += weight
+            yield total
+
+    def text(self, words: int) -> str:
+        chosen = self.rng.choices(self.words, cum_weights=self.cumulative, k=words)
+        sentences = [" ".join(chosen[i:i + 18]).capitalize() + "." for i in range(0, words, 18)]
+        return " ".join(sentences)
+
+    def name(self) -> str:
+        first = self.rng.choice(self.words[:400]).capitalize()
+        return f"{first} {self.rng.choice(string.ascii_uppercase)}. {self.rng.choice(self.words).capitalize()}"
+
+def seed(args) -> Dict:
+    """Write the dataset in the legacy encoding, straight into the tables; returns IDs to read back"""
+    from app.db.models import Database, Feed, index_for_search, normalize_url, title_fingerprint
+
+    generator = TextGenerator(args.seed)
+    rng = generator.rng
+    authors = [generator.name() for _ in range(20000)]
+    feed_ids = [Feed.create(f"Feed {i}", f"Topic {i}", "", ["arxiv"]) for i in range(args.feeds)]
+    db = Database()
+
+    article_ids = []
+    started = time.perf_counter()
+    for start in range(0, args.articles, 10000):
+        rows = []
+        for n in range(start, min(start + 10000, args.articles)):
+            article_id = str(uuid.uuid4())
+            article_ids.append(article_id)
+            title = generator.text(rng.randint(6, 14)).rstrip(".")
+            url = f"https://papers.example.org/abs/{n}"
+            rows.append((article_id, feed_ids[n % len(feed_ids)], title, generator.text(rng.randint(120, 220)), url,
+                         json.dumps(rng.sample(authors, rng.randint(2, 8))), f"2024-{n % 12 + 1:02d}-01",
+                         "arxiv", f"-{365 * (1 - n / args.articles):.4f} days", normalize_url(url),
+                         title_fingerprint(title)))
+        with db.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO articles (id, feed_id, title, abstract, url, authors, published_date, source_type,
+                                      fetched_at, url_key, title_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now', ?), ?, ?)
+            ''', rows)
+            first_rowid = conn.execute("SELECT max(rowid) FROM articles").fetchone()[0] - len(rows) + 1
+            index_for_search(conn, 'articles', [(first_rowid + i, row[2], row[3]) for i, row in enumerate(rows)])
+        print(f"seeded {len(article_ids)} articles ({time.perf_counter() - started:.0f}s)", file=sys.stderr)
+
+    narrative_ids = []
+    with db.transaction() as conn:
+        for n in range(args.narratives):
+            narrative_id = str(uuid.uuid4())
+            narrative_ids.append(narrative_id)
+            content = generator.text(rng.randint(400, 900))
+            title = generator.text(8)
+            cursor = conn.execute('INSERT INTO narratives (id, feed_id, title, content, article_ids) '
+                                  'VALUES (?, ?, ?, ?, ?)', (narrative_id, feed_ids[n % len(feed_ids)], title,
+                                                              content, json.dumps(rng.sample(article_ids, 20))))
+            index_for_search(conn, 'narratives', [(cursor.lastrowid, title, content)])
+            conn.execute('INSERT INTO mcp_entries (id, content_type, content_text) VALUES (?, ?, ?)',
+                         (str(uuid.uuid4()), "narrative", content))
+    return {"feed_ids": feed_ids, "article_ids": article_ids, "narrative_ids": narrative_ids,
+            "search_words": generator.words[20:40]}
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def timed(call: Callable, repeat: int) -> Dict:
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - start)
+    ordered = sorted(latencies)
+    return {
+        "calls": repeat,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+    }
+
+def measure_reads(data: Dict, repeat: int) -> Dict:
+    from app.agents.stubs import FakeOpenAIClient
+    from app.agents.synthesizer import SynthesizerAgent
+    from app.db.models import Article, Narrative, Search
+
+    rng = random.Random(7)
+    synthesizer = SynthesizerAgent(client=FakeOpenAIClient())
+    article_ids, feed_ids = data["article_ids"], data["feed_ids"]
+    narrative_ids, words = data["narrative_ids"], data["search_words"]
+    max_rowid = len(article_ids)
+    return {
+        "article_list_page": timed(lambda i: Article.list_by_feed(feed_ids[i % len(feed_ids)], limit=50), repeat),
+        "synthesis_articles": timed(lambda i: synthesizer._get_articles_content(rng.sample(article_ids, 50)), repeat),
+        "embedding_batch": timed(lambda i: Article.get_pending_embeddings(rng.randrange(max_rowid), 200), repeat),
+        "search": timed(lambda i: Search.articles(words[i % len(words)], limit=20), repeat),
+        "narrative": timed(lambda i: Narrative.get(narrative_ids[i % len(narrative_ids)]), repeat),
+    }
+
+def sizes() -> Dict:
+    from app.db.models import Storage
+
+    stats = Storage.stats()
+    objects = stats.get("objects", {})
+    return {
+        "file_mib": round(stats["file_bytes"] / 2**20, 1),
+        "free_pages": stats["free_pages"],
+        "top_objects_mib": {name: round(size / 2**20, 1) for name, size in list(objects.items())[:8]},
+    }
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--label", default="current", help="Name for this run in the output")
+    parser.add_argument("--articles", type=int, default=1000000)
+    parser.add_argument("--feeds", type=int, default=50)
+    parser.add_argument("--narratives", type=int, default=2000, help="Narratives, each with an MCP entry")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per timed read")
+    parser.add_argument("--archive-days", type=float, default=180,
+                        help="Archive articles older than this (articles were fetched evenly over the last year)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # The app writes blackstrap.db into the working directory, so work in a scratch one
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="blackstrap-bench-"))
+
+    from app.db.models import COMPRESS_MIN_BYTES, STORAGE_CODEC, Database, Storage
+
+    data = seed(args)
+    Database().get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    results = {"label": args.label, "articles": args.articles, "codec": STORAGE_CODEC,
+               "compress_min_bytes": COMPRESS_MIN_BYTES}
+    results["before"] = {**sizes(), "reads": measure_reads(data, args.repeat)}
+
+    start = time.perf_counter()
+    results["compact"] = {"rewritten": Storage.compact()}
+    results["compact"]["compact_s"] = round(time.perf_counter() - start, 1)
+    start = time.perf_counter()
+    Storage.vacuum(full=True)
+    results["compact"]["vacuum_s"] = round(time.perf_counter() - start, 1)
+    results["after"] = {**sizes(), "reads": measure_reads(data, args.repeat)}
+
+    start = time.perf_counter()
+    archived = Storage.archive_articles(args.archive_days, "archive")
+    Storage.vacuum()
+    results["archive"] = {
+        "articles": archived["archived"],
+        "archive_mib": round(os.path.getsize(archived["path"]) / 2**20, 1) if archived["path"] else 0,
+        "seconds": round(time.perf_counter() - start, 1),
+        **sizes(),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    run_benchmark()
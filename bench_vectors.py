@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Nearest-neighbour benchmark for the MCP vector index.
+Builds exact and IVF (approximate) indexes over synthetic clustered
+embeddings at each size and reports build time, query latency and the
+IVF index's recall@k against the exact scan, as JSON lines.
+
+    python bench_vectors.py --sizes 10000 100000 1000000 --dim 128
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+def synthetic_embeddings(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Gaussian blobs around random centres, generated in chunks to bound memory"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100000):
+        stop = min(n, start + 100000)
+        labels = rng.integers(0, clusters, stop - start)
+        out[start:stop] = centres[labels] + 0.5 * rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return out
+
+def time_queries(index, queries: np.ndarray, k: int, **search_options):
+    """Mean and p95 latency in milliseconds, plus the result ids for recall"""
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        matches = index.search(query, k, **search_options)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({entry_id for entry_id, _ in matches})
+    latencies.sort()
+    return {
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }, results
+
+def bench_size(n: int, args) -> dict:
+    from app.db.vectors import VectorIndex
+
+    vectors = synthetic_embeddings(n, args.dim, args.clusters)
+    ids = [str(i) for i in range(n)]
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(n, args.queries, replace=False)] + 0.1 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    start = time.perf_counter()
+    exact = VectorIndex()
+    exact.add(ids, vectors)
+    exact_build = time.perf_counter() - start
+    exact_stats, exact_results = time_queries(exact, queries, args.k)
+    del exact
+
+    start = time.perf_counter()
+    approximate = VectorIndex(approximate=True, nprobe=args.nprobe, min_train_size=min(n, 10000))
+    # Add in batches to exercise the incremental path the MCP hooks use
+    for batch_start in range(0, n, args.batch):
+        approximate.add(ids[batch_start:batch_start + args.batch], vectors[batch_start:batch_start + args.batch])
+    ivf_build = time.perf_counter() - start
+    ivf_stats, ivf_results = time_queries(approximate, queries, args.k)
+
+    recall = sum(len(a & b) for a, b in zip(ivf_results, exact_results)) / (args.k * args.queries)
+    return {
+        "entries": n,
+        "dim": args.dim,
+        "k": args.k,
+        "exact": dict(exact_stats, build_s=round(exact_build, 2)),
+        "ivf": dict(ivf_stats, build_s=round(ivf_build, 2), nprobe=args.nprobe,
+                    nlist=len(approximate.ivf.centroids), recall=round(recall, 3)),
+    }
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=50000, help="Rows per incremental add")
+    args = parser.parse_args()
+
+    # Importing the app package may create blackstrap.db, so work in a scratch directory
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="blackstrap-bench-"))
+    for n in args.sizes:
+        print(json.dumps(bench_size(n, args)), flush=True)
+
+if __name__ == "__main__":
+    run_benchmark()
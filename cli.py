@@ -0,0 +1,287 @@
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Callable, Optional, TextIO
+from .db.models import Feed, Job, Rating, Search, Storage, SynthesisRun, ARTICLE_RETENTION_DAYS
+from .jobs import SynthesisJobQueue, STALE_JOB_SECONDS, run_synthesis_job
+from .metrics import trace
+from .ratelimit import TokenBucket
+from .scheduler import parse_pairs
+
+# What a run was started with, kept in its log so --resume synthesizes the rest the same way.
+# Only the pacing flags, when given again, override a resumed run's own
+PACING_OPTIONS = ("concurrency", "llm_rpm", "llm_tpm", "llm_concurrency", "source_concurrency", "source_rate",
+                  "stub_latency")
+RUN_OPTIONS = ("seek", "stub") + PACING_OPTIONS
+DEFAULT_CONCURRENCY = 8
+DEFAULT_STUB_LATENCY = 0.2
+
+class BatchSynthesizer:
+    """
+    Synthesizes many feeds in one run on a pool of `concurrency` threads.
+    Synthesis spends its time waiting on sources and the LLM, so threads
+    overlap those waits, and every worker draws on the same budgets: one
+    LLMClient (requests and tokens per minute, concurrent calls, circuit
+    breaker) and the per-source concurrency and rate limits. Each feed's
+    outcome is written to the run's log as soon as it finishes, so a run that
+    was interrupted or had failures can be resumed with only the feeds that
+    did not succeed. Every feed is synthesized as a synthesis job, so the web
+    app shows it in progress and won't queue a second synthesis of it.
+    """
+
+    def __init__(self, concurrency: int = 8, llm=None, seek: bool = None,
+                 source_concurrency: Dict[str, int] = None, source_rates: Dict[str, float] = None,
+                 seeker_factory: Callable = None, out: TextIO = None):
+        from .agents.seeker import SeekerAgent
+
+        self.concurrency = concurrency
+        self.llm = llm
+        self.seek = seek
+        self.source_limits = {source: threading.BoundedSemaphore(limit)
+                              for source, limit in (source_concurrency or {}).items()}
+        # Rates are requests per minute
+        self.rate_limiters = {source: TokenBucket(rate, per=60.0)
+                              for source, rate in (source_rates or {}).items()}
+        self.seeker_factory = seeker_factory or SeekerAgent
+        self.out = out
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def run(self, run_id: str) -> Dict[str, int]:
+        """
+        Synthesize the run's unfinished feeds; returns the run's feeds by status.
+        On KeyboardInterrupt, feeds already being synthesized are finished and
+        recorded, the rest stay pending, and the run is marked interrupted.
+        """
+        feed_ids = SynthesisRun.unfinished_feed_ids(run_id)
+        SynthesisRun.set_status(run_id, "running")
+        self.total = len(feed_ids)
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._report(f"Run {run_id}: synthesizing {self.total} feeds, {self.concurrency} at a time")
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch")
+        futures = [executor.submit(self._synthesize_feed, run_id, feed_id) for feed_id in feed_ids]
+        try:
+            for future in futures:
+                future.result()
+        except KeyboardInterrupt:
+            self._report("Interrupted: finishing the feeds in progress, leaving the rest pending")
+            executor.shutdown(wait=True, cancel_futures=True)
+            SynthesisRun.set_status(run_id, "interrupted")
+            raise
+        executor.shutdown(wait=True)
+        SynthesisRun.set_status(run_id, "finished")
+        return SynthesisRun.counts(run_id)
+
+    def _synthesize_feed(self, run_id: str, feed_id: str):
+        """Worker body: synthesize one feed as a job and record the outcome in the run's log"""
+        from .agents.synthesizer import SynthesizerAgent
+
+        started = time.monotonic()
+        feed = Feed.get(feed_id)
+        job = Job.create(SynthesisJobQueue.JOB_TYPE, feed_id) if feed else None
+        if feed is None:
+            narrative_id, error = None, f"Feed not found: {feed_id}"
+        elif not job["created"]:
+            narrative_id, error = None, f"Synthesis already in flight (job {job['id']})"
+        else:
+            with trace(f"batch synthesis {feed_id}"):
+                seeker = self.seeker_factory(source_limits=self.source_limits, rate_limiters=self.rate_limiters)
+                synthesizer = SynthesizerAgent(llm=self.llm, seeker=seeker)
+                narrative_id, error = run_synthesis_job(job["id"], feed_id, synthesizer, seek=self.seek)
+        seconds = time.monotonic() - started
+        SynthesisRun.record_feed(run_id, feed_id, seconds, narrative_id, error)
+        self._progress(feed["name"] if feed else feed_id, seconds, error)
+
+    def _progress(self, name: str, seconds: float, error: Optional[str]):
+        with self._lock:
+            self.done += 1
+            self.failed += error is not None
+            elapsed = time.monotonic() - self.started
+            remaining = elapsed / self.done * (self.total - self.done)
+            line = (f"[{self.done}/{self.total}] {'failed' if error else 'ok':<6} {name} ({seconds:.1f}s)"
+                    f"{': ' + error if error else ''} | {self.done / elapsed * 60:.1f} feeds/min, "
+                    f"{self.failed} failed, about {remaining / 60:.1f} min left")
+            self._report(line)
+
+    def _report(self, line: str):
+        if self.out is not None:
+            print(line, file=self.out, flush=True)
+
+def _build_llm(args):
+    """One LLMClient for the whole run, so its budgets are global to it"""
+    from .agents.llm import LLMClient
+
+    client = None
+    if args.stub:
+        from .agents.stubs import FakeOpenAIClient
+        client = FakeOpenAIClient()
+    return LLMClient(client, rpm=args.llm_rpm, tpm=args.llm_tpm, max_concurrency=args.llm_concurrency)
+
+def _apply_run_options(args, options: Dict):
+    """Take a resumed run's options from how it was started, except pacing flags given this time"""
+    for key in RUN_OPTIONS:
+        if key in options and not (key in PACING_OPTIONS and getattr(args, key) is not None):
+            setattr(args, key, options[key])
+
+def synthesize_command(args) -> int:
+    Job.fail_stale(STALE_JOB_SECONDS)
+
+    if args.resume:
+        run = SynthesisRun.latest() if args.resume == "latest" else SynthesisRun.get(args.resume)
+        if run is None:
+            print(f"No synthesis run {args.resume!r} to resume", file=sys.stderr)
+            return 2
+        run_id = run['id']
+        _apply_run_options(args, json.loads(run['options'] or '{}'))
+    else:
+        feed_ids = args.feed or list(Feed.iter_ids())
+        run_id = SynthesisRun.create(feed_ids, {key: getattr(args, key) for key in RUN_OPTIONS})
+
+    seeker_factory = None
+    if args.stub:
+        from .agents.stubs import StubSeekerAgent
+        latency = DEFAULT_STUB_LATENCY if args.stub_latency is None else args.stub_latency
+        seeker_factory = lambda **kwargs: StubSeekerAgent(latency=latency, **kwargs)
+
+    batch = BatchSynthesizer(
+        concurrency=args.concurrency or DEFAULT_CONCURRENCY,
+        llm=_build_llm(args),
+        seek=args.seek,
+        source_concurrency=parse_pairs(args.source_concurrency or [], int),
+        source_rates=parse_pairs(args.source_rate or [], float),
+        seeker_factory=seeker_factory,
+        out=None if args.quiet else sys.stdout,
+    )
+    try:
+        counts = batch.run(run_id)
+    except KeyboardInterrupt:
+        print(f"Resume with: python -m app.cli synthesize --resume {run_id}", file=sys.stderr)
+        return 130
+
+    elapsed = time.monotonic() - batch.started
+    print(f"Run {run_id} finished in {elapsed:.1f}s: {counts.get('succeeded', 0)} succeeded, "
+          f"{counts.get('failed', 0)} failed")
+    if counts.get('failed'):
+        print(f"Retry the failed feeds with: python -m app.cli synthesize --resume {run_id}", file=sys.stderr)
+        return 1
+    return 0
+
+def runs_command(args) -> int:
+    for run in SynthesisRun.list_recent(args.limit):
+        print(f"{run['id']}  {run['created_at']}  {run['status']:<11} {run['feeds']} feeds: "
+              f"{run['succeeded'] or 0} succeeded, {run['failed'] or 0} failed, {run['pending'] or 0} pending")
+    return 0
+
+def rebuild_ratings_command(args) -> int:
+    drift = Rating.rebuild()
+    for table, rows in drift.items():
+        print(f"{table}: {rows} rows reconciled" if rows else f"{table}: already consistent")
+    return 0
+
+def rebuild_search_command(args) -> int:
+    for table, rows in Search.rebuild().items():
+        print(f"{table}: {rows} rows indexed")
+    return 0
+
+def storage_command(args) -> int:
+    stats = Storage.stats()
+    print(f"{stats['file_bytes'] / 2**20:.1f} MiB file, {stats['wal_bytes'] / 2**20:.1f} MiB write-ahead log, "
+          f"{stats['free_pages']} of {stats['pages']} pages free, auto-vacuum {stats['auto_vacuum']}")
+    for name, size in list(stats.get("objects", {}).items())[:args.top]:
+        print(f"  {size / 2**20:10.1f} MiB  {name}")
+    return 0
+
+def compact_command(args) -> int:
+    for table, rows in Storage.compact(batch_size=args.batch_size).items():
+        print(f"{table}: {rows} rows re-encoded")
+    if args.vacuum:
+        sizes = Storage.vacuum(full=True)
+        print(f"Vacuumed: {sizes['before_bytes'] / 2**20:.1f} MiB -> {sizes['after_bytes'] / 2**20:.1f} MiB")
+    return 0
+
+def archive_articles_command(args) -> int:
+    if args.older_than_days <= 0:
+        print("No retention set: pass --older-than-days or set ARTICLE_RETENTION_DAYS", file=sys.stderr)
+        return 2
+    result = Storage.archive_articles(args.older_than_days, args.dir, batch_size=args.batch_size)
+    if not result["archived"]:
+        print(f"No articles older than {args.older_than_days:g} days")
+        return 0
+    print(f"Archived {result['archived']} articles to {result['path']}")
+    if args.vacuum:
+        sizes = Storage.vacuum()
+        print(f"Vacuumed: {sizes['before_bytes'] / 2**20:.1f} MiB -> {sizes['after_bytes'] / 2**20:.1f} MiB")
+    return 0
+
+def main(argv: List[str] = None) -> int:
+    """Command line for manual agent runs: python -m app.cli <command>"""
+    parser = argparse.ArgumentParser(description="Run Blackstrap's agents from the command line")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    synthesize = commands.add_parser("synthesize", help="Synthesize narratives for many or all feeds")
+    synthesize.add_argument("--feed", action="append", metavar="FEED_ID", help="Feed to synthesize (repeatable); default all")
+    synthesize.add_argument("--resume", nargs="?", const="latest", metavar="RUN_ID",
+                            help="Retry the pending and failed feeds of a run (default the latest run), "
+                                 "with the options it was started with; pacing flags given again override them")
+    synthesize.add_argument("--concurrency", type=int,
+                            help=f"Feeds synthesized at once (default {DEFAULT_CONCURRENCY})")
+    synthesize.add_argument("--llm-rpm", type=float, help="LLM requests per minute for the whole run (default LLM_RPM)")
+    synthesize.add_argument("--llm-tpm", type=float, help="LLM tokens per minute for the whole run (default LLM_TPM)")
+    synthesize.add_argument("--llm-concurrency", type=int,
+                            help="Concurrent LLM calls for the whole run (default LLM_MAX_CONCURRENCY)")
+    synthesize.add_argument("--source-concurrency", nargs="*", metavar="SOURCE=N",
+                            help="Concurrent requests allowed per source, instead of its adapter's limit")
+    synthesize.add_argument("--source-rate", nargs="*", metavar="SOURCE=RPM",
+                            help="Requests per minute allowed per source, instead of its adapter's limit")
+    synthesize.add_argument("--seek", action=argparse.BooleanOptionalAction, default=None,
+                            help="Fetch fresh articles before synthesizing (default SYNTHESIS_SEEK)")
+    synthesize.add_argument("--stub", action="store_true", help="Use local stub sources and a fake LLM")
+    synthesize.add_argument("--stub-latency", type=float,
+                            help=f"Seconds each stub source call takes (default {DEFAULT_STUB_LATENCY})")
+    synthesize.add_argument("--quiet", action="store_true", help="Only print the summary")
+    synthesize.set_defaults(handler=synthesize_command)
+
+    runs = commands.add_parser("runs", help="List recent synthesis runs")
+    runs.add_argument("--limit", type=int, default=10)
+    runs.set_defaults(handler=runs_command)
+
+    rebuild_ratings = commands.add_parser("rebuild-ratings",
+                                          help="Recompute the feedback rating aggregates from the feedback table")
+    rebuild_ratings.set_defaults(handler=rebuild_ratings_command)
+
+    rebuild_search = commands.add_parser("rebuild-search",
+                                         help="Reindex articles and narratives for search, e.g. after edits made "
+                                              "with another SQLite client")
+    rebuild_search.set_defaults(handler=rebuild_search_command)
+
+    storage = commands.add_parser("storage", help="Show the database's size and its largest tables and indexes")
+    storage.add_argument("--top", type=int, default=10, help="Tables and indexes to list")
+    storage.set_defaults(handler=storage_command)
+
+    compact = commands.add_parser("compact", help="Re-encode stored rows compactly and return freed space")
+    compact.add_argument("--batch-size", type=int, default=2000, help="Rows rewritten per transaction")
+    compact.add_argument("--no-vacuum", dest="vacuum", action="store_false",
+                         help="Skip the full VACUUM that repacks the re-encoded rows (it rewrites the whole file)")
+    compact.set_defaults(handler=compact_command)
+
+    archive = commands.add_parser("archive-articles", help="Move old articles to a gzipped NDJSON archive")
+    archive.add_argument("--older-than-days", type=float, default=ARTICLE_RETENTION_DAYS,
+                         help="Archive articles fetched more than this many days ago (default ARTICLE_RETENTION_DAYS)")
+    archive.add_argument("--dir", help="Directory for the archive file (default ARCHIVE_DIR)")
+    archive.add_argument("--batch-size", type=int, default=2000, help="Articles read and deleted per batch")
+    archive.add_argument("--no-vacuum", dest="vacuum", action="store_false", help="Leave freed pages in the file")
+    archive.set_defaults(handler=archive_articles_command)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
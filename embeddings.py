@@ -0,0 +1,200 @@
+import os
+import re
+import sys
+import time
+import random
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Callable, Tuple
+from ..db.models import Article, MCPEntry, EmbeddingCheckpoint
+
+# Imported by the first OpenAIEmbedder, so the hashing embedder and the CLI start quickly
+OpenAI = None
+OPENAI_AVAILABLE = None
+
+def _load_openai() -> bool:
+    global OpenAI, OPENAI_AVAILABLE
+    if OPENAI_AVAILABLE is None:
+        try:
+            from openai import OpenAI
+            OPENAI_AVAILABLE = True
+        except ImportError:
+            OPENAI_AVAILABLE = False
+    return OPENAI_AVAILABLE
+
+# Embedding models cap input length; trim long texts before sending them
+MAX_TEXT_CHARS = 8000
+
+class EmbeddingError(Exception):
+    """A batch could not be embedded even after retrying"""
+
+class Embedder:
+    """Turns a batch of texts into one vector per text, in order"""
+
+    model = "base"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+class OpenAIEmbedder(Embedder):
+    """Embeds through the OpenAI embeddings API, one request per batch"""
+
+    def __init__(self, client=None, model: str = None):
+        self.model = model or os.environ.get('EMBEDDING_MODEL', 'text-embedding-ada-002')
+        if client is None:
+            if not _load_openai():
+                raise RuntimeError("openai library not available")
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise RuntimeError("OPENAI_API_KEY environment variable is required but not set")
+            client = OpenAI(api_key=api_key)
+        self.client = client
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+class HashingEmbedder(Embedder):
+    """
+    Deterministic local embedder for tests and offline runs.
+    Feature-hashes lowercase word tokens into a fixed number of dimensions,
+    so texts that share words end up with similar vectors.
+    """
+
+    model = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for token in re.findall(r"\w+", text.lower()):
+                digest = hashlib.md5(token.encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            vectors.append(vector)
+        return vectors
+
+# Backfill targets: name -> (fetch pending rows, store embeddings)
+TARGETS: Dict[str, Tuple[Callable, Callable]] = {
+    "mcp": (MCPEntry.get_pending_embeddings, MCPEntry.set_embeddings),
+    "articles": (Article.get_pending_embeddings, Article.set_embeddings),
+}
+
+class EmbeddingPipeline:
+    """
+    Backfills missing embeddings in large batches.
+    Pending rows are read in rowid order, split into batches of batch_size,
+    and up to max_workers batches are embedded at once. Failed batches are
+    retried with exponential backoff. After each window of batches the
+    results are written in one transaction and a checkpoint is saved, so an
+    interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, embedder: Embedder, batch_size: int = 100, max_workers: int = 4,
+                 max_retries: int = 3, backoff_seconds: float = 1.0):
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, target: str, limit: int = None) -> int:
+        """Embed pending rows for target ("mcp" or "articles"); returns how many were embedded"""
+        get_pending, store = TARGETS[target]
+        checkpoint = EmbeddingCheckpoint.get(target)
+        embedded = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed") as executor:
+            while limit is None or embedded < limit:
+                window_size = self.batch_size * self.max_workers
+                if limit is not None:
+                    window_size = min(window_size, limit - embedded)
+                rows = get_pending(checkpoint, window_size)
+                if not rows:
+                    break
+
+                batches = [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+                futures = [executor.submit(self._embed_with_retries, batch) for batch in batches]
+
+                results = {}
+                failed_batch = None
+                for batch, future in zip(batches, futures):
+                    try:
+                        vectors = future.result()
+                    except EmbeddingError:
+                        failed_batch = failed_batch or batch
+                        continue
+                    results.update({row["id"]: vector for row, vector in zip(batch, vectors)})
+
+                if results:
+                    store(results)
+                    embedded += len(results)
+
+                if failed_batch:
+                    # Resume just before the first failed batch; rows embedded after it are
+                    # already stored and won't be picked up again
+                    EmbeddingCheckpoint.save(target, failed_batch[0]["rowid"] - 1)
+                    raise EmbeddingError(
+                        f"Giving up on {target} embeddings at rowid {failed_batch[0]['rowid']} "
+                        f"after {self.max_retries} retries; rerun to resume"
+                    )
+
+                checkpoint = rows[-1]["rowid"]
+                EmbeddingCheckpoint.save(target, checkpoint)
+                self.logger.info(f"Embedded {embedded} {target} rows (checkpoint {checkpoint})")
+
+        return embedded
+
+    def _embed_with_retries(self, batch: List[Dict]) -> List[List[float]]:
+        texts = [row["text"][:MAX_TEXT_CHARS] or " " for row in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embedder.embed(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Embedder returned {len(vectors)} vectors for {len(texts)} texts")
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.logger.error(f"Embedding batch failed after {attempt + 1} attempts: {type(e).__name__}: {str(e)}")
+                    raise EmbeddingError(str(e)) from e
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                self.logger.warning(f"Embedding batch failed ({type(e).__name__}: {str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+def main(argv: List[str] = None) -> int:
+    """Command-line backfill: python -m app.agents.embeddings --target all"""
+    parser = argparse.ArgumentParser(description="Backfill missing embeddings for MCP entries and articles")
+    parser.add_argument("--target", choices=["mcp", "articles", "all"], default="all")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many rows per target")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved checkpoints and rescan from the start")
+    parser.add_argument("--stub", action="store_true", help="Use the local deterministic embedder instead of OpenAI")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    embedder = HashingEmbedder() if args.stub else OpenAIEmbedder()
+    pipeline = EmbeddingPipeline(embedder, batch_size=args.batch_size, max_workers=args.workers,
+                                 max_retries=args.retries)
+
+    targets = ["mcp", "articles"] if args.target == "all" else [args.target]
+    for target in targets:
+        if args.restart:
+            EmbeddingCheckpoint.reset(target)
+        try:
+            count = pipeline.run(target, limit=args.limit)
+        except EmbeddingError as e:
+            print(f"{target}: {e}", file=sys.stderr)
+            return 1
+        print(f"{target}: embedded {count} rows")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
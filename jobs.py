@@ -0,0 +1,82 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from .db.models import Feed, Job
+from .metrics import trace
+
+# Unfinished jobs older than this are treated as abandoned by a dead worker
+STALE_JOB_SECONDS = 3600
+
+class SynthesisJobQueue:
+    """
+    Runs narrative synthesis out of band on a bounded local worker pool.
+    Job state lives in the jobs table so any request (or process) can poll it,
+    and a feed that already has a synthesis queued or running is not queued twice.
+    """
+    
+    JOB_TYPE = "synthesis"
+    
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or int(os.environ.get('SYNTHESIS_WORKERS', '2'))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="synthesis")
+        self.logger = logging.getLogger(__name__)
+        
+        abandoned = Job.fail_stale(STALE_JOB_SECONDS)
+        if abandoned:
+            self.logger.warning(f"Marked {abandoned} abandoned synthesis jobs as failed")
+    
+    def submit(self, feed_id: str) -> Dict:
+        """
+        Queue synthesis for a feed and return its job row right away.
+        If the feed already has a job in flight, that job is returned instead
+        (with "created" set to False).
+        """
+        job = Job.create(self.JOB_TYPE, feed_id)
+        if job["created"]:
+            self.executor.submit(self._run, job["id"], feed_id)
+            self.logger.info(f"Queued synthesis job {job['id']} for feed {feed_id}")
+        else:
+            self.logger.info(f"Synthesis already in flight for feed {feed_id}: job {job['id']}")
+        return job
+    
+    def _run(self, job_id: str, feed_id: str):
+        """Worker body: synthesize the feed and record the outcome on the job; its timings are kept as a trace"""
+        with trace(f"synthesis job {job_id}"):
+            run_synthesis_job(job_id, feed_id)
+    
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+def run_synthesis_job(job_id: str, feed_id: str, synthesizer=None,
+                      seek: bool = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Synthesize the feed of a queued job and record the outcome on the job.
+    Returns (narrative_id, None) on success and (None, error) on failure.
+    synthesizer defaults to a new SynthesizerAgent; seek is passed to it.
+    """
+    from .agents.llm import LLMError
+    logger = logging.getLogger(__name__)
+    Job.mark_running(job_id)
+    try:
+        feed = Feed.get(feed_id)
+        if not feed:
+            raise ValueError(f"Feed not found: {feed_id}")
+        
+        if synthesizer is None:
+            from .agents.synthesizer import SynthesizerAgent
+            synthesizer = SynthesizerAgent()
+        narrative_id = synthesizer.synthesize_narrative(feed_id, feed['topic'], feed['guidance'] or "", seek=seek)
+    except LLMError as e:
+        # No narrative was saved; the error is shown where the job is polled
+        logger.warning(f"Synthesis job {job_id} failed for feed {feed_id}: {str(e)}")
+        Job.mark_finished(job_id, error=str(e))
+        return None, str(e)
+    except Exception as e:
+        logger.exception(f"Synthesis job {job_id} failed for feed {feed_id}")
+        error = str(e) or type(e).__name__
+        Job.mark_finished(job_id, error=error)
+        return None, error
+    logger.info(f"Synthesis job {job_id} completed. Narrative ID: {narrative_id}")
+    Job.mark_finished(job_id, result_id=narrative_id)
+    return narrative_id, None
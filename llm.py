@@ -0,0 +1,247 @@
+import os
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional
+from ..ratelimit import TokenBucket
+from ..metrics import counter, gauge, histogram, span
+
+# openai takes most of a second to import, so it is imported when the first real
+# client is built; OPENAI_AVAILABLE is None until then. Fake clients never need it.
+OpenAI = APIConnectionError = APITimeoutError = None
+OPENAI_AVAILABLE = None
+
+def _load_openai() -> bool:
+    global OpenAI, APIConnectionError, APITimeoutError, OPENAI_AVAILABLE
+    if OPENAI_AVAILABLE is None:
+        try:
+            from openai import OpenAI, APIConnectionError, APITimeoutError
+            OPENAI_AVAILABLE = True
+        except ImportError:
+            OPENAI_AVAILABLE = False
+    return OPENAI_AVAILABLE
+
+LLM_REQUEST_SECONDS = histogram('blackstrap_llm_request_seconds',
+                                'Time per completion request attempt (to the first chunk when streaming)',
+                                ['model'])
+LLM_STREAM_SECONDS = histogram('blackstrap_llm_stream_seconds', 'Time reading streamed completions', ['model'])
+LLM_WAIT_SECONDS = histogram('blackstrap_llm_wait_seconds', 'Time queued for a request slot or rate-limit capacity',
+                             ['stage'])
+LLM_RETRIES = counter('blackstrap_llm_retries_total', 'Completion requests retried, by cause', ['reason'])
+LLM_FAILURES = counter('blackstrap_llm_failures_total', 'Completions that raised LLMError', ['reason'])
+LLM_TOKENS = counter('blackstrap_llm_tokens_total', 'Tokens reported in completion usage', ['model', 'kind'])
+LLM_CIRCUIT_OPEN = gauge('blackstrap_llm_circuit_open', '1 while the shared client refuses calls, else 0')
+
+# HTTP statuses worth retrying: rate limited, or the server's fault
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """A completion could not be produced; nothing should be saved from it"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class CircuitOpenError(LLMError):
+    """Calls are being refused because the LLM API keeps failing"""
+
+    def __init__(self, message: str):
+        super().__init__(message, retryable=True)
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and refuses calls
+    for `reset_seconds`; then lets a single trial call through (half-open),
+    closing again if it succeeds and reopening if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+class LLMClient:
+    """
+    Process-wide gateway to the chat completions API. One underlying OpenAI
+    client is shared so HTTP connections are reused. Every call waits for a
+    concurrency slot (LLM_MAX_CONCURRENCY) and for room in the requests- and
+    tokens-per-minute buckets (LLM_RPM, LLM_TPM), so bursts queue instead of
+    tripping the API's own limits. Rate limits, server errors and dropped
+    connections are retried with exponential backoff; repeated failures open
+    a circuit breaker that fails calls fast until the API recovers. Failures
+    surface as LLMError.
+    """
+
+    def __init__(self, client=None, rpm: float = None, tpm: float = None, max_concurrency: int = None,
+                 max_retries: int = 4, backoff_seconds: float = 1.0, queue_timeout: float = None,
+                 breaker: CircuitBreaker = None):
+        if client is None:
+            if not _load_openai():
+                raise RuntimeError("openai library not available")
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise RuntimeError("OPENAI_API_KEY environment variable is required but not set")
+            # Retries are handled here, with the rate limiter and circuit breaker in the loop
+            client = OpenAI(api_key=api_key, max_retries=0)
+        self.client = client
+        self.requests = TokenBucket(rpm or float(os.environ.get('LLM_RPM', '60')), per=60.0)
+        self.tokens = TokenBucket(tpm or float(os.environ.get('LLM_TPM', '90000')), per=60.0)
+        self.slots = threading.BoundedSemaphore(max_concurrency or int(os.environ.get('LLM_MAX_CONCURRENCY', '8')))
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.environ.get('LLM_QUEUE_TIMEOUT', '120'))
+        self.breaker = breaker or CircuitBreaker()
+        self.logger = logging.getLogger(__name__)
+
+    def chat(self, model: str, messages: List[Dict], **params):
+        """A chat completion response; raises LLMError"""
+        with self._slot():
+            response = self._call(model, messages, params, stream=False)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+            LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+        return response
+
+    def stream_chat(self, model: str, messages: List[Dict], **params) -> Iterator[str]:
+        """
+        Yield the completion's text as it streams. Opening the stream is retried
+        like chat(); a stream that breaks partway raises LLMError.
+        """
+        with self._slot():
+            stream = self._call(model, messages, params, stream=True)
+            try:
+                with span(LLM_STREAM_SECONDS, "llm stream", model=model):
+                    for chunk in stream:
+                        text = chunk.choices[0].delta.content if chunk.choices else None
+                        if text:
+                            yield text
+            except Exception as e:
+                self.breaker.record_failure()
+                LLM_FAILURES.inc(reason="stream_interrupted")
+                raise LLMError(f"Completion stream interrupted: {type(e).__name__}: {str(e)}") from e
+
+    @contextmanager
+    def _slot(self):
+        with span(LLM_WAIT_SECONDS, "llm slot wait", stage="slot"):
+            acquired = self.slots.acquire(timeout=self.queue_timeout)
+        if not acquired:
+            LLM_FAILURES.inc(reason="queue_timeout")
+            raise LLMError("Timed out waiting for a free LLM request slot", retryable=True)
+        try:
+            yield
+        finally:
+            self.slots.release()
+
+    def _call(self, model: str, messages: List[Dict], params: Dict, stream: bool):
+        # Rough token estimate for the TPM budget: prompt at ~4 characters per token plus the completion cap
+        estimated_tokens = sum(len(message["content"]) for message in messages) // 4 + params.get("max_tokens", 0)
+
+        for attempt in range(self.max_retries + 1):
+            with span(LLM_WAIT_SECONDS, "llm rate limit wait", stage="rate_limit"):
+                acquired = (self.requests.acquire(timeout=self.queue_timeout)
+                            and self.tokens.acquire(estimated_tokens, timeout=self.queue_timeout))
+            if not acquired:
+                LLM_FAILURES.inc(reason="rate_limit_timeout")
+                raise LLMError("Timed out waiting for LLM rate limit capacity", retryable=True)
+            if not self.breaker.allow():
+                LLM_FAILURES.inc(reason="circuit_open")
+                raise CircuitOpenError("The language model API is failing repeatedly; not sending requests for now")
+
+            try:
+                with span(LLM_REQUEST_SECONDS, "llm request", model=model):
+                    if stream:
+                        response = self.client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+                    else:
+                        response = self.client.chat.completions.create(model=model, messages=messages, **params)
+            except Exception as e:
+                retryable = self._is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The request itself was bad (auth, validation); the API is fine
+                    self.breaker.record_success()
+                reason = str(getattr(e, "status_code", None) or type(e).__name__)
+                if not retryable or attempt == self.max_retries:
+                    LLM_FAILURES.inc(reason=reason)
+                    raise LLMError(f"LLM request failed after {attempt + 1} attempts: {type(e).__name__}: {str(e)}",
+                                   retryable=retryable) from e
+                delay = self._retry_delay(e, attempt)
+                LLM_RETRIES.inc(reason=reason)
+                self.logger.warning(f"LLM request failed ({type(e).__name__}: {str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return response
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if OPENAI_AVAILABLE and isinstance(error, (APIConnectionError, APITimeoutError)):
+            return True
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        return getattr(error, "status_code", None) in RETRYABLE_STATUSES
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Honour the server's Retry-After when given, otherwise back off exponentially with jitter"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None and hasattr(response, "headers") else None
+        try:
+            return min(float(retry_after), 60.0)
+        except (TypeError, ValueError):
+            return self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+
+_shared_client: Optional[LLMClient] = None
+_shared_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """
+    Process-wide client, so rate limits and the circuit breaker cover every
+    synthesis. SYNTHESIS_FAKE_LLM=1 backs it with stubs.FakeOpenAIClient.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                client = None
+                if os.environ.get('SYNTHESIS_FAKE_LLM') == '1':
+                    from .stubs import FakeOpenAIClient
+                    client = FakeOpenAIClient()
+                _shared_client = LLMClient(client)
+                LLM_CIRCUIT_OPEN.set_function(lambda: int(_shared_client.breaker.state == "open"))
+    return _shared_client
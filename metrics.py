@@ -0,0 +1,314 @@
+import os
+import re
+import time
+import json
+import logging
+import inspect
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; spans a millisecond SQLite read up to a slow LLM completion
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Spans recorded per trace before further ones are only counted
+MAX_TRACE_SPANS = 2000
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """A named family of samples, one per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        try:
+            key = tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError:
+            key = None
+        if key is None or len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return key
+
+    def _labels(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = [*zip(self.labelnames, key), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        """Lines of the Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = dict(self._values)
+        for key in sorted(values):
+            lines.extend(self._render_sample(key, values[key]))
+        return lines
+
+    def _render_sample(self, key: Tuple[str, ...], value) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format(value)}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """A value that goes up and down; set directly, or read from a function at scrape time"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Optional[float]], **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = function
+
+    def _render_sample(self, key: Tuple[str, ...], value) -> List[str]:
+        if callable(value):
+            try:
+                value = value()
+            except Exception:
+                logging.getLogger(__name__).exception(f"Reading gauge {self.name} failed")
+                return []
+            if value is None:
+                return []
+        return super()._render_sample(key, value)
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state["buckets"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = {key: {"buckets": list(state["buckets"]), "sum": state["sum"], "count": state["count"]}
+                        for key, state in self._values.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key in sorted(snapshot):
+            state = snapshot[key]
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["buckets"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._labels(key, [('le', '+Inf')])} {state['count']}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format(state['sum'])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {state['count']}")
+        return lines
+
+class Registry:
+    """The metrics a process exposes; registering a name twice returns the first metric"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+# Shared by the page cache and the LLM response cache
+CACHE_EVENTS = counter('blackstrap_cache_events_total', 'Cache hits, misses, evictions and invalidations',
+                       ['cache', 'event'])
+
+class Trace:
+    """
+    The spans timed while handling one request or job, with start offsets
+    relative to the trace's start. Spans may be added from several threads.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans: List[Dict] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float, attributes: Dict):
+        with self._lock:
+            if len(self.spans) >= MAX_TRACE_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append({
+                "name": name,
+                "start_ms": round((start - self.start) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                "thread": threading.current_thread().name,
+                **attributes,
+            })
+
+    def totals(self) -> Dict[str, Dict]:
+        """Count and total milliseconds per span name"""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            for span in self.spans:
+                total = totals.setdefault(span["name"], {"count": 0, "total_ms": 0.0})
+                total["count"] += 1
+                total["total_ms"] = round(total["total_ms"] + span["duration_ms"], 3)
+        return totals
+
+    def server_timing(self) -> str:
+        """Per-name totals as a Server-Timing header value"""
+        entries = []
+        for name, total in self.totals().items():
+            token = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+            entries.append(f'{token};dur={total["total_ms"]};desc="{total["count"]}x {_escape(name)}"')
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "totals": self.totals(),
+            "spans": spans,
+            "dropped_spans": self.dropped,
+        }
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("blackstrap_trace", default=None)
+# Most recent finished traces, served at /metrics/traces
+_recent_traces = deque(maxlen=int(os.environ.get('METRICS_TRACE_KEEP', '50')))
+
+def start_trace(name: str) -> contextvars.Token:
+    """Begin recording spans as one trace; pass the returned token to finish_trace()"""
+    return _current_trace.set(Trace(name))
+
+def finish_trace(token: contextvars.Token) -> Trace:
+    """End the trace begun with token and keep it with the most recent traces"""
+    current = _current_trace.get()
+    _current_trace.reset(token)
+    current.duration = time.perf_counter() - current.start
+    _recent_traces.append(current)
+    logging.getLogger(__name__).debug(f"Trace {current.name}: {json.dumps(current.totals())}")
+    return current
+
+@contextmanager
+def trace(name: str) -> Iterator[Trace]:
+    """
+    Record the spans timed inside the block (and in work handed to threads
+    through in_context()) as one trace, kept with the most recent traces.
+    """
+    token = start_trace(name)
+    try:
+        yield _current_trace.get()
+    finally:
+        finish_trace(token)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def recent_traces() -> List[Dict]:
+    return [recorded.to_dict() for recorded in list(_recent_traces)]
+
+def in_context(function: Callable) -> Callable:
+    """Bind function to the caller's context, so spans it records from another thread join the caller's trace"""
+    context = contextvars.copy_context()
+
+    @wraps(function)
+    def bound(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return bound
+
+@contextmanager
+def span(metric: Histogram, name: str, **labels):
+    """Time the block into metric and, when a trace is active, record it as a span named name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        metric.observe(duration, **labels)
+        current = _current_trace.get()
+        if current is not None:
+            current.add(name, start, duration, labels)
+
+def instrument_methods(metric: Histogram, label: str = "operation"):
+    """
+    Class decorator timing each public static method into metric, labelled
+    "Class.method". Generator methods are left alone: only their creation
+    would be timed, not the work done while iterating.
+    """
+    def decorator(cls):
+        for attribute, value in list(vars(cls).items()):
+            if attribute.startswith("_") or not isinstance(value, staticmethod):
+                continue
+            function = value.__func__
+            if inspect.isgeneratorfunction(function):
+                continue
+            setattr(cls, attribute, staticmethod(_timed(function, metric, label, f"{cls.__name__}.{attribute}")))
+        return cls
+    return decorator
+
+def _timed(function: Callable, metric: Histogram, label: str, operation: str) -> Callable:
+    @wraps(function)
+    def timed(*args, **kwargs):
+        with span(metric, operation, **{label: operation}):
+            return function(*args, **kwargs)
+    return timed
@@ -1,22 +1,546 @@
 import sqlite3
 import json
+import base64
+import gzip
+import html
+import os
+import re
+import zlib
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable, Iterator, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from contextlib import contextmanager
 import uuid
+from ..metrics import histogram, instrument_methods, span
+
+# Per-connection tuning; journal_mode=WAL is persistent and set once in init_db
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",   # safe with WAL, avoids an fsync per commit
+    "PRAGMA cache_size = -16000",    # ~16MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Every public model method is timed into this, labelled "Class.method"; commits separately as "commit"
+DB_OPERATION_SECONDS = histogram('blackstrap_db_operation_seconds', 'Time spent in model database operations',
+                                 ['operation'])
+
+# Stored in PRAGMA user_version once init_db has brought a database file up to date;
+# bump it whenever init_db changes, so existing files run the new steps
+SCHEMA_VERSION = 6
+
+# Text values of at least this many UTF-8 bytes are stored compressed; 0 stores all text as is
+COMPRESS_MIN_BYTES = int(os.environ.get('STORAGE_COMPRESS_MIN_BYTES', '200'))
+# Codec for newly written values: zlib, or zstd (needs the zstandard package; falls back to zlib)
+STORAGE_CODEC = os.environ.get('STORAGE_CODEC', 'zlib')
+# Articles fetched more than this many days ago are archived by `python -m app.cli archive-articles`; 0 keeps them
+ARTICLE_RETENTION_DAYS = float(os.environ.get('ARTICLE_RETENTION_DAYS', '0'))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+
+# Process-wide connection state: schema is initialised once per database file,
+# and each thread keeps one long-lived connection per database file.
+_schema_lock = threading.Lock()
+_initialized_paths = set()
+_local = threading.local()
+
+# Change hooks: callbacks registered per event name, fired after model writes
+_hooks: Dict[str, List[Callable]] = {}
+
+def register_hook(event: str, callback: Callable):
+    """
+    Call callback(**payload) whenever a model fires event.
+    Events: mcp_entry_created(entry_id, embedding), mcp_embeddings_updated(embeddings),
+    feed_created(feed_id), narrative_created(narrative_id, feed_id),
+    feedback_created(feedback_id, narrative_id, rating), job_updated(job_id, feed_id)
+    """
+    _hooks.setdefault(event, []).append(callback)
+
+def _fire(event: str, **payload):
+    for callback in _hooks.get(event, []):
+        try:
+            callback(**payload)
+        except Exception:
+            logging.exception(f"Hook {callback!r} failed for {event}")
+
+def encode_embedding(embedding: List[float]) -> bytes:
+    """Pack an embedding as a compact float32 blob"""
+    return array('f', embedding).tobytes()
+
+def decode_embedding(value) -> Optional[List[float]]:
+    """Unpack a stored embedding; accepts float32 blobs and legacy JSON arrays"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    vector = array('f')
+    vector.frombytes(value)
+    return vector.tolist()
+
+# First byte of a compressed value, naming its codec
+_CODEC_TAGS = {"zlib": 1, "zstd": 2}
+
+# Imported the first time the zstd codec is used; None until then
+zstandard = None
+ZSTD_AVAILABLE = None
+
+def _load_zstandard() -> bool:
+    global zstandard, ZSTD_AVAILABLE
+    if ZSTD_AVAILABLE is None:
+        try:
+            import zstandard
+            ZSTD_AVAILABLE = True
+        except ImportError:
+            ZSTD_AVAILABLE = False
+            logging.getLogger(__name__).warning("zstandard is not installed; compressing with zlib")
+    return ZSTD_AVAILABLE
+
+def compress_text(text: Optional[str]):
+    """
+    Storage form of a text value: a BLOB of a codec tag byte plus the
+    compressed UTF-8, when the text is at least COMPRESS_MIN_BYTES long and
+    compression makes it smaller; otherwise the text itself.
+    """
+    if not text or not COMPRESS_MIN_BYTES:
+        return text
+    data = text.encode('utf-8')
+    if len(data) < COMPRESS_MIN_BYTES:
+        return text
+    if STORAGE_CODEC == 'zstd' and _load_zstandard():
+        packed = bytes([_CODEC_TAGS['zstd']]) + zstandard.ZstdCompressor().compress(data)
+    else:
+        packed = bytes([_CODEC_TAGS['zlib']]) + zlib.compress(data)
+    return packed if len(packed) < len(data) else text
+
+def decompress_text(value) -> Optional[str]:
+    """Text of a stored value; accepts compress_text() BLOBs and plain TEXT"""
+    if not isinstance(value, bytes):
+        return value
+    if not value:
+        return ""
+    if value[0] == _CODEC_TAGS['zlib']:
+        return zlib.decompress(value[1:]).decode('utf-8')
+    if value[0] == _CODEC_TAGS['zstd']:
+        if not _load_zstandard():
+            raise RuntimeError("Reading zstd-compressed text needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(value[1:]).decode('utf-8')
+    return value.decode('utf-8')
+
+# Joins the names in a stored author list (older rows hold a JSON array)
+AUTHOR_SEPARATOR = "\x1f"
+
+def encode_authors(authors: Optional[List[str]]) -> str:
+    return AUTHOR_SEPARATOR.join(str(name).replace(AUTHOR_SEPARATOR, " ") for name in authors or [] if name)
+
+def decode_authors(value: Optional[str]) -> List[str]:
+    """Author names of a stored list; accepts encode_authors() text and legacy JSON arrays"""
+    if not value:
+        return []
+    if value.startswith('['):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value.split(AUTHOR_SEPARATOR)
+
+def encode_ids(ids: List[str]):
+    """Pack a list of UUID strings as one BLOB of 16-byte UUIDs; any other IDs are kept as a JSON array"""
+    try:
+        packed = [uuid.UUID(item) for item in ids]
+    except (ValueError, TypeError, AttributeError):
+        packed = None
+    if packed is None or [str(item) for item in packed] != list(ids):
+        return json.dumps(ids)
+    return b"".join(item.bytes for item in packed)
+
+def decode_ids(value) -> List[str]:
+    """IDs of a stored list; accepts encode_ids() BLOBs and JSON arrays"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    # Formatting the hex directly is several times faster than going through uuid.UUID
+    digits = value.hex()
+    return [f"{digits[i:i + 8]}-{digits[i + 8:i + 12]}-{digits[i + 12:i + 16]}-"
+            f"{digits[i + 16:i + 20]}-{digits[i + 20:i + 32]}" for i in range(0, len(digits), 32)]
+
+# Query parameters that identify a click, not a document
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|source)$')
+ARXIV_URL = re.compile(r'arxiv\.org/(?:abs|pdf)/([\w.\-/]+?)(?:v\d+)?(?:\.pdf)?/?$', re.IGNORECASE)
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Canonical form of an article URL for duplicate detection: scheme, www.,
+    fragments, tracking parameters and trailing slashes are ignored, and
+    every arXiv abs/pdf URL of any version maps to arxiv:<id>.
+    """
+    if not url:
+        return None
+    url = url.strip()
+    arxiv_match = ARXIV_URL.search(url)
+    if arxiv_match:
+        return f"arxiv:{arxiv_match.group(1).lower()}"
+    
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if not host:
+        return None
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k))
+    key = host + parts.path.rstrip('/')
+    if query:
+        key += '?' + urlencode(query)
+    return key
+
+def title_fingerprint(title: str) -> Optional[str]:
+    """
+    Hash of a title's normalised words (accents, case and punctuation removed),
+    so the same paper listed by different sources gets the same fingerprint.
+    Titles of fewer than three words are too generic to fingerprint.
+    """
+    if not title:
+        return None
+    text = unicodedata.normalize('NFKD', title)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    words = re.findall(r'[a-z0-9]+', text)
+    if len(words) < 3:
+        return None
+    return hashlib.sha1(' '.join(words).encode('utf-8')).hexdigest()
+
+def encode_cursor(*values) -> str:
+    """Opaque pagination cursor for the sort key of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[Tuple]:
+    """Sort key from encode_cursor, or None if the cursor is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return tuple(values) if isinstance(values, list) and len(values) == size else None
+
+def _page(rows: List[sqlite3.Row], limit: int, *key_columns: str) -> Dict:
+    """Rows fetched with LIMIT limit + 1 -> {"items": up to limit rows, "next_cursor": str or None}"""
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(*(items[-1][column] for column in key_columns))
+    return {"items": items, "next_cursor": next_cursor}
+
+# Tables with a full-text index: table -> indexed columns
+SEARCH_TABLES = {
+    "articles": ("title", "abstract"),
+    "narratives": ("title", "content"),
+}
+# BM25 is computed for at most this many of the newest matches per query
+SEARCH_MAX_CANDIDATES = 10000
+
+def index_for_search(conn: sqlite3.Connection, table: str, rows: List[Tuple], delete: bool = False):
+    """
+    Add rows to (or with delete, remove them from) table's search index, on
+    the caller's connection so it commits with the rows themselves. Each
+    row is (rowid, *text of SEARCH_TABLES[table]); removing takes the same
+    text that was indexed. Text is given decompressed.
+    """
+    fts = f"{table}_fts"
+    columns = SEARCH_TABLES[table]
+    placeholders = ", ".join("?" for _ in columns)
+    if delete:
+        conn.executemany(f"INSERT INTO {fts} ({fts}, rowid, {', '.join(columns)}) VALUES ('delete', ?, {placeholders})",
+                         rows)
+    else:
+        conn.executemany(f"INSERT INTO {fts} (rowid, {', '.join(columns)}) VALUES (?, {placeholders})", rows)
+
+def _fill_search_index(conn: sqlite3.Connection, table: str, batch_size: int = 5000):
+    """Index every row of table, in rowid order"""
+    columns = SEARCH_TABLES[table]
+    last_rowid = 0
+    while True:
+        rows = conn.execute(f'''
+            SELECT rowid, {", ".join(columns)} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?
+        ''', (last_rowid, batch_size)).fetchall()
+        if not rows:
+            break
+        index_for_search(conn, table, [(row['rowid'], *(decompress_text(row[column]) for column in columns))
+                                       for row in rows])
+        last_rowid = rows[-1]['rowid']
+
+# Feedback aggregates recomputed from the feedback table, column for column as
+# in narrative_ratings and feed_ratings; {where} narrows them to some rows
+_NARRATIVE_RATINGS_SELECT = '''
+    SELECT f.narrative_id, n.feed_id, count(*), count(f.rating), coalesce(sum(f.rating), 0), avg(f.rating),
+           (SELECT l.notes FROM feedback l WHERE l.narrative_id = f.narrative_id AND l.notes != ''
+            ORDER BY l.created_at DESC, l.rowid DESC LIMIT 1),
+           max(f.created_at)
+    FROM feedback f JOIN narratives n ON n.id = f.narrative_id
+    {where} GROUP BY f.narrative_id
+'''
+_FEED_RATINGS_SELECT = '''
+    SELECT n.feed_id, count(*), count(f.rating), coalesce(sum(f.rating), 0), avg(f.rating),
+           (SELECT l.notes FROM feedback l JOIN narratives ln ON ln.id = l.narrative_id
+            WHERE ln.feed_id = n.feed_id AND l.notes != ''
+            ORDER BY l.created_at DESC, l.rowid DESC LIMIT 1),
+           max(f.created_at)
+    FROM feedback f JOIN narratives n ON n.id = f.narrative_id
+    {where} GROUP BY n.feed_id
+'''
+# Sort orders of the feed and narrative listings
+LIST_SORTS = ('newest', 'rating')
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must match
+    (a trailing * keeps prefix matching), and FTS5 operators and syntax in
+    the input are treated as plain words. None if there are no words.
+    """
+    terms = []
+    for word, star in re.findall(r"(\w+)(\*?)", text or ""):
+        terms.append(f'"{word}"{star}')
+    return " ".join(terms) or None
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A long-lived, per-thread connection handed out by Database.get_connection().
+    close() returns it to the pool, rolling back anything left uncommitted,
+    so existing get_connection() ... close() call sites keep their semantics.
+    While a Database.transaction() is open on the connection, commit() and
+    close() from code running inside it are deferred to the end of the block.
+    """
+    
+    transaction_depth = 0
+    
+    def commit(self):
+        if not self.transaction_depth:
+            with span(DB_OPERATION_SECONDS, "db commit", operation="commit"):
+                super().commit()
+    
+    def close(self):
+        if not self.transaction_depth and self.in_transaction:
+            self.rollback()
+    
+    def close_for_real(self):
+        super().close()
 
 class Database:
     def __init__(self, db_path: str = "blackstrap.db"):
-        self.db_path = db_path
-        self.init_db()
+        self.db_path = os.path.abspath(db_path)
+        if self.db_path not in _initialized_paths:
+            with _schema_lock:
+                if self.db_path not in _initialized_paths:
+                    self.init_db()
+                    _initialized_paths.add(self.db_path)
     
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Return this thread's pooled connection, opening it on first use"""
+        connections = getattr(_local, "connections", None)
+        if connections is None:
+            connections = _local.connections = {}
+        
+        conn = connections.get(self.db_path)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, factory=PooledConnection)
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            connections[self.db_path] = conn
         return conn
     
+    @staticmethod
+    def close_connections():
+        """Really close every pooled connection owned by the calling thread"""
+        connections = getattr(_local, "connections", None) or {}
+        for conn in connections.values():
+            conn.close_for_real()
+        connections.clear()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: yields one connection, commits everything done on it
+        when the block exits cleanly and rolls back if it raises.
+        Nested use on the same thread joins the outer unit of work.
+        """
+        conn = self.get_connection()
+        if not conn.transaction_depth and not conn.in_transaction:
+            # Take the write lock up front so reads inside the block stay consistent
+            conn.execute("BEGIN IMMEDIATE")
+        conn.transaction_depth += 1
+        try:
+            yield conn
+        except Exception:
+            conn.transaction_depth -= 1
+            if not conn.transaction_depth:
+                conn.rollback()
+            raise
+        else:
+            conn.transaction_depth -= 1
+            conn.commit()
+    
+    @staticmethod
+    def _ensure_column(conn: sqlite3.Connection, table: str, column: str, declaration: str):
+        """Add a column to an existing table if an older schema lacks it"""
+        columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+    
+    @staticmethod
+    def _backfill_article_keys(conn: sqlite3.Connection):
+        """
+        Compute dedup keys for articles stored before they existed. Duplicates
+        already in the table keep NULL keys so the unique indexes can be built;
+        the oldest copy of each article is the one later fetches resolve to.
+        """
+        seen = set()
+        updates = []
+        for row in conn.execute('SELECT rowid, feed_id, title, url FROM articles ORDER BY rowid'):
+            url_key = normalize_url(row['url'])
+            title_key = title_fingerprint(row['title'])
+            if (row['feed_id'], 'url', url_key) in seen:
+                url_key = None
+            if (row['feed_id'], 'title', title_key) in seen:
+                title_key = None
+            if url_key:
+                seen.add((row['feed_id'], 'url', url_key))
+            if title_key:
+                seen.add((row['feed_id'], 'title', title_key))
+            updates.append((url_key, title_key, row['rowid']))
+        conn.executemany('UPDATE articles SET url_key = ?, title_key = ? WHERE rowid = ?', updates)
+    
+    @staticmethod
+    def _init_search(conn: sqlite3.Connection):
+        """
+        Contentless FTS5 indexes (they store no text of their own), kept in
+        step by the model methods that write and delete rows; see
+        index_for_search(). The schema needs nothing registered on the
+        connection, so any SQLite client can write to the tables; rows
+        written that way are found again after Search.rebuild(). Built from
+        existing rows the first time they are created, replacing the
+        trigger-maintained indexes of earlier releases.
+        """
+        for table, columns in SEARCH_TABLES.items():
+            fts = f"{table}_fts"
+            existing = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).fetchone()
+            if existing and "content=''" not in existing['sql']:
+                for trigger in ("insert", "delete", "update"):
+                    conn.execute(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+                conn.execute(f"DROP VIEW IF EXISTS {fts}_content")
+                conn.execute(f"DROP TABLE {fts}")
+                existing = None
+            conn.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                    {", ".join(columns)}, content='',
+                    tokenize='porter unicode61', prefix='2 3'
+                )
+            ''')
+            if not existing:
+                _fill_search_index(conn, table)
+    
+    @staticmethod
+    def _init_ratings(conn: sqlite3.Connection):
+        """
+        Feedback aggregates per narrative and per feed, kept in step with the
+        feedback table by triggers: an insert adjusts the two affected rows in
+        place, and a delete or edit recomputes them. Built from existing
+        feedback the first time they are created; Rating.rebuild() reconciles
+        them with the feedback table at any time.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'narrative_ratings'"
+        ).fetchone()
+        for table, key in (("narrative_ratings", "narrative_id TEXT PRIMARY KEY,\n                feed_id TEXT NOT NULL,"),
+                           ("feed_ratings", "feed_id TEXT PRIMARY KEY,")):
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {key}
+                    feedback_count INTEGER NOT NULL, -- feedback rows, rated or not
+                    rating_count INTEGER NOT NULL,
+                    rating_sum INTEGER NOT NULL,
+                    mean_rating REAL, -- NULL until rated
+                    latest_note TEXT, -- newest non-empty notes
+                    latest_at TIMESTAMP -- newest feedback
+                )
+            ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_feedback_narrative ON feedback (narrative_id, created_at)
+        ''')
+        
+        # Adjust one aggregate row for the new feedback; {key} is its primary key column
+        upsert = '''
+            ON CONFLICT ({key}) DO UPDATE SET
+                feedback_count = feedback_count + 1,
+                rating_count = rating_count + excluded.rating_count,
+                rating_sum = rating_sum + excluded.rating_sum,
+                mean_rating = CASE WHEN rating_count + excluded.rating_count > 0
+                                   THEN CAST(rating_sum + excluded.rating_sum AS REAL)
+                                        / (rating_count + excluded.rating_count) END,
+                latest_note = coalesce(excluded.latest_note, latest_note),
+                latest_at = excluded.latest_at;
+        '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS feedback_ratings_insert AFTER INSERT ON feedback BEGIN
+                INSERT INTO narrative_ratings
+                SELECT new.narrative_id, n.feed_id, 1, new.rating IS NOT NULL, coalesce(new.rating, 0),
+                       new.rating, nullif(new.notes, ''), new.created_at
+                FROM narratives n WHERE n.id = new.narrative_id
+                {upsert.format(key="narrative_id")}
+                INSERT INTO feed_ratings
+                SELECT n.feed_id, 1, new.rating IS NOT NULL, coalesce(new.rating, 0),
+                       new.rating, nullif(new.notes, ''), new.created_at
+                FROM narratives n WHERE n.id = new.narrative_id
+                {upsert.format(key="feed_id")}
+            END
+        ''')
+        
+        def recompute(row: str) -> str:
+            """Statements recomputing the aggregates of the narrative (and its feed) that `row` belongs to"""
+            feed = f"(SELECT feed_id FROM narratives WHERE id = {row}.narrative_id)"
+            return f'''
+                DELETE FROM narrative_ratings WHERE narrative_id = {row}.narrative_id;
+                INSERT INTO narrative_ratings
+                {_NARRATIVE_RATINGS_SELECT.format(where=f"WHERE f.narrative_id = {row}.narrative_id")};
+                DELETE FROM feed_ratings WHERE feed_id = {feed};
+                INSERT INTO feed_ratings
+                {_FEED_RATINGS_SELECT.format(where=f"WHERE n.feed_id = {feed}")};
+            '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS feedback_ratings_delete AFTER DELETE ON feedback BEGIN
+                {recompute("old")}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS feedback_ratings_update
+            AFTER UPDATE OF narrative_id, rating, notes ON feedback BEGIN
+                {recompute("old")}
+                {recompute("new")}
+            END
+        ''')
+        if not exists:
+            conn.execute(f"INSERT INTO narrative_ratings {_NARRATIVE_RATINGS_SELECT.format(where='')}")
+            conn.execute(f"INSERT INTO feed_ratings {_FEED_RATINGS_SELECT.format(where='')}")
+    
     def init_db(self):
-        """Initialize database with all required tables"""
+        """
+        Initialize database with all required tables. A file already at
+        SCHEMA_VERSION is left alone, so a new process pays one PRAGMA read
+        instead of re-running every CREATE ... IF NOT EXISTS.
+        """
         conn = self.get_connection()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            conn.close()
+            return
+        if not conn.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+            # Only possible before the first table exists; older files are switched by Storage.vacuum()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
         
         # Feeds table - user-defined topic feeds
         conn.execute('''
@@ -26,6 +550,7 @@ class Database:
                 topic TEXT NOT NULL,
                 guidance TEXT,
                 sources TEXT, -- JSON array of source types: scholar, arxiv, rss
+                source_urls TEXT, -- JSON array of RSS feed URLs, for the rss source
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
@@ -37,12 +562,15 @@ class Database:
                 id TEXT PRIMARY KEY,
                 feed_id TEXT NOT NULL,
                 title TEXT NOT NULL,
-                abstract TEXT,
+                abstract TEXT, -- compress_text()
                 url TEXT,
-                authors TEXT, -- JSON array
+                authors TEXT, -- encode_authors() (older rows: JSON array)
                 published_date TEXT,
                 source_type TEXT, -- scholar, arxiv, rss
                 fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                embedding BLOB, -- float32 vector of title + abstract
+                url_key TEXT, -- normalize_url(url), for deduplication
+                title_key TEXT, -- title_fingerprint(title), for deduplication
                 FOREIGN KEY (feed_id) REFERENCES feeds (id)
             )
         ''')
@@ -53,8 +581,8 @@ class Database:
                 id TEXT PRIMARY KEY,
                 feed_id TEXT NOT NULL,
                 title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                article_ids TEXT, -- JSON array of article IDs used
+                content TEXT NOT NULL, -- compress_text()
+                article_ids TEXT, -- encode_ids() of the article IDs used (older rows: JSON array)
                 synthesis_prompt TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (feed_id) REFERENCES feeds (id)
@@ -78,90 +606,1092 @@ class Database:
             CREATE TABLE IF NOT EXISTS mcp_entries (
                 id TEXT PRIMARY KEY,
                 content_type TEXT NOT NULL, -- narrative, feedback, preference
-                content_text TEXT NOT NULL,
-                embedding TEXT, -- JSON array of float values
+                content_text TEXT NOT NULL, -- compress_text()
+                embedding BLOB, -- float32 vector (older rows: JSON array of floats)
                 metadata TEXT, -- JSON for additional context
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        # Jobs table - background work such as synthesis runs
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                job_type TEXT NOT NULL, -- synthesis
+                feed_id TEXT NOT NULL,
+                status TEXT NOT NULL, -- queued, running, succeeded, failed
+                result_id TEXT, -- e.g. ID of the narrative produced
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                FOREIGN KEY (feed_id) REFERENCES feeds (id)
+            )
+        ''')
+        # At most one unfinished job of each type per feed
+        conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_feed
+            ON jobs (job_type, feed_id) WHERE status IN ('queued', 'running')
+        ''')
+        
+        # LLM cache table - completions keyed on a hash of model, parameters and prompt
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY, -- sha256 hex digest
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL, -- bytes of response, for size-based eviction
+                hits INTEGER DEFAULT 0,
+                created_at REAL NOT NULL, -- unix time
+                last_accessed REAL NOT NULL -- unix time, for LRU eviction
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache (last_accessed)
+        ''')
+        
+        # Embedding checkpoints - how far each embedding backfill has got
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_checkpoints (
+                target TEXT PRIMARY KEY, -- mcp, articles
+                last_rowid INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Source watermarks - where each feed's last fetch from each source left off
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS source_watermarks (
+                feed_id TEXT NOT NULL,
+                source TEXT NOT NULL, -- scholar, arxiv, or rss:<feed url>
+                last_published TEXT, -- newest publication date seen
+                seen_ids TEXT, -- JSON array of recently seen article keys
+                etag TEXT, -- RSS ETag for conditional GET
+                last_modified TEXT, -- RSS Last-Modified for conditional GET
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (feed_id, source),
+                FOREIGN KEY (feed_id) REFERENCES feeds (id)
+            )
+        ''')
+        
+        # Synthesis runs - batch syntheses from the command line, and how far each got
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS synthesis_runs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL, -- running, finished, interrupted
+                options TEXT, -- JSON of the options the run was started with
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS synthesis_run_feeds (
+                run_id TEXT NOT NULL,
+                feed_id TEXT NOT NULL,
+                position INTEGER NOT NULL, -- order the run takes the feeds in
+                status TEXT NOT NULL, -- pending, succeeded, failed
+                narrative_id TEXT,
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                seconds REAL, -- duration of the last attempt
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (run_id, feed_id),
+                FOREIGN KEY (run_id) REFERENCES synthesis_runs (id),
+                FOREIGN KEY (feed_id) REFERENCES feeds (id)
+            )
+        ''')
+        
+        # Columns added after the first release
+        self._ensure_column(conn, 'articles', 'embedding', 'BLOB')
+        self._ensure_column(conn, 'articles', 'url_key', 'TEXT')
+        self._ensure_column(conn, 'articles', 'title_key', 'TEXT')
+        self._ensure_column(conn, 'feeds', 'source_urls', 'TEXT')
+        
+        # Deduplication: a feed stores each URL/source ID and each title fingerprint once
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_articles_feed_url_key'"
+        ).fetchone():
+            self._backfill_article_keys(conn)
+        conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_feed_url_key
+            ON articles (feed_id, url_key) WHERE url_key IS NOT NULL
+        ''')
+        conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_feed_title_key
+            ON articles (feed_id, title_key) WHERE title_key IS NOT NULL
+        ''')
+        
+        # Keyset pagination: newest-first listings seek straight to their page
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_feeds_created ON feeds (created_at, id)
+        ''')
+        # Covers the narrative list query (title and sort key, without bodies)
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_narratives_feed_created ON narratives (feed_id, created_at, id, title)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_articles_feed_fetched ON articles (feed_id, fetched_at)
+        ''')
+        
+        # Full-text search indexes over article and narrative text
+        self._init_search(conn)
+        # Rating aggregates over feedback
+        self._init_ratings(conn)
+        
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
         conn.close()
 
+@instrument_methods(DB_OPERATION_SECONDS)
 class Feed:
     @staticmethod
-    def create(name: str, topic: str, guidance: str = "", sources: List[str] = None) -> str:
+    def create(name: str, topic: str, guidance: str = "", sources: List[str] = None,
+               source_urls: List[str] = None) -> str:
         feed_id = str(uuid.uuid4())
         sources = sources or ["scholar", "arxiv"]
         
         conn = Database().get_connection()
         conn.execute('''
-            INSERT INTO feeds (id, name, topic, guidance, sources)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (feed_id, name, topic, guidance, json.dumps(sources)))
+            INSERT INTO feeds (id, name, topic, guidance, sources, source_urls)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (feed_id, name, topic, guidance, json.dumps(sources), json.dumps(source_urls or [])))
         conn.commit()
         conn.close()
+        _fire("feed_created", feed_id=feed_id)
         return feed_id
     
     @staticmethod
-    def get_all() -> List[Dict]:
+    def iter_ids(batch_size: int = 1000) -> Iterator[str]:
+        """Yield every feed ID in ID order, reading them a batch at a time"""
         conn = Database().get_connection()
-        rows = conn.execute('SELECT * FROM feeds ORDER BY created_at DESC').fetchall()
+        last_id = ""
+        while True:
+            rows = conn.execute('SELECT id FROM feeds WHERE id > ? ORDER BY id LIMIT ?',
+                                (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                yield row['id']
+            last_id = rows[-1]['id']
         conn.close()
-        return [dict(row) for row in rows]
+    
+    @staticmethod
+    def list_page(limit: int = 20, cursor: str = None, sort: str = 'newest') -> Dict:
+        """
+        One page of feeds without sources or timestamps beyond created_at, with
+        the mean rating and rating count of their narratives: newest first or
+        (sort='rating') best rated first, unrated last. Ratings are looked up
+        in feed_ratings by key.
+        Returns {"items": [...], "next_cursor": cursor for the following page or None}.
+        """
+        if sort == 'rating':
+            keys = ('rating_key', 'created_at', 'id')
+            columns = ("coalesce(r.mean_rating, 0)", "f.created_at", "f.id")
+        else:
+            keys = ('created_at', 'id')
+            columns = ("f.created_at", "f.id")
+        after = decode_cursor(cursor, len(keys))
+        conn = Database().get_connection()
+        rows = conn.execute(f'''
+            SELECT f.id, f.name, f.topic, f.guidance, f.created_at,
+                   r.mean_rating, coalesce(r.rating_count, 0) AS rating_count
+                   {", coalesce(r.mean_rating, 0) AS rating_key" if sort == 'rating' else ""}
+            FROM feeds f LEFT JOIN feed_ratings r ON r.feed_id = f.id
+            {f"WHERE ({', '.join(columns)}) < ({', '.join('?' * len(keys))})" if after else ""}
+            ORDER BY {", ".join(f"{column} DESC" for column in columns)} LIMIT ?
+        ''', (*(after or ()), limit + 1)).fetchall()
+        conn.close()
+        return _page(rows, limit, *keys)
+    
+    @staticmethod
+    def version(feed_id: str = None) -> Tuple:
+        """
+        Cheap fingerprint that changes whenever the feed list (or one feed)
+        changes, for ETags. The list shows ratings, so any feedback changes it too.
+        """
+        conn = Database().get_connection()
+        if feed_id:
+            row = conn.execute('SELECT 1, updated_at FROM feeds WHERE id = ?', (feed_id,)).fetchone()
+        else:
+            row = conn.execute('''
+                SELECT count(*), max(created_at),
+                       (SELECT sum(feedback_count) || ':' || sum(rating_sum) || ':' || max(latest_at) FROM feed_ratings)
+                FROM feeds
+            ''').fetchone()
+        conn.close()
+        return tuple(row) if row else (0, None)
+    
+    @staticmethod
+    def get(feed_id: str) -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM feeds WHERE id = ?', (feed_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
 
+@instrument_methods(DB_OPERATION_SECONDS)
 class Article:
     @staticmethod
     def create(feed_id: str, title: str, abstract: str = "", url: str = "", 
                authors: List[str] = None, source_type: str = "test") -> str:
-        article_id = str(uuid.uuid4())
-        authors = authors or []
+        return Article.bulk_create(feed_id, [{
+            "title": title,
+            "abstract": abstract,
+            "url": url,
+            "authors": authors or [],
+            "source_type": source_type
+        }])[0]
+    
+    @staticmethod
+    def bulk_create(feed_id: str, articles: List[Dict]) -> List[str]:
+        """
+        Upsert a batch of articles in one transaction with a single executemany.
+        Each dict takes the same fields as create() plus an optional published_date.
+        An article whose normalised URL/source ID or title fingerprint matches
+        one the feed already has (or an earlier one in the batch) is not stored
+        again; it resolves to the existing ID. Returns IDs in input order,
+        without repeats.
+        """
+        article_ids = []
+        new_rows = []
+        indexed = []
+        batch_keys = {}
+        
+        with Database().transaction() as conn:
+            for article in articles:
+                url_key = normalize_url(article.get("url"))
+                title_key = title_fingerprint(article["title"])
+                
+                article_id = batch_keys.get(('url', url_key)) or batch_keys.get(('title', title_key))
+                if article_id is None and (url_key or title_key):
+                    row = conn.execute('''
+                        SELECT id FROM articles
+                        WHERE feed_id = ? AND (url_key = ? OR title_key = ?)
+                        LIMIT 1
+                    ''', (feed_id, url_key, title_key)).fetchone()
+                    article_id = row['id'] if row else None
+                
+                if article_id is None:
+                    article_id = str(uuid.uuid4())
+                    indexed.append((article["title"], article.get("abstract", ""), article_id))
+                    new_rows.append((
+                        article_id,
+                        feed_id,
+                        article["title"],
+                        compress_text(article.get("abstract", "")),
+                        article.get("url", ""),
+                        encode_authors(article.get("authors")),
+                        article.get("published_date", ""),
+                        article.get("source_type", "test"),
+                        url_key,
+                        title_key
+                    ))
+                
+                for key in (('url', url_key), ('title', title_key)):
+                    if key[1]:
+                        batch_keys.setdefault(key, article_id)
+                if article_id not in article_ids:
+                    article_ids.append(article_id)
+            
+            if new_rows:
+                conn.executemany('''
+                    INSERT INTO articles (id, feed_id, title, abstract, url, authors, published_date,
+                                          source_type, url_key, title_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', new_rows)
+                conn.executemany('''
+                    INSERT INTO articles_fts (rowid, title, abstract) SELECT rowid, ?, ? FROM articles WHERE id = ?
+                ''', indexed)
         
+        return article_ids
+    
+    @staticmethod
+    def list_by_feed(feed_id: str, limit: int = 20, cursor: str = None) -> Dict:
+        """
+        One page of a feed's articles, most recently fetched first, without abstracts or embeddings.
+        Returns {"items": [...], "next_cursor": cursor for the following page or None}.
+        """
+        after = decode_cursor(cursor, 2)
         conn = Database().get_connection()
-        conn.execute('''
-            INSERT INTO articles (id, feed_id, title, abstract, url, authors, source_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (article_id, feed_id, title, abstract, url, json.dumps(authors), source_type))
-        conn.commit()
+        rows = conn.execute(f'''
+            SELECT rowid AS seq, id, title, url, authors, published_date, source_type, fetched_at FROM articles
+            WHERE feed_id = ? {"AND (fetched_at, rowid) < (?, ?)" if after else ""}
+            ORDER BY fetched_at DESC, rowid DESC LIMIT ?
+        ''', (feed_id, *(after or ()), limit + 1)).fetchall()
         conn.close()
-        return article_id
+        page = _page(rows, limit, 'fetched_at', 'seq')
+        for item in page['items']:
+            del item['seq']
+            item['authors'] = decode_authors(item['authors'])
+        return page
+    
+    @staticmethod
+    def version(feed_id: str) -> Tuple:
+        """Cheap fingerprint of a feed's articles (count and newest fetch), for ETags"""
+        conn = Database().get_connection()
+        row = conn.execute(
+            'SELECT count(*), max(fetched_at) FROM articles WHERE feed_id = ?', (feed_id,)
+        ).fetchone()
+        conn.close()
+        return tuple(row)
+    
+    @staticmethod
+    def get_recent_ids(feed_id: str, limit: int = 10) -> List[str]:
+        """IDs of the feed's most recently fetched articles, newest first"""
+        conn = Database().get_connection()
+        rows = conn.execute('''
+            SELECT id FROM articles WHERE feed_id = ? ORDER BY fetched_at DESC, rowid DESC LIMIT ?
+        ''', (feed_id, limit)).fetchall()
+        conn.close()
+        return [row['id'] for row in rows]
+    
+    @staticmethod
+    def get_pending_embeddings(after_rowid: int = 0, limit: int = 1000) -> List[Dict]:
+        """Articles without an embedding, as rowid/id/text dicts in rowid order"""
+        conn = Database().get_connection()
+        rows = conn.execute('''
+            SELECT rowid, id, title, abstract FROM articles
+            WHERE rowid > ? AND embedding IS NULL
+            ORDER BY rowid LIMIT ?
+        ''', (after_rowid, limit)).fetchall()
+        conn.close()
+        return [{
+            "rowid": row['rowid'],
+            "id": row['id'],
+            "text": f"{row['title']}\n\n{decompress_text(row['abstract']) or ''}".strip()
+        } for row in rows]
+    
+    @staticmethod
+    def set_embeddings(embeddings: Dict[str, List[float]]):
+        """Store embeddings for existing articles, keyed by article ID"""
+        with Database().transaction() as conn:
+            conn.executemany(
+                'UPDATE articles SET embedding = ? WHERE id = ?',
+                [(encode_embedding(embedding), article_id) for article_id, embedding in embeddings.items()]
+            )
 
+@instrument_methods(DB_OPERATION_SECONDS)
 class Narrative:
     @staticmethod
     def create(feed_id: str, title: str, content: str, article_ids: List[str]) -> str:
         narrative_id = str(uuid.uuid4())
         
         conn = Database().get_connection()
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO narratives (id, feed_id, title, content, article_ids)
             VALUES (?, ?, ?, ?, ?)
-        ''', (narrative_id, feed_id, title, content, json.dumps(article_ids)))
+        ''', (narrative_id, feed_id, title, compress_text(content), encode_ids(article_ids)))
+        index_for_search(conn, 'narratives', [(cursor.lastrowid, title, content)])
         conn.commit()
         conn.close()
+        _fire("narrative_created", narrative_id=narrative_id, feed_id=feed_id)
         return narrative_id
     
     @staticmethod
-    def get_by_feed(feed_id: str) -> List[Dict]:
+    def list_by_feed(feed_id: str, limit: int = 20, cursor: str = None, sort: str = 'newest') -> Dict:
+        """
+        One page of a feed's narratives: id, title, created_at and their mean
+        rating and rating count, newest first or (sort='rating') best rated
+        first, unrated last. Ratings are looked up in narrative_ratings by key.
+        Returns {"items": [...], "next_cursor": cursor for the following page or None}.
+        """
+        if sort == 'rating':
+            keys = ('rating_key', 'created_at', 'id')
+            columns = ("coalesce(r.mean_rating, 0)", "n.created_at", "n.id")
+        else:
+            keys = ('created_at', 'id')
+            columns = ("n.created_at", "n.id")
+        after = decode_cursor(cursor, len(keys))
         conn = Database().get_connection()
-        rows = conn.execute('''
-            SELECT * FROM narratives WHERE feed_id = ? ORDER BY created_at DESC
-        ''', (feed_id,)).fetchall()
+        rows = conn.execute(f'''
+            SELECT n.id, n.title, n.created_at, r.mean_rating, coalesce(r.rating_count, 0) AS rating_count
+                   {", coalesce(r.mean_rating, 0) AS rating_key" if sort == 'rating' else ""}
+            FROM narratives n LEFT JOIN narrative_ratings r ON r.narrative_id = n.id
+            WHERE n.feed_id = ? {f"AND ({', '.join(columns)}) < ({', '.join('?' * len(keys))})" if after else ""}
+            ORDER BY {", ".join(f"{column} DESC" for column in columns)} LIMIT ?
+        ''', (feed_id, *(after or ()), limit + 1)).fetchall()
         conn.close()
-        return [dict(row) for row in rows]
+        return _page(rows, limit, *keys)
+    
+    @staticmethod
+    def get(narrative_id: str) -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM narratives WHERE id = ?', (narrative_id,)).fetchone()
+        conn.close()
+        return Narrative._decode(row) if row else None
+    
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict:
+        """A stored narrative with its content decompressed and article_ids as a list"""
+        narrative = dict(row)
+        narrative['content'] = decompress_text(narrative['content'])
+        narrative['article_ids'] = decode_ids(narrative['article_ids'])
+        return narrative
+    
+    @staticmethod
+    def version(feed_id: str = None, narrative_id: str = None) -> Tuple:
+        """
+        Cheap fingerprint, for ETags, of a feed's narrative list (count, newest
+        and the feed's feedback aggregate, since the list shows ratings) or of
+        one narrative (narratives don't change once written).
+        """
+        conn = Database().get_connection()
+        if narrative_id:
+            row = conn.execute('SELECT 1, created_at FROM narratives WHERE id = ?', (narrative_id,)).fetchone()
+        else:
+            row = conn.execute('''
+                SELECT count(*), max(created_at),
+                       (SELECT feedback_count || ':' || rating_sum || ':' || latest_at
+                        FROM feed_ratings WHERE feed_id = ?)
+                FROM narratives WHERE feed_id = ?
+            ''', (feed_id, feed_id)).fetchone()
+        conn.close()
+        return tuple(row) if row else (0, None)
+
+@instrument_methods(DB_OPERATION_SECONDS)
+class Feedback:
+    @staticmethod
+    def create(narrative_id: str, notes: str = "", rating: int = None) -> str:
+        feedback_id = str(uuid.uuid4())
+        
+        conn = Database().get_connection()
+        conn.execute('''
+            INSERT INTO feedback (id, narrative_id, notes, rating)
+            VALUES (?, ?, ?, ?)
+        ''', (feedback_id, narrative_id, notes, rating))
+        conn.commit()
+        row = conn.execute('SELECT feed_id FROM narratives WHERE id = ?', (narrative_id,)).fetchone()
+        conn.close()
+        _fire("feedback_created", feedback_id=feedback_id, narrative_id=narrative_id,
+              feed_id=row['feed_id'] if row else None, rating=rating)
+        return feedback_id
 
+@instrument_methods(DB_OPERATION_SECONDS)
+class Rating:
+    """Feedback aggregates, maintained by triggers on the feedback table (see Database._init_ratings)"""
+    
+    @staticmethod
+    def for_narrative(narrative_id: str) -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM narrative_ratings WHERE narrative_id = ?', (narrative_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def for_feed(feed_id: str) -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM feed_ratings WHERE feed_id = ?', (feed_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def rebuild() -> Dict[str, int]:
+        """
+        Recompute both aggregate tables from the feedback table in one
+        transaction, reconciling any drift (e.g. feedback written while the
+        triggers were missing). Returns how many rows of each table were
+        missing, stale or orphaned before the rebuild.
+        """
+        drift = {}
+        with Database().transaction() as conn:
+            for table, select in (("narrative_ratings", _NARRATIVE_RATINGS_SELECT),
+                                  ("feed_ratings", _FEED_RATINGS_SELECT)):
+                expected = select.format(where="")
+                drift[table] = conn.execute(f'''
+                    SELECT (SELECT count(*) FROM (SELECT * FROM {table} EXCEPT SELECT * FROM ({expected})))
+                         + (SELECT count(*) FROM (SELECT * FROM ({expected}) EXCEPT SELECT * FROM {table}))
+                ''').fetchone()[0]
+                conn.execute(f"DELETE FROM {table}")
+                conn.execute(f"INSERT INTO {table} {expected}")
+        return drift
+
+@instrument_methods(DB_OPERATION_SECONDS)
 class MCPEntry:
     @staticmethod
     def create(content_type: str, content_text: str, embedding: List[float] = None, metadata: Dict = None) -> str:
         entry_id = str(uuid.uuid4())
-        embedding_json = json.dumps(embedding) if embedding else None
+        embedding_blob = encode_embedding(embedding) if embedding else None
         metadata_json = json.dumps(metadata) if metadata else None
         
         conn = Database().get_connection()
         conn.execute('''
             INSERT INTO mcp_entries (id, content_type, content_text, embedding, metadata)
             VALUES (?, ?, ?, ?, ?)
-        ''', (entry_id, content_type, content_text, embedding_json, metadata_json))
+        ''', (entry_id, content_type, compress_text(content_text), embedding_blob, metadata_json))
         conn.commit()
         conn.close()
+        
+        _fire("mcp_entry_created", entry_id=entry_id, embedding=embedding)
         return entry_id
+    
+    @staticmethod
+    def set_embeddings(embeddings: Dict[str, List[float]]):
+        """Store embeddings for existing entries, keyed by entry ID"""
+        with Database().transaction() as conn:
+            conn.executemany(
+                'UPDATE mcp_entries SET embedding = ? WHERE id = ?',
+                [(encode_embedding(embedding), entry_id) for entry_id, embedding in embeddings.items()]
+            )
+        _fire("mcp_embeddings_updated", embeddings=embeddings)
+    
+    @staticmethod
+    def get_pending_embeddings(after_rowid: int = 0, limit: int = 1000) -> List[Dict]:
+        """Entries without an embedding, as rowid/id/text dicts in rowid order"""
+        conn = Database().get_connection()
+        rows = conn.execute('''
+            SELECT rowid, id, content_text FROM mcp_entries
+            WHERE rowid > ? AND embedding IS NULL
+            ORDER BY rowid LIMIT ?
+        ''', (after_rowid, limit)).fetchall()
+        conn.close()
+        return [{"rowid": row['rowid'], "id": row['id'], "text": decompress_text(row['content_text'])}
+                for row in rows]
+    
+    @staticmethod
+    def iter_embeddings(batch_size: int = 10000) -> Iterator[Tuple[str, object]]:
+        """Yield (entry_id, stored embedding) for every entry that has one, in rowid order"""
+        conn = Database().get_connection()
+        last_rowid = 0
+        while True:
+            rows = conn.execute('''
+                SELECT rowid, id, embedding FROM mcp_entries
+                WHERE rowid > ? AND embedding IS NOT NULL
+                ORDER BY rowid LIMIT ?
+            ''', (last_rowid, batch_size)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                yield row['id'], row['embedding']
+            last_rowid = rows[-1]['rowid']
+        conn.close()
+    
+    @staticmethod
+    def get_many(entry_ids: List[str]) -> Dict[str, Dict]:
+        if not entry_ids:
+            return {}
+        conn = Database().get_connection()
+        placeholders = ", ".join("?" for _ in entry_ids)
+        rows = conn.execute(f'''
+            SELECT id, content_type, content_text, metadata, created_at
+            FROM mcp_entries WHERE id IN ({placeholders})
+        ''', entry_ids).fetchall()
+        conn.close()
+        return {row['id']: dict(row, content_text=decompress_text(row['content_text'])) for row in rows}
+
+@instrument_methods(DB_OPERATION_SECONDS)
+class SourceWatermark:
+    @staticmethod
+    def get_all(feed_id: str) -> Dict[str, Dict]:
+        """A feed's watermarks keyed by source"""
+        conn = Database().get_connection()
+        rows = conn.execute('''
+            SELECT source, last_published, seen_ids, etag, last_modified
+            FROM source_watermarks WHERE feed_id = ?
+        ''', (feed_id,)).fetchall()
+        conn.close()
+        return {row['source']: {
+            "last_published": row['last_published'],
+            "seen_ids": json.loads(row['seen_ids']) if row['seen_ids'] else [],
+            "etag": row['etag'],
+            "last_modified": row['last_modified']
+        } for row in rows}
+    
+    @staticmethod
+    def save(feed_id: str, source: str, watermark: Dict):
+        conn = Database().get_connection()
+        conn.execute('''
+            INSERT INTO source_watermarks (feed_id, source, last_published, seen_ids, etag, last_modified, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (feed_id, source) DO UPDATE SET
+                last_published = excluded.last_published,
+                seen_ids = excluded.seen_ids,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                updated_at = excluded.updated_at
+        ''', (feed_id, source, watermark.get("last_published"), json.dumps(watermark.get("seen_ids") or []),
+              watermark.get("etag"), watermark.get("last_modified")))
+        conn.commit()
+        conn.close()
+
+@instrument_methods(DB_OPERATION_SECONDS)
+class Job:
+    @staticmethod
+    def create(job_type: str, feed_id: str) -> Dict:
+        """
+        Queue a job for a feed, unless one of the same type is already queued
+        or running for it. Returns the job row with a "created" flag saying
+        whether it is new or the existing in-flight job.
+        """
+        job_id = str(uuid.uuid4())
+        
+        conn = Database().get_connection()
+        try:
+            conn.execute('''
+                INSERT INTO jobs (id, job_type, feed_id, status)
+                VALUES (?, ?, ?, 'queued')
+            ''', (job_id, job_type, feed_id))
+            conn.commit()
+            created = True
+        except sqlite3.IntegrityError:
+            # idx_jobs_active_feed: this feed already has a job in flight
+            conn.rollback()
+            created = False
+        conn.close()
+        
+        if created:
+            _fire("job_updated", job_id=job_id, feed_id=feed_id)
+        
+        job = Job.get(job_id) if created else Job.get_active(job_type, feed_id)
+        if job is None:
+            # The in-flight job finished between our insert and the lookup
+            return Job.create(job_type, feed_id)
+        job["created"] = created
+        return job
+    
+    @staticmethod
+    def get(job_id: str) -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def get_active(job_type: str, feed_id: str) -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('''
+            SELECT * FROM jobs WHERE job_type = ? AND feed_id = ? AND status IN ('queued', 'running')
+        ''', (job_type, feed_id)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def mark_running(job_id: str):
+        conn = Database().get_connection()
+        conn.execute('''
+            UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP WHERE id = ?
+        ''', (job_id,))
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def mark_finished(job_id: str, result_id: str = None, error: str = None):
+        status = "failed" if error else "succeeded"
+        
+        conn = Database().get_connection()
+        conn.execute('''
+            UPDATE jobs SET status = ?, result_id = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (status, result_id, error, job_id))
+        conn.commit()
+        row = conn.execute('SELECT feed_id FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        if row:
+            _fire("job_updated", job_id=job_id, feed_id=row['feed_id'])
+    
+    @staticmethod
+    def fail_stale(max_age_seconds: int) -> int:
+        """
+        Fail unfinished jobs older than max_age_seconds, e.g. ones orphaned
+        when the process running them exited. Returns how many were failed.
+        """
+        conn = Database().get_connection()
+        cursor = conn.execute('''
+            UPDATE jobs SET status = 'failed', error = 'Abandoned: worker stopped before finishing',
+                            finished_at = CURRENT_TIMESTAMP
+            WHERE status IN ('queued', 'running') AND created_at < datetime('now', ?)
+        ''', (f"-{int(max_age_seconds)} seconds",))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount
 
+@instrument_methods(DB_OPERATION_SECONDS)
+class EmbeddingCheckpoint:
+    @staticmethod
+    def get(target: str) -> int:
+        """Last rowid the backfill for target has fully processed (0 if never run)"""
+        conn = Database().get_connection()
+        row = conn.execute('SELECT last_rowid FROM embedding_checkpoints WHERE target = ?', (target,)).fetchone()
+        conn.close()
+        return row['last_rowid'] if row else 0
+    
+    @staticmethod
+    def save(target: str, last_rowid: int):
+        conn = Database().get_connection()
+        conn.execute('''
+            INSERT INTO embedding_checkpoints (target, last_rowid, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (target) DO UPDATE SET last_rowid = excluded.last_rowid, updated_at = excluded.updated_at
+        ''', (target, last_rowid))
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def reset(target: str):
+        EmbeddingCheckpoint.save(target, 0)
+
+# Private-use markers for snippet highlights, swapped for <mark> after HTML-escaping
+_MARK_START, _MARK_END = "\ue000", "\ue001"
+
+def _highlight(text: str) -> str:
+    return html.escape(text or "").replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+@instrument_methods(DB_OPERATION_SECONDS)
+class SynthesisRun:
+    @staticmethod
+    def create(feed_ids: List[str], options: Dict = None) -> str:
+        """Start a run over feed_ids, all pending, in that order"""
+        run_id = str(uuid.uuid4())
+        
+        conn = Database().get_connection()
+        conn.execute('''
+            INSERT INTO synthesis_runs (id, status, options) VALUES (?, 'running', ?)
+        ''', (run_id, json.dumps(options or {})))
+        conn.executemany('''
+            INSERT INTO synthesis_run_feeds (run_id, feed_id, position, status) VALUES (?, ?, ?, 'pending')
+        ''', [(run_id, feed_id, position) for position, feed_id in enumerate(feed_ids)])
+        conn.commit()
+        conn.close()
+        return run_id
+    
+    @staticmethod
+    def get(run_id: str) -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM synthesis_runs WHERE id = ?', (run_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def latest() -> Optional[Dict]:
+        conn = Database().get_connection()
+        row = conn.execute('SELECT * FROM synthesis_runs ORDER BY created_at DESC, rowid DESC LIMIT 1').fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def list_recent(limit: int = 10) -> List[Dict]:
+        """Most recent runs first, each with its feed counts by status"""
+        conn = Database().get_connection()
+        rows = conn.execute('''
+            SELECT r.id, r.status, r.created_at, r.finished_at,
+                   count(f.feed_id) AS feeds,
+                   sum(f.status = 'succeeded') AS succeeded,
+                   sum(f.status = 'failed') AS failed,
+                   sum(f.status = 'pending') AS pending
+            FROM synthesis_runs r LEFT JOIN synthesis_run_feeds f ON f.run_id = r.id
+            GROUP BY r.id ORDER BY r.created_at DESC, r.rowid DESC LIMIT ?
+        ''', (limit,)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    @staticmethod
+    def unfinished_feed_ids(run_id: str) -> List[str]:
+        """Feeds the run has not yet synthesized (pending or failed), in run order"""
+        conn = Database().get_connection()
+        rows = conn.execute('''
+            SELECT feed_id FROM synthesis_run_feeds
+            WHERE run_id = ? AND status != 'succeeded' ORDER BY position
+        ''', (run_id,)).fetchall()
+        conn.close()
+        return [row['feed_id'] for row in rows]
+    
+    @staticmethod
+    def counts(run_id: str) -> Dict[str, int]:
+        """The run's feeds by status"""
+        conn = Database().get_connection()
+        rows = conn.execute('''
+            SELECT status, count(*) AS n FROM synthesis_run_feeds WHERE run_id = ? GROUP BY status
+        ''', (run_id,)).fetchall()
+        conn.close()
+        return {row['status']: row['n'] for row in rows}
+    
+    @staticmethod
+    def record_feed(run_id: str, feed_id: str, seconds: float, narrative_id: str = None, error: str = None):
+        """Record one attempt at a feed: succeeded with narrative_id, or failed with error"""
+        status = "failed" if error else "succeeded"
+        
+        conn = Database().get_connection()
+        conn.execute('''
+            UPDATE synthesis_run_feeds
+            SET status = ?, narrative_id = ?, error = ?, attempts = attempts + 1, seconds = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE run_id = ? AND feed_id = ?
+        ''', (status, narrative_id, error, seconds, run_id, feed_id))
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def set_status(run_id: str, status: str):
+        """running while feeds are being synthesized, then finished or interrupted"""
+        conn = Database().get_connection()
+        conn.execute('''
+            UPDATE synthesis_runs
+            SET status = ?, finished_at = CASE WHEN ? = 'running' THEN NULL ELSE CURRENT_TIMESTAMP END
+            WHERE id = ?
+        ''', (status, status, run_id))
+        conn.commit()
+        conn.close()
+
+@instrument_methods(DB_OPERATION_SECONDS)
+class Search:
+    """
+    Ranked full-text search over the FTS5 indexes. Results are ordered by
+    BM25 with title matches weighted above body matches, and carry an
+    HTML-safe snippet with matched terms wrapped in <mark>. Scoring every
+    match of a very common word is what makes full-text search slow, so
+    only the newest SEARCH_MAX_CANDIDATES matches are ranked, and snippets
+    are built for the returned page alone. The indexes hold no text, so
+    snippets come from indexing that page's text again in a small
+    per-connection table with the same tokenizer.
+    """
+    
+    @staticmethod
+    def rebuild() -> Dict[str, int]:
+        """Reindex every searchable table from scratch (e.g. after rows were written by another SQLite client)"""
+        counts = {}
+        with Database().transaction() as conn:
+            for table in SEARCH_TABLES:
+                conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('delete-all')")
+                _fill_search_index(conn, table)
+                counts[table] = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        return counts
+    
+    @staticmethod
+    def articles(query: str, limit: int = 20, feed_id: str = None) -> List[Dict]:
+        return Search._search('articles', 'abstract', ('id', 'feed_id', 'title', 'url', 'published_date', 'source_type'),
+                              query, limit, feed_id)
+    
+    @staticmethod
+    def narratives(query: str, limit: int = 20, feed_id: str = None) -> List[Dict]:
+        return Search._search('narratives', 'content', ('id', 'feed_id', 'title', 'created_at'),
+                              query, limit, feed_id)
+    
+    @staticmethod
+    def _search(table: str, body_column: str, columns: Tuple[str, ...], query: str, limit: int,
+                feed_id: Optional[str]) -> List[Dict]:
+        match = fts_query(query)
+        if not match:
+            return []
+        fts = f"{table}_fts"
+        feed_join, feed_filter, feed_params = "", "", ()
+        if feed_id:
+            feed_join = f"JOIN {table} f ON f.rowid = {fts}.rowid"
+            feed_filter = "AND f.feed_id = ?"
+            feed_params = (feed_id,)
+        
+        conn = Database().get_connection()
+        # Rowid of the oldest match still ranked (rowids grow with insertion order)
+        cutoff = conn.execute(f'''
+            SELECT {fts}.rowid FROM {fts} {feed_join}
+            WHERE {fts} MATCH ? {feed_filter}
+            ORDER BY {fts}.rowid DESC LIMIT 1 OFFSET ?
+        ''', (match, *feed_params, SEARCH_MAX_CANDIDATES - 1)).fetchone()
+        
+        # Rank first, then look up text for the top rows only
+        rows = conn.execute(f'''
+            WITH top AS (
+                SELECT {fts}.rowid AS rowid, bm25({fts}, 5.0, 1.0) AS score FROM {fts} {feed_join}
+                WHERE {fts} MATCH ? AND {fts}.rowid >= ? {feed_filter}
+                ORDER BY score LIMIT ?
+            )
+            SELECT {", ".join(f"t.{column}" for column in columns)}, t.{body_column} AS body, top.score AS score
+            FROM top JOIN {table} t ON t.rowid = top.rowid
+            ORDER BY top.score
+        ''', (match, cutoff[0] if cutoff else 0, *feed_params, limit)).fetchall()
+        marked = Search._mark(conn, match, [(row['title'], decompress_text(row['body'])) for row in rows])
+        conn.close()
+        
+        results = []
+        for number, row in enumerate(rows):
+            result = dict(row)
+            del result['body']
+            title_html, snippet = marked.get(number, (None, None))
+            result['title_html'] = _highlight(title_html if title_html is not None else row['title'])
+            result['snippet'] = _highlight(snippet)
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def _mark(conn: sqlite3.Connection, match: str, texts: List[Tuple[str, str]]) -> Dict[int, Tuple[str, str]]:
+        """Highlighted title and body snippet of each (title, body), by position, for the rows match matches"""
+        if not texts:
+            return {}
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS temp.search_marks USING fts5(title, body, tokenize='porter unicode61')
+        ''')
+        conn.execute("DELETE FROM temp.search_marks")
+        conn.executemany("INSERT INTO temp.search_marks (rowid, title, body) VALUES (?, ?, ?)",
+                         [(number, title, body) for number, (title, body) in enumerate(texts)])
+        rows = conn.execute('''
+            SELECT rowid, highlight(search_marks, 0, ?, ?), snippet(search_marks, 1, ?, ?, '…', 24)
+            FROM temp.search_marks WHERE search_marks MATCH ?
+        ''', (_MARK_START, _MARK_END, _MARK_START, _MARK_END, match)).fetchall()
+        conn.execute("DELETE FROM temp.search_marks")
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+def _recompress(value):
+    return compress_text(decompress_text(value))
+
+# Columns Storage.compact() re-encodes, each with a function from any stored form to the current one
+_STORAGE_ENCODERS = {
+    "articles": {"abstract": _recompress,
+                 "authors": lambda value: value if value is None else encode_authors(decode_authors(value))},
+    "narratives": {"content": _recompress,
+                   "article_ids": lambda value: value if value is None else encode_ids(decode_ids(value))},
+    "mcp_entries": {"content_text": _recompress},
+}
+
+@instrument_methods(DB_OPERATION_SECONDS)
+class Storage:
+    """
+    Keeps the database file small: re-encodes rows stored before compression
+    (or under another codec), moves old articles out to compressed archives,
+    and hands freed pages back to the filesystem.
+    """
+    
+    @staticmethod
+    def stats() -> Dict:
+        """Size of the database file and its write-ahead log, page usage, and bytes per table and index"""
+        db = Database()
+        conn = db.get_connection()
+        stats = {
+            "file_bytes": os.path.getsize(db.db_path),
+            "wal_bytes": os.path.getsize(db.db_path + "-wal") if os.path.exists(db.db_path + "-wal") else 0,
+            "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+            "pages": conn.execute("PRAGMA page_count").fetchone()[0],
+            "free_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+            "auto_vacuum": ("none", "full", "incremental")[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+        }
+        try:
+            rows = conn.execute("SELECT name, sum(pgsize) AS bytes FROM dbstat GROUP BY name ORDER BY bytes DESC")
+            stats["objects"] = {row['name']: row['bytes'] for row in rows}
+        except sqlite3.OperationalError:
+            # SQLite built without the dbstat table
+            pass
+        conn.close()
+        return stats
+    
+    @staticmethod
+    def compact(batch_size: int = 2000) -> Dict[str, int]:
+        """
+        Re-encode every row the way new rows are written: long text
+        compressed with the current codec, authors joined by
+        AUTHOR_SEPARATOR, article ID lists packed. One transaction per batch,
+        so other writers are never held up for long; safe to interrupt and
+        run again. Returns how many rows of each table were rewritten.
+        """
+        db = Database()
+        rewritten = {}
+        for table, encoders in _STORAGE_ENCODERS.items():
+            columns = list(encoders)
+            rewritten[table] = 0
+            last_rowid = 0
+            while True:
+                conn = db.get_connection()
+                rows = conn.execute(f'''
+                    SELECT rowid, {", ".join(columns)} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?
+                ''', (last_rowid, batch_size)).fetchall()
+                conn.close()
+                if not rows:
+                    break
+                last_rowid = rows[-1]['rowid']
+                updates = []
+                for row in rows:
+                    values = [encoders[column](row[column]) for column in columns]
+                    if values != [row[column] for column in columns]:
+                        updates.append((*values, row['rowid']))
+                if updates:
+                    with db.transaction() as conn:
+                        conn.executemany(f'''
+                            UPDATE {table} SET {", ".join(f"{column} = ?" for column in columns)} WHERE rowid = ?
+                        ''', updates)
+                    rewritten[table] += len(updates)
+        return rewritten
+    
+    @staticmethod
+    def archive_articles(older_than_days: float = None, archive_dir: str = None,
+                         batch_size: int = 2000) -> Dict:
+        """
+        Move articles fetched more than older_than_days ago (default
+        ARTICLE_RETENTION_DAYS) out of the database into a new gzipped NDJSON
+        file in archive_dir (default ARCHIVE_DIR), one decoded article per
+        line. Embeddings are not archived; they can be recomputed. Rows are
+        deleted only once the file is written and synced to disk. Archived
+        articles no longer count as duplicates, and narratives keep listing
+        their IDs. Returns {"archived": count, "path": file or None}.
+        """
+        older_than_days = ARTICLE_RETENTION_DAYS if older_than_days is None else older_than_days
+        if older_than_days <= 0:
+            return {"archived": 0, "path": None}
+        archive_dir = archive_dir or ARCHIVE_DIR
+        db = Database()
+        conn = db.get_connection()
+        cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{older_than_days} days",)).fetchone()[0]
+        conn.close()
+        
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"articles-{datetime.utcnow():%Y%m%dT%H%M%S}.ndjson.gz")
+        archived = array('q')
+        with open(path, 'xb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                last_rowid = 0
+                while True:
+                    conn = db.get_connection()
+                    rows = conn.execute('''
+                        SELECT rowid, id, feed_id, title, abstract, url, authors, published_date, source_type, fetched_at
+                        FROM articles WHERE rowid > ? AND fetched_at < ? ORDER BY rowid LIMIT ?
+                    ''', (last_rowid, cutoff, batch_size)).fetchall()
+                    conn.close()
+                    if not rows:
+                        break
+                    last_rowid = rows[-1]['rowid']
+                    lines = []
+                    for row in rows:
+                        article = dict(row)
+                        archived.append(article.pop('rowid'))
+                        article['abstract'] = decompress_text(article['abstract'])
+                        article['authors'] = decode_authors(article['authors'])
+                        lines.append(json.dumps(article, ensure_ascii=False) + "\n")
+                    archive.write("".join(lines).encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        if not archived:
+            os.remove(path)
+            return {"archived": 0, "path": None}
+        
+        for start in range(0, len(archived), batch_size):
+            batch = archived[start:start + batch_size]
+            with db.transaction() as conn:
+                rows = conn.execute(f'''
+                    SELECT rowid, title, abstract FROM articles WHERE rowid IN ({", ".join("?" for _ in batch)})
+                ''', list(batch)).fetchall()
+                index_for_search(conn, 'articles', [(row['rowid'], row['title'], decompress_text(row['abstract']))
+                                                    for row in rows], delete=True)
+                conn.executemany('DELETE FROM articles WHERE rowid = ?', [(row['rowid'],) for row in rows])
+        # Deletes only add tombstones to the search index; merging its segments drops them and the old entries
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+        logging.getLogger(__name__).info(f"Archived {len(archived)} articles fetched before {cutoff} to {path}")
+        return {"archived": len(archived), "path": path}
+    
+    @staticmethod
+    def vacuum(full: bool = False, max_pages: int = 0) -> Dict[str, int]:
+        """
+        Return free pages to the filesystem with PRAGMA incremental_vacuum (at
+        most max_pages of them, or all with 0) and truncate the write-ahead
+        log. That is enough after deletes, which empty whole pages. Rows that
+        shrank in place (as after compact()) leave their pages part empty,
+        which only a full VACUUM repacks; it rewrites the whole file, as it
+        does once to switch a file created before incremental auto-vacuum.
+        Returns the file size in bytes before and after.
+        """
+        db = Database()
+        before = os.path.getsize(db.db_path)
+        conn = db.get_connection()
+        if full or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            logging.getLogger(__name__).info("Running a full VACUUM, with incremental auto-vacuum from now on")
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        # executescript steps the pragma to completion; execute() would free a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        conn.close()
+        return {"before_bytes": before, "after_bytes": os.path.getsize(db.db_path)}
@@ -0,0 +1,165 @@
+import os
+import time
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Set
+from flask import request, session
+from .db.models import register_hook
+from .metrics import CACHE_EVENTS, gauge
+
+PAGE_CACHE_BYTES = gauge('blackstrap_page_cache_bytes', 'Size of the rendered pages held in the page cache')
+
+# Every live PageCache. Model hooks are registered once for the module and
+# fan out to these, so a cache goes away with its app instead of being
+# kept alive (and kept invalidating) by the hook registry.
+_caches: "weakref.WeakSet[PageCache]" = weakref.WeakSet()
+
+class PageCache:
+    """
+    In-memory LRU of rendered HTML pages, keyed by request path and query.
+    Each entry carries tags naming the data it was rendered from ("feeds",
+    "feed:<id>", "narrative:<id>"); model hooks drop the tagged entries from
+    every live cache when that data changes. Bounded by total size in bytes (PAGE_CACHE_MAX_BYTES),
+    and entries expire after PAGE_CACHE_TTL seconds as a backstop for
+    writes made by other processes, which this cache never hears about.
+    """
+
+    def __init__(self, max_bytes: int = None, ttl_seconds: float = None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get('PAGE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.environ.get('PAGE_CACHE_TTL', 60))
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.tagged: Dict[str, Set[str]] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped by every invalidation, so a page rendered while its data changed isn't stored
+        self.generation = 0
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["expires"] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                CACHE_EVENTS.inc(cache="page", event="misses")
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            CACHE_EVENTS.inc(cache="page", event="hits")
+            return entry["html"]
+
+    def put(self, key: str, html: str, tags: Iterable[str], generation: int = None):
+        """Store a page; with generation, only if nothing was invalidated since that generation was read"""
+        size = len(html.encode("utf-8"))
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = {"html": html, "size": size, "tags": set(tags),
+                                 "expires": time.monotonic() + self.ttl_seconds}
+            self.size += size
+            for tag in self.entries[key]["tags"]:
+                self.tagged.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+                CACHE_EVENTS.inc(cache="page", event="evictions")
+
+    def invalidate(self, tag: str):
+        """Drop every page rendered from data tagged `tag`"""
+        with self._lock:
+            self.generation += 1
+            keys = self.tagged.pop(tag, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            if keys:
+                CACHE_EVENTS.inc(len(keys), cache="page", event="invalidations")
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.tagged.clear()
+            self.size = 0
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry["size"]
+        for tag in entry["tags"]:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def cached(self, tags: Callable[..., Iterable[str]]):
+        """
+        Decorator for a view returning rendered HTML; tags(**view_args) names
+        the data the page shows. Pages with flashed messages pending are
+        neither served from nor stored in the cache, since the messages are
+        part of that one rendering.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                if not self.enabled or request.method != 'GET' or session.get('_flashes'):
+                    return view(**view_args)
+                key = request.full_path
+                html = self.get(key)
+                if html is not None:
+                    return html
+                generation = self.generation
+                rendered = view(**view_args)
+                if isinstance(rendered, str):
+                    self.put(key, rendered, tags(**view_args), generation)
+                return rendered
+            return wrapper
+        return decorator
+
+def _invalidate(*tags: str):
+    """Drop pages tagged with any of tags from every live cache"""
+    for cache in list(_caches):
+        for tag in tags:
+            cache.invalidate(tag)
+
+def _feedback_created(narrative_id: str, feed_id: str = None, **_):
+    # Ratings are shown on the narrative, on its feed's narrative list and on the dashboard
+    _invalidate(f"narrative:{narrative_id}", *([f"feed:{feed_id}"] if feed_id else []), "feeds")
+
+register_hook("feed_created", lambda **_: _invalidate("feeds"))
+register_hook("narrative_created", lambda feed_id, **_: _invalidate(f"feed:{feed_id}"))
+register_hook("feedback_created", _feedback_created)
+register_hook("job_updated", lambda feed_id, **_: _invalidate(f"feed:{feed_id}"))
+PAGE_CACHE_BYTES.set_function(lambda: sum(cache.size for cache in list(_caches)))
@@ -0,0 +1,300 @@
+import os
+import re
+import math
+import logging
+from collections import Counter
+from typing import List, Dict, Tuple
+from ..metrics import counter, histogram, span
+
+# Imported by the first TokenCounter rather than at import time; None until then
+tiktoken = None
+TIKTOKEN_AVAILABLE = None
+
+def _load_tiktoken() -> bool:
+    global tiktoken, TIKTOKEN_AVAILABLE
+    if TIKTOKEN_AVAILABLE is None:
+        try:
+            import tiktoken
+            TIKTOKEN_AVAILABLE = True
+        except ImportError:
+            TIKTOKEN_AVAILABLE = False
+    return TIKTOKEN_AVAILABLE
+
+PROMPT_BUILD_SECONDS = histogram('blackstrap_prompt_build_seconds', 'Time ranking, truncating and assembling prompts',
+                                 ['kind'])
+PROMPT_TOKENS = counter('blackstrap_prompt_tokens_total', 'Tokens in built prompts', ['kind'])
+PROMPT_ARTICLES = counter('blackstrap_prompt_articles_total', 'Articles offered to prompts, by whether they fit',
+                          ['kind', 'outcome'])
+
+# Leaves room in gpt-3.5-turbo's 4k context for the system prompt and a 2000-token completion
+DEFAULT_PROMPT_TOKENS = 2000
+# Abstracts are cut to at most this many tokens, and dropped rather than cut below the minimum
+MAX_ABSTRACT_TOKENS = 400
+MIN_ABSTRACT_TOKENS = 40
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the their this to was were which with
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word terms for relevance scoring, without stopwords"""
+    return [term for term in re.findall(r"\w+", (text or "").lower()) if term not in STOPWORDS]
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of each document against the query terms"""
+    docs = [tokenize(doc) for doc in documents]
+    if not docs:
+        return []
+    avg_len = sum(len(doc) for doc in docs) / len(docs) or 1.0
+    doc_freq = Counter(term for doc in docs for term in set(doc))
+    query_terms = set(tokenize(query))
+
+    scores = []
+    for doc in docs:
+        counts = Counter(doc)
+        score = 0.0
+        for term in query_terms:
+            tf = counts.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_len))
+        scores.append(score)
+    return scores
+
+def cluster_articles(articles: List[Dict], size: int) -> List[List[Dict]]:
+    """
+    Group articles into clusters of at most `size` by shared vocabulary.
+    Greedy: the first unassigned article seeds a cluster, which takes the
+    unassigned articles most similar to it (cosine over term counts).
+    Articles keep their relative order within each cluster.
+    """
+    vectors = []
+    for article in articles:
+        counts = Counter(tokenize(f"{article.get('title') or ''} {article.get('abstract') or ''}"))
+        norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+        vectors.append({term: count / norm for term, count in counts.items()})
+
+    unassigned = list(range(len(articles)))
+    clusters = []
+    while unassigned:
+        seed = vectors[unassigned[0]]
+        rest = sorted(unassigned[1:], key=lambda i: -sum(weight * seed.get(term, 0.0)
+                                                         for term, weight in vectors[i].items()))
+        members = sorted([unassigned[0], *rest[:size - 1]])
+        clusters.append([articles[i] for i in members])
+        taken = set(members)
+        unassigned = [i for i in unassigned if i not in taken]
+    return clusters
+
+class TokenCounter:
+    """
+    Counts tokens with the model's tiktoken encoding, or estimates them at
+    four characters per token when tiktoken isn't installed.
+    """
+
+    def __init__(self, model: str):
+        self.encoding = None
+        if _load_tiktoken():
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, at a word boundary, marking the cut with an ellipsis"""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            cut = self.encoding.decode(self.encoding.encode(text)[:max(max_tokens - 1, 0)])
+        else:
+            cut = text[:max(max_tokens - 1, 0) * 4]
+        if " " in cut:
+            cut = cut.rsplit(" ", 1)[0]
+        return cut.rstrip(" ,;:") + "…"
+
+class PromptBuilder:
+    """
+    Assembles the synthesis prompt within a token budget (SYNTHESIS_PROMPT_TOKENS).
+    Articles are ranked by BM25 relevance to the topic and guidance; the most
+    relevant come first, each abstract is truncated to its share of what is
+    left of the budget, and articles that no longer fit are left out.
+    """
+
+    def __init__(self, model: str, budget: int = None,
+                 max_abstract_tokens: int = MAX_ABSTRACT_TOKENS, min_abstract_tokens: int = MIN_ABSTRACT_TOKENS):
+        self.counter = TokenCounter(model)
+        self.budget = budget or int(os.environ.get('SYNTHESIS_PROMPT_TOKENS', DEFAULT_PROMPT_TOKENS))
+        self.max_abstract_tokens = max_abstract_tokens
+        self.min_abstract_tokens = min_abstract_tokens
+        self.logger = logging.getLogger(__name__)
+
+    def build(self, topic: str, articles: List[Dict], guidance: str = "") -> Dict:
+        """
+        Returns {"prompt": str, "article_ids": ids of the articles included,
+        "report": token counts per section plus included/dropped article counts}.
+        """
+        return self._build_from_articles("synthesis", self._header(topic), self._footer(guidance),
+                                         topic, guidance, articles)
+
+    def fitting(self, topic: str, articles: List[Dict], guidance: str = "") -> int:
+        """How many of articles, taken in order, fit one synthesis prompt with at least a minimal abstract each"""
+        available = self.budget - self.counter.count(self._header(topic)) - self.counter.count(self._footer(guidance))
+        needed = 0
+        for count, part in enumerate(self._article_parts(articles)):
+            needed += self._minimal_tokens(part)
+            if needed > available:
+                return count
+        return len(articles)
+
+    def build_cluster_summary(self, topic: str, articles: List[Dict], guidance: str = "") -> Dict:
+        """Prompt asking for a short summary of one cluster of articles (the map step)"""
+        return self._build_from_articles("cluster summary", self._summary_header(topic), self._summary_footer(guidance),
+                                         topic, guidance, articles)
+
+    def build_from_summaries(self, topic: str, summaries: List[str], guidance: str = "") -> Dict:
+        """Prompt weaving cluster summaries into the final narrative (the reduce step)"""
+        with span(PROMPT_BUILD_SECONDS, "build reduce prompt", kind="reduce"):
+            header = self._reduce_header(topic)
+            footer = self._footer(guidance)
+            available = self.budget - self.counter.count(header) - self.counter.count(footer)
+
+            blocks = []
+            for position, summary in enumerate(summaries):
+                head = f"\n\n--- Theme {position + 1} ---\n"
+                share = available // (len(summaries) - position)
+                block = "".join([head, self.counter.truncate(summary, max(share - self.counter.count(head), 0)), "\n"])
+                available -= self.counter.count(block)
+                blocks.append(block)
+            return self._assemble("reduce", header, blocks, footer, {"summaries_included": len(blocks)})
+
+    def _build_from_articles(self, kind: str, header: str, footer: str, topic: str, guidance: str,
+                             articles: List[Dict]) -> Dict:
+        with span(PROMPT_BUILD_SECONDS, f"build {kind} prompt", kind=kind):
+            fixed_tokens = self.counter.count(header) + self.counter.count(footer)
+            ranked = self.rank(topic, guidance, articles)
+            blocks, included = self._article_blocks(ranked, self.budget - fixed_tokens)
+            built = self._assemble(kind, header, blocks, footer, {
+                "articles_included": len(included),
+                "articles_dropped": len(articles) - len(included),
+            })
+        built["article_ids"] = [article.get("id") for article in included]
+        PROMPT_ARTICLES.inc(len(included), kind=kind, outcome="included")
+        PROMPT_ARTICLES.inc(len(articles) - len(included), kind=kind, outcome="dropped")
+        return built
+
+    def _assemble(self, kind: str, header: str, blocks: List[str], footer: str, counts: Dict) -> Dict:
+        prompt = "".join([header, *blocks, footer])
+        report = {
+            "budget": self.budget,
+            "instructions": self.counter.count(header),
+            "sources": sum(self.counter.count(block) for block in blocks),
+            "guidance": self.counter.count(footer),
+            "total": self.counter.count(prompt),
+            **counts,
+        }
+        PROMPT_TOKENS.inc(report["total"], kind=kind)
+        self.logger.info(f"Built {kind} prompt: {report['total']}/{self.budget} tokens "
+                         f"(instructions {report['instructions']}, sources {report['sources']}, "
+                         f"guidance {report['guidance']}); "
+                         + ", ".join(f"{key.replace('_', ' ')} {value}" for key, value in counts.items()))
+        return {"prompt": prompt, "report": report}
+
+    def rank(self, topic: str, guidance: str, articles: List[Dict]) -> List[Dict]:
+        """Articles by descending relevance; ties keep their original order"""
+        documents = [f"{article.get('title') or ''} {article.get('abstract') or ''}" for article in articles]
+        scores = bm25_scores(f"{topic} {guidance}", documents)
+        order = sorted(range(len(articles)), key=lambda i: -scores[i])
+        return [articles[i] for i in order]
+
+    def _article_parts(self, articles: List[Dict]) -> List[Tuple[str, str, str, int]]:
+        """(head, abstract, tail, tokens in head and tail) for each article, numbered in order"""
+        parts = []
+        for number, article in enumerate(articles, 1):
+            authors_str = ", ".join(article['authors']) if article.get('authors') else "Unknown"
+            head = f"\n\n--- Article {number} ---\nTitle: {article['title']}\nAuthors: {authors_str}\nAbstract: "
+            tail = f"\nURL: {article['url']}\n" if article.get('url') else "\n"
+            parts.append((head, article.get('abstract') or "", tail,
+                          self.counter.count(head) + self.counter.count(tail)))
+        return parts
+
+    def _minimal_tokens(self, part: Tuple[str, str, str, int]) -> int:
+        _, abstract, _, meta_tokens = part
+        return meta_tokens + min(self.min_abstract_tokens, self.counter.count(abstract))
+
+    def _article_blocks(self, ranked: List[Dict], available: int) -> Tuple[List[str], List[Dict]]:
+        parts = self._article_parts(ranked)
+
+        # Keep the most relevant articles that fit with at least a minimal abstract each
+        needed, keep = 0, 0
+        for part in parts:
+            needed += self._minimal_tokens(part)
+            if needed > available:
+                break
+            keep += 1
+
+        blocks = []
+        for position, (head, abstract, tail, meta_tokens) in enumerate(parts[:keep]):
+            # Share what's left evenly among the articles still to place
+            share = available // (keep - position)
+            abstract_budget = min(self.max_abstract_tokens, share - meta_tokens)
+            block = "".join([head, self.counter.truncate(abstract, max(abstract_budget, 0)), tail])
+            available -= self.counter.count(block)
+            blocks.append(block)
+        return blocks, ranked[:keep]
+
+    def _header(self, topic: str) -> str:
+        return f"""You are a contemplative academic synthesizer. Create a thoughtful narrative that weaves together insights from these research articles about {topic}.
+
+Your narrative should:
+- Begin with a compelling title (start with #)
+- Synthesize themes and connections across the articles
+- Highlight practical implications and future directions
+- Be written in a contemplative, readable style that invites deep thinking
+- Include relevant citations and links where appropriate
+- Be substantive but not overwhelming (aim for 800-1200 words)
+
+Articles to synthesize:"""
+
+    def _footer(self, guidance: str) -> str:
+        guidance_text = f"\n\nSynthesis guidance: {guidance}" if guidance else ""
+        return f"""{guidance_text}
+
+Create a narrative that helps readers understand the current state and future possibilities in this field:"""
+
+    def _summary_header(self, topic: str) -> str:
+        return f"""Summarize what these research articles about {topic} contribute, as notes for a longer synthesis.
+
+Your summary should:
+- Name the shared themes, main findings and methods
+- Note where the articles agree, disagree or leave questions open
+- Mention articles by title when attributing a point
+- Be plain prose of about 200 words, without a title
+
+Articles to summarize:"""
+
+    def _summary_footer(self, guidance: str) -> str:
+        guidance_text = f"\n\nThe final synthesis will follow this guidance: {guidance}" if guidance else ""
+        return f"""{guidance_text}
+
+Summary:"""
+
+    def _reduce_header(self, topic: str) -> str:
+        return f"""You are a contemplative academic synthesizer. Create a thoughtful narrative about {topic} that weaves together these summaries, each covering a group of related research articles.
+
+Your narrative should:
+- Begin with a compelling title (start with #)
+- Synthesize themes and connections across the summaries
+- Highlight practical implications and future directions
+- Be written in a contemplative, readable style that invites deep thinking
+- Refer to articles by title where appropriate
+- Be substantive but not overwhelming (aim for 800-1200 words)
+
+Summaries to synthesize:"""
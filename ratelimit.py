@@ -0,0 +1,51 @@
+import time
+import threading
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter: refills at `rate` tokens every
+    `per` seconds and holds at most `capacity` tokens, which bounds bursts.
+    """
+
+    def __init__(self, rate: float, per: float = 60.0, capacity: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.per = per
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if they are available right now"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """
+        Block until tokens are available and take them.
+        Returns False if that would take longer than timeout seconds.
+        Requests larger than the capacity are capped at the capacity.
+        """
+        tokens = min(tokens, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) * self.per / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
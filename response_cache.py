@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Optional
+from ..db.models import Database
+from ..metrics import CACHE_EVENTS
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of LLM completions stored in SQLite.
+    Entries are keyed on a hash of the model, request parameters and messages,
+    expire after a TTL, and are evicted least-recently-used first once the
+    cache grows past its size budget.
+    """
+    
+    def __init__(self, ttl_seconds: int = None, max_bytes: int = None):
+        # LLM_CACHE_TTL=0 disables the cache
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get('LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+        self.db = Database()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+    
+    @staticmethod
+    def make_key(model: str, params: Dict, messages: List[Dict]) -> str:
+        """Stable hash of everything that determines the completion"""
+        payload = json.dumps({"model": model, "params": params, "messages": messages},
+                             sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, cache_key: str) -> Optional[str]:
+        """Return the cached response, or None on a miss or expired entry"""
+        if not self.enabled:
+            return None
+        
+        now = time.time()
+        conn = self.db.get_connection()
+        row = conn.execute(
+            'SELECT response, created_at FROM llm_cache WHERE cache_key = ?', (cache_key,)
+        ).fetchone()
+        
+        if row is None or now - row['created_at'] > self.ttl_seconds:
+            if row is not None:
+                conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (cache_key,))
+                conn.commit()
+            conn.close()
+            self._count('misses')
+            return None
+        
+        conn.execute(
+            'UPDATE llm_cache SET hits = hits + 1, last_accessed = ? WHERE cache_key = ?', (now, cache_key)
+        )
+        conn.commit()
+        conn.close()
+        self._count('hits')
+        return row['response']
+    
+    def put(self, cache_key: str, model: str, response: str):
+        """Store a response, then evict expired and least-recently-used entries over budget"""
+        if not self.enabled:
+            return
+        
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.db.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (cache_key, model, response, size, created_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (cache_key, model, response, size, now, now))
+            self._evict(conn, now)
+    
+    def _evict(self, conn, now: float):
+        expired = conn.execute(
+            'DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl_seconds,)
+        ).rowcount
+        
+        evicted = 0
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            victims = []
+            for row in conn.execute('SELECT cache_key, size FROM llm_cache ORDER BY last_accessed'):
+                victims.append((row['cache_key'],))
+                excess -= row['size']
+                if excess <= 0:
+                    break
+            conn.executemany('DELETE FROM llm_cache WHERE cache_key = ?', victims)
+            evicted = len(victims)
+        
+        if expired or evicted:
+            self._count('evictions', expired + evicted)
+            logging.info(f"LLM cache evicted {expired} expired and {evicted} least-recently-used entries")
+    
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+        CACHE_EVENTS.inc(amount, cache="llm", event=counter)
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus current cache size"""
+        conn = self.db.get_connection()
+        row = conn.execute('SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes FROM llm_cache').fetchone()
+        conn.close()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": row['entries'],
+            "bytes": row['bytes'],
+        }
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache instance, so hit/miss counters cover every synthesis"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = ResponseCache()
+    return _shared_cache
@@ -0,0 +1,167 @@
+import sys
+import time
+import random
+import signal
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Callable
+from .db.models import Feed
+from .ratelimit import TokenBucket
+
+class RefreshScheduler:
+    """
+    Keeps every feed's articles warm by re-seeking each feed on a fixed
+    cadence, independent of synthesis. Each feed's next run is its interval
+    plus or minus `jitter` (a fraction of the interval), so feeds don't all
+    fire together. At most `max_concurrent_feeds` feeds refresh at once.
+    Concurrent requests and request rate per source are bounded by each
+    source adapter's own limits, which every seek in the process shares;
+    source_concurrency and source_rates replace them for this scheduler's
+    refreshes, again shared by every refresh.
+    """
+
+    def __init__(self, interval: float = 900.0, jitter: float = 0.1, max_concurrent_feeds: int = 4,
+                 source_concurrency: Dict[str, int] = None, source_rates: Dict[str, float] = None,
+                 seeker_factory: Callable = None):
+        from .agents.seeker import SeekerAgent
+
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrent_feeds = max_concurrent_feeds
+        self.source_limits = {source: threading.BoundedSemaphore(limit)
+                              for source, limit in (source_concurrency or {}).items()}
+        # Rates are requests per minute
+        self.rate_limiters = {source: TokenBucket(rate, per=60.0)
+                              for source, rate in (source_rates or {}).items()}
+        self.seeker_factory = seeker_factory or SeekerAgent
+        self.next_run: Dict[str, float] = {}
+        self.in_flight = set()
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def _next_delay(self) -> float:
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def due_feeds(self, now: float) -> List[Dict]:
+        """Feeds whose next run has come, skipping ones still refreshing"""
+        due = []
+        for feed_id in Feed.iter_ids():
+            if feed_id not in self.next_run:
+                # First sighting: spread initial runs over the jitter window
+                self.next_run[feed_id] = now + random.uniform(0, self.interval * self.jitter)
+            if self.next_run[feed_id] <= now and feed_id not in self.in_flight:
+                feed = Feed.get(feed_id)
+                if feed:
+                    due.append(feed)
+        return due
+
+    def refresh_feed(self, feed: Dict) -> int:
+        """Seek new articles for one feed; returns how many articles the seek found"""
+        started = time.monotonic()
+        try:
+            seeker = self.seeker_factory(source_limits=self.source_limits, rate_limiters=self.rate_limiters)
+            article_ids = seeker.seek_feed(feed)
+            self.logger.info(f"Refreshed feed {feed['name']!r}: {len(article_ids)} articles "
+                             f"in {time.monotonic() - started:.1f}s")
+            return len(article_ids)
+        except Exception:
+            self.logger.exception(f"Refresh failed for feed {feed['id']}")
+            return 0
+        finally:
+            with self._lock:
+                self.in_flight.discard(feed['id'])
+                self.next_run[feed['id']] = time.time() + self._next_delay()
+
+    def run_once(self, executor: ThreadPoolExecutor = None):
+        """Refresh every feed that is due and wait for those refreshes to finish"""
+        own_executor = executor is None
+        executor = executor or ThreadPoolExecutor(max_workers=self.max_concurrent_feeds, thread_name_prefix="refresh")
+        try:
+            futures = [executor.submit(self.refresh_feed, feed) for feed in self._claim_due()]
+            for future in futures:
+                future.result()
+        finally:
+            if own_executor:
+                executor.shutdown(wait=True)
+
+    def run_forever(self, poll_seconds: float = 5.0):
+        """Poll for due feeds until stop() is called; refreshes overlap across polls"""
+        self.logger.info(f"Refresh scheduler started: every {self.interval:.0f}s ±{self.jitter:.0%}, "
+                         f"{self.max_concurrent_feeds} feeds at a time")
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_feeds, thread_name_prefix="refresh") as executor:
+            while not self.stop_event.is_set():
+                # Only claim what the pool can start now, so due times stay accurate
+                for feed in self._claim_due(limit=self.max_concurrent_feeds):
+                    executor.submit(self.refresh_feed, feed)
+                self.stop_event.wait(poll_seconds)
+        self.logger.info("Refresh scheduler stopped")
+
+    def _claim_due(self, limit: int = None) -> List[Dict]:
+        """Mark due feeds as in flight; with limit, only as many as leave in_flight at or below it"""
+        with self._lock:
+            due = self.due_feeds(time.time())
+            if limit is not None:
+                due = due[:max(0, limit - len(self.in_flight))]
+            for feed in due:
+                self.in_flight.add(feed['id'])
+        return due
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+def parse_pairs(pairs: List[str], cast: Callable) -> Dict:
+    """Turn ["arxiv=2", "scholar=1"] into {"arxiv": 2, "scholar": 1}"""
+    parsed = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        parsed[name.strip()] = cast(value)
+    return parsed
+
+def main(argv: List[str] = None) -> int:
+    """Command-line daemon: python -m app.scheduler [--once] [--stub]"""
+    parser = argparse.ArgumentParser(description="Refresh every feed's articles on a schedule")
+    parser.add_argument("--interval", type=float, default=900.0, help="Seconds between refreshes of a feed")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random spread as a fraction of the interval")
+    parser.add_argument("--feed-concurrency", type=int, default=4, help="Feeds refreshed at once")
+    parser.add_argument("--source-concurrency", nargs="*", default=[], metavar="SOURCE=N",
+                        help="Concurrent requests allowed per source, instead of its adapter's limit")
+    parser.add_argument("--source-rate", nargs="*", default=[], metavar="SOURCE=RPM",
+                        help="Requests per minute allowed per source, instead of its adapter's limit")
+    parser.add_argument("--poll", type=float, default=5.0, help="Seconds between checks for due feeds")
+    parser.add_argument("--once", action="store_true", help="Refresh every feed once and exit")
+    parser.add_argument("--stub", action="store_true", help="Use local stub sources instead of the real APIs")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="Seconds each stub source call takes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    seeker_factory = None
+    if args.stub:
+        from .agents.stubs import StubSeekerAgent
+        seeker_factory = lambda **kwargs: StubSeekerAgent(latency=args.stub_latency, **kwargs)
+
+    scheduler = RefreshScheduler(
+        interval=args.interval,
+        jitter=args.jitter,
+        max_concurrent_feeds=args.feed_concurrency,
+        source_concurrency=parse_pairs(args.source_concurrency, int),
+        source_rates=parse_pairs(args.source_rate, float),
+        seeker_factory=seeker_factory,
+    )
+
+    if args.once:
+        # Make every feed due now
+        scheduler.jitter = 0.0
+        scheduler.run_once()
+        return 0
+
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run_forever(poll_seconds=args.poll)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
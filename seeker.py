@@ -1,222 +1,211 @@
-import requests
 import json
-from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import time
 import logging
+import threading
 
-# Import the real API libraries
-try:
-    from scholarly import scholarly
-    SCHOLARLY_AVAILABLE = True
-except ImportError:
-    SCHOLARLY_AVAILABLE = False
-    
-try:
-    import arxiv
-    ARXIV_AVAILABLE = True
-except ImportError:
-    ARXIV_AVAILABLE = False
-    
-try:
-    import feedparser
-    FEEDPARSER_AVAILABLE = True
-except ImportError:
-    FEEDPARSER_AVAILABLE = False
-
-from ..db.models import Database, Article
+from ..db.models import Database, Article, SourceWatermark
+from ..ratelimit import TokenBucket
+from ..metrics import span, in_context
+from .sources import (SourceAdapter, get_adapter, DEFAULT_SOURCE_TIMEOUT,
+                      SOURCE_FETCH_SECONDS, SOURCE_ARTICLES, SOURCE_FAILURES)
 
 class SeekerAgent:
     """
     The Seeker Agent discovers and gathers articles from various sources.
-    Now with real API integrations for Google Scholar, arXiv, and RSS feeds.
+    Each source type is fetched by its adapter in the sources registry
+    (Google Scholar, arXiv and RSS feeds out of the box).
     """
     
-    def __init__(self):
+    def __init__(self, source_timeouts: Dict[str, float] = None,
+                 source_limits: Dict[str, threading.Semaphore] = None,
+                 rate_limiters: Dict[str, TokenBucket] = None,
+                 adapters: Dict[str, SourceAdapter] = None):
+        """
+        Timeouts, concurrency and rate limits default to what each source's
+        adapter declares. source_timeouts, source_limits and rate_limiters
+        override them per source type, and the limits may be shared between
+        agents to cap concurrent requests and request rate across everything
+        using them. adapters replaces the registered adapters, e.g. with stubs.
+        """
         self.db = Database()
         self.logger = logging.getLogger(__name__)
+        self.source_timeouts = dict(source_timeouts or {})
+        self.source_limits = source_limits or {}
+        self.rate_limiters = rate_limiters or {}
+        self.adapters = adapters
     
-    def seek_articles(self, feed_id: str, topic: str, sources: List[str] = None) -> List[str]:
+    def seek_articles(self, feed_id: str, topic: str, sources: List[str] = None,
+                      rss_urls: List[str] = None, concurrent: bool = True,
+                      incremental: bool = True) -> List[str]:
         """
         Main entry point: seek articles for a given feed topic.
-        Returns list of article IDs that were created.
+        Returns list of article IDs found in this run.
+
+        By default every source (and every RSS feed URL) is fetched at once, so
+        the wall-clock cost is the slowest source rather than the sum of all of
+        them. Sources that fail or exceed their timeout are skipped and the
+        articles from the rest are kept. Pass concurrent=False to walk the
+        sources one after another.
+
+        Each source keeps a per-feed watermark (newest publication date, recently
+        seen article keys, RSS ETag/Last-Modified), so later runs only request and
+        store items that are new since the last one. Pass incremental=False to
+        ignore the watermarks and run the full query.
         """
         sources = sources or ["scholar", "arxiv"]
-        article_ids = []
+        watermarks = SourceWatermark.get_all(feed_id) if incremental else {}
+        tasks = self._build_fetch_tasks(topic, sources, rss_urls or [], watermarks)
         
-        # Try each source and collect articles
-        for source in sources:
-            try:
-                if source == "scholar" and SCHOLARLY_AVAILABLE:
-                    scholar_articles = self.seek_from_scholar(topic, max_results=3)
-                    for article_data in scholar_articles:
-                        article_id = Article.create(
-                            feed_id=feed_id,
-                            title=article_data["title"],
-                            abstract=article_data.get("abstract", ""),
-                            url=article_data.get("url", ""),
-                            authors=article_data.get("authors", []),
-                            source_type="scholar"
-                        )
-                        article_ids.append(article_id)
-                        
-                elif source == "arxiv" and ARXIV_AVAILABLE:
-                    arxiv_articles = self.seek_from_arxiv(topic, max_results=3)
-                    for article_data in arxiv_articles:
-                        article_id = Article.create(
-                            feed_id=feed_id,
-                            title=article_data["title"],
-                            abstract=article_data.get("abstract", ""),
-                            url=article_data.get("url", ""),
-                            authors=article_data.get("authors", []),
-                            source_type="arxiv"
-                        )
-                        article_ids.append(article_id)
-                        
-                elif source == "rss" and FEEDPARSER_AVAILABLE:
-                    # For RSS, we'd need feed URLs - for now use test data
-                    rss_articles = self.seek_from_rss([])
-                    for article_data in rss_articles:
-                        article_id = Article.create(
-                            feed_id=feed_id,
-                            title=article_data["title"],
-                            abstract=article_data.get("abstract", ""),
-                            url=article_data.get("url", ""),
-                            authors=article_data.get("authors", []),
-                            source_type="rss"
-                        )
-                        article_ids.append(article_id)
-                        
-            except Exception as e:
-                self.logger.error(f"Error fetching from {source}: {str(e)}")
-                continue
+        if concurrent:
+            results = self._fetch_concurrently(tasks)
+        else:
+            results = self._fetch_sequentially(tasks)
+        
+        batch = []
+        for source_type, label, articles in results:
+            for article_data in articles:
+                batch.append(dict(article_data, source_type=source_type))
+        
+        # Fallback to test data if no real articles were found and the feed has none stored
+        if not batch and not Article.get_recent_ids(feed_id, limit=1):
+            batch = [dict(article_data, source_type="test")
+                     for article_data in self._generate_test_articles(topic)]
         
-        # Fallback to test data if no real articles were found
-        if not article_ids:
-            test_articles = self._generate_test_articles(topic)
-            for article_data in test_articles:
-                article_id = Article.create(
-                    feed_id=feed_id,
-                    title=article_data["title"],
-                    abstract=article_data["abstract"],
-                    url=article_data.get("url", ""),
-                    authors=article_data.get("authors", []),
-                    source_type="test"
-                )
-                article_ids.append(article_id)
+        # Write the whole batch, and the watermarks of the sources that answered, in one transaction
+        with self.db.transaction():
+            article_ids = Article.bulk_create(feed_id, batch)
+            if incremental:
+                for source_type, label, articles in results:
+                    SourceWatermark.save(feed_id, label, watermarks[label])
         
         return article_ids
     
-    def seek_from_scholar(self, query: str, max_results: int = 10) -> List[Dict]:
-        """
-        Fetch articles from Google Scholar using the scholarly library.
-        """
-        if not SCHOLARLY_AVAILABLE:
-            self.logger.warning("scholarly library not available, using test data")
-            return []
-            
-        articles = []
-        try:
-            # Search for publications
-            search_query = scholarly.search_pubs(query)
-            
-            for i, pub in enumerate(search_query):
-                if i >= max_results:
-                    break
-                    
-                # Rate limiting to be respectful
-                time.sleep(1)
-                
-                # Extract article data
-                article_data = {
-                    "title": pub.get('bib', {}).get('title', 'Unknown Title'),
-                    "abstract": pub.get('bib', {}).get('abstract', ''),
-                    "url": pub.get('pub_url', ''),
-                    "authors": [author for author in pub.get('bib', {}).get('author', [])],
-                    "published_date": pub.get('bib', {}).get('pub_year', '')
-                }
-                articles.append(article_data)
-                
-        except Exception as e:
-            self.logger.error(f"Error fetching from Google Scholar: {str(e)}")
-            
-        return articles
+    def seek_feed(self, feed: Dict, **kwargs) -> List[str]:
+        """seek_articles for a feed row, from the sources and RSS URLs stored on it"""
+        sources = json.loads(feed['sources']) if feed.get('sources') else None
+        rss_urls = json.loads(feed['source_urls']) if feed.get('source_urls') else None
+        return self.seek_articles(feed['id'], feed['topic'], sources, rss_urls=rss_urls, **kwargs)
     
-    def seek_from_arxiv(self, query: str, max_results: int = 10) -> List[Dict]:
-        """
-        Fetch articles from arXiv using the arxiv library.
-        """
-        if not ARXIV_AVAILABLE:
-            self.logger.warning("arxiv library not available, using test data")
-            return []
-            
-        articles = []
-        try:
-            # Search arXiv
-            search = arxiv.Search(
-                query=query,
-                max_results=max_results,
-                sort_by=arxiv.SortCriterion.Relevance
-            )
-            
-            for result in search.results():
-                article_data = {
-                    "title": result.title,
-                    "abstract": result.summary,
-                    "url": str(result.entry_id),
-                    "authors": [author.name for author in result.authors],
-                    "published_date": result.published.strftime('%Y-%m-%d') if result.published else ''
-                }
-                articles.append(article_data)
-                
-        except Exception as e:
-            self.logger.error(f"Error fetching from arXiv: {str(e)}")
-            
-        return articles
+    def _adapter(self, source_type: str) -> Optional[SourceAdapter]:
+        if self.adapters is not None:
+            return self.adapters.get(source_type)
+        return get_adapter(source_type)
+    
+    def _timeout(self, source_type: str) -> float:
+        if source_type in self.source_timeouts:
+            return self.source_timeouts[source_type]
+        adapter = self._adapter(source_type)
+        return adapter.timeout if adapter is not None else DEFAULT_SOURCE_TIMEOUT
     
-    def seek_from_rss(self, feed_urls: List[str]) -> List[Dict]:
+    def _build_fetch_tasks(self, topic: str, sources: List[str], rss_urls: List[str],
+                           watermarks: Dict[str, Dict]) -> List[Tuple[str, str, Callable[[], List[Dict]]]]:
         """
-        Fetch articles from RSS feeds (including Substack).
-        For now, returns test data representing Substack-style articles.
+        Turn the requested sources into (source_type, label, fetch) tasks, each
+        calling the source's adapter. Adapters that fetch per URL (RSS) get a
+        task per feed URL, so slow feeds don't hold up the others, and none
+        when the feed has no URLs. A task's label is also the key of its
+        watermark in watermarks, which the fetch updates in place.
         """
-        if not FEEDPARSER_AVAILABLE:
-            self.logger.warning("feedparser library not available, using test data")
-            return []
-            
-        articles = []
+        tasks = []
+        for source in sources:
+            adapter = self._adapter(source)
+            if adapter is None:
+                self.logger.warning(f"No adapter for source {source!r}, skipping it")
+                continue
+            if adapter.per_url:
+                if not rss_urls:
+                    self.logger.debug(f"No feed URLs configured for {source}, skipping it")
+                targets = [(f"{source}:{feed_url}", feed_url) for feed_url in rss_urls]
+            else:
+                targets = [(source, None)]
+            for label, url in targets:
+                watermark = watermarks.setdefault(label, {})
+                fetch = lambda adapter=adapter, watermark=watermark, url=url: adapter.fetch(topic, watermark, url)
+                tasks.append((source, label, self._timed(source, label, self._guard(source, adapter, fetch))))
+        return tasks
+    
+    def _timed(self, source_type: str, label: str, fetch: Callable[[], List[Dict]]) -> Callable[[], List[Dict]]:
+        """Wrap a fetch so its duration and article count are recorded per source"""
+        def timed_fetch() -> List[Dict]:
+            with span(SOURCE_FETCH_SECONDS, f"fetch {label}", source=source_type):
+                articles = fetch()
+            SOURCE_ARTICLES.inc(len(articles), source=source_type)
+            return articles
         
-        # If no feed URLs provided, return test Substack-style content
-        if not feed_urls:
-            return [
-                {
-                    "title": "The Future of AI Research: A Deep Dive",
-                    "abstract": "An insightful analysis of emerging trends in artificial intelligence research, covering breakthrough methodologies and their real-world implications.",
-                    "url": "https://example.substack.com/p/future-ai-research",
-                    "authors": ["Dr. Sarah Chen"],
-                    "published_date": "2024-01-15"
-                }
-            ]
+        return timed_fetch
+    
+    def _guard(self, source_type: str, adapter: SourceAdapter,
+               fetch: Callable[[], List[Dict]]) -> Callable[[], List[Dict]]:
+        """Wrap a fetch so it first waits for its source's rate budget and a free concurrency slot"""
+        limiter = self.rate_limiters.get(source_type, adapter.rate_limiter)
+        slots = self.source_limits.get(source_type, adapter.slots)
+        if limiter is None and slots is None:
+            return fetch
+        timeout = self._timeout(source_type)
         
-        # Real RSS parsing implementation
-        for feed_url in feed_urls:
+        def guarded_fetch() -> List[Dict]:
+            if limiter is not None and not limiter.acquire(timeout=timeout):
+                raise TimeoutError(f"{source_type} rate budget exhausted")
+            if slots is None:
+                return fetch()
+            if not slots.acquire(timeout=timeout):
+                raise TimeoutError(f"no free {source_type} slot")
             try:
-                feed = feedparser.parse(feed_url)
-                
-                for entry in feed.entries[:5]:  # Limit to 5 per feed
-                    article_data = {
-                        "title": entry.get('title', 'Unknown Title'),
-                        "abstract": entry.get('summary', ''),
-                        "url": entry.get('link', ''),
-                        "authors": [entry.get('author', 'Unknown Author')],
-                        "published_date": entry.get('published', '')
-                    }
-                    articles.append(article_data)
-                    
+                return fetch()
+            finally:
+                slots.release()
+        
+        return guarded_fetch
+    
+    def _fetch_sequentially(self, tasks: List[Tuple[str, str, Callable[[], List[Dict]]]]) -> List[Tuple[str, str, List[Dict]]]:
+        """Run fetch tasks one after another"""
+        results = []
+        for source_type, label, fetch in tasks:
+            try:
+                results.append((source_type, label, fetch()))
             except Exception as e:
-                self.logger.error(f"Error fetching RSS feed {feed_url}: {str(e)}")
+                SOURCE_FAILURES.inc(source=source_type, reason="error")
+                self.logger.error(f"Error fetching from {label}: {str(e)}")
                 continue
-                
-        return articles
+        return results
+    
+    def _fetch_concurrently(self, tasks: List[Tuple[str, str, Callable[[], List[Dict]]]]) -> List[Tuple[str, str, List[Dict]]]:
+        """
+        Run all fetch tasks at once on a thread pool.
+        Every task is measured against its own source timeout from a common start,
+        so the whole call returns once the slowest source finishes or times out.
+        Results keep the order of the tasks.
+        """
+        if not tasks:
+            return []
+        
+        executor = ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="seeker")
+        started = time.monotonic()
+        # in_context keeps each fetch's timings in the caller's trace
+        futures = [(source_type, label, executor.submit(in_context(fetch))) for source_type, label, fetch in tasks]
+        
+        results = []
+        try:
+            for source_type, label, future in futures:
+                deadline = started + self._timeout(source_type)
+                try:
+                    articles = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FuturesTimeoutError:
+                    SOURCE_FAILURES.inc(source=source_type, reason="timeout")
+                    self.logger.warning(f"Timed out fetching from {label}, continuing with partial results")
+                    continue
+                except Exception as e:
+                    SOURCE_FAILURES.inc(source=source_type, reason="error")
+                    self.logger.error(f"Error fetching from {label}: {str(e)}")
+                    continue
+                results.append((source_type, label, articles))
+        finally:
+            # Don't wait for timed-out fetches; their threads finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return results
     
     def _generate_test_articles(self, topic: str) -> List[Dict]:
         """
@@ -0,0 +1,365 @@
+import time
+import logging
+import importlib
+import threading
+from typing import List, Dict, Optional, Tuple
+from ..db.models import normalize_url, title_fingerprint
+from ..ratelimit import TokenBucket
+from ..metrics import counter, histogram
+
+SOURCE_FETCH_SECONDS = histogram('blackstrap_source_fetch_seconds',
+                                 'Time fetching from one source, including rate-limit and slot waits', ['source'])
+SOURCE_ARTICLES = counter('blackstrap_source_articles_total', 'New articles returned by each source', ['source'])
+SOURCE_FAILURES = counter('blackstrap_source_failures_total', 'Source fetches that failed or timed out',
+                          ['source', 'reason'])
+
+# Seconds to wait for a source that doesn't declare its own timeout
+DEFAULT_SOURCE_TIMEOUT = 15.0
+
+# Article keys remembered per source watermark
+SEEN_IDS_LIMIT = 500
+# With a watermark, scan at most this many times the page size looking for new items
+MAX_SCAN_FACTOR = 3
+
+# Sent with every request made through an adapter's session
+USER_AGENT = "Blackstrap/1.0 (research feed reader)"
+
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+
+class SourceAdapter:
+    """
+    One kind of article source. An adapter declares how it may be used (page
+    size, requests per minute, concurrent requests, timeout) and fetches one
+    page of articles new to a watermark. Adapters are shared by every
+    SeekerAgent in the process, so their rate limiter and concurrency slots
+    bound the whole process, and their keep-alive HTTP session is reused by
+    every fetch instead of opening a connection per request.
+
+    Class attributes are the defaults; any of them can be overridden per
+    instance with keyword arguments, e.g. ArxivAdapter(requests_per_minute=None).
+    """
+
+    name: str = None
+    # Module imported on first use and the attribute of it the adapter calls (None for the module itself)
+    library: Optional[Tuple[str, Optional[str]]] = None
+    # Articles asked for per fetch
+    page_size: int = 10
+    # None means unlimited
+    requests_per_minute: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    timeout: float = DEFAULT_SOURCE_TIMEOUT
+    # Fetched once per configured URL (RSS) rather than once per topic
+    per_url: bool = False
+    # Distinct hosts the session keeps connection pools for
+    pool_hosts: int = 4
+
+    def __init__(self, session=None, client=None, **settings):
+        """session replaces the HTTP session and client the library, e.g. with local fakes"""
+        for key, value in settings.items():
+            if not hasattr(type(self), key):
+                raise TypeError(f"{type(self).__name__} has no setting {key!r}")
+            setattr(self, key, value)
+        self.logger = logging.getLogger(__name__)
+        self.rate_limiter = TokenBucket(self.requests_per_minute, per=60.0) if self.requests_per_minute else None
+        self.slots = threading.BoundedSemaphore(self.max_concurrency) if self.max_concurrency else None
+        self._session = session
+        self._client = client
+        self._available = True if client is not None or self.library is None else None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """Import the adapter's library on first use; whether it is installed"""
+        if self._available is None:
+            with self._lock:
+                if self._available is None:
+                    module, attribute = self.library
+                    try:
+                        loaded = importlib.import_module(module)
+                        self._client = getattr(loaded, attribute) if attribute else loaded
+                        self._available = True
+                    except ImportError:
+                        self._available = False
+        return self._available
+
+    @property
+    def client(self):
+        return self._client if self.available() else None
+
+    @property
+    def session(self):
+        """
+        The adapter's requests.Session, created on first use. Its connection
+        pool holds as many connections per host as the adapter allows
+        concurrent requests, so parallel fetches reuse warm connections
+        rather than queueing for one.
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    pool = HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=max(self.max_concurrency or 0, 10))
+                    session.mount("https://", pool)
+                    session.mount("http://", pool)
+                    session.headers["User-Agent"] = USER_AGENT
+                    self._session = session
+        return self._session
+
+    def fetch(self, query: str, watermark: Dict, url: str = None) -> List[Dict]:
+        """
+        Up to page_size articles for query (or from url, for per_url adapters)
+        that watermark hasn't seen, advancing watermark past them.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    @staticmethod
+    def article_key(article_data: Dict) -> Optional[str]:
+        """Identity of an article across runs: its normalised URL, else its title fingerprint"""
+        return normalize_url(article_data.get("url")) or title_fingerprint(article_data.get("title"))
+
+    def is_seen(self, article_data: Dict, seen: set) -> bool:
+        key = self.article_key(article_data)
+        return key is not None and key in seen
+
+    def advance_watermark(self, watermark: Dict, articles: List[Dict]):
+        """
+        Record newly fetched articles in a source's watermark: remember their
+        keys (keeping the most recent SEEN_IDS_LIMIT) and the newest publication date.
+        The internal _published sort key is removed from the articles here.
+        """
+        seen_ids = list(watermark.get("seen_ids") or [])
+        last_published = watermark.get("last_published") or ""
+        for article_data in articles:
+            key = self.article_key(article_data)
+            if key and key not in seen_ids:
+                seen_ids.append(key)
+            published = article_data.pop("_published", None) or article_data.get("published_date") or ""
+            last_published = max(last_published, published)
+        watermark["seen_ids"] = seen_ids[-SEEN_IDS_LIMIT:]
+        watermark["last_published"] = last_published or None
+
+class ScholarAdapter(SourceAdapter):
+    """
+    Google Scholar through the scholarly library, which makes its own HTTP
+    requests, so this adapter has no session of its own. Fetches are paced
+    by the adapter's rate budget alone; the page stays small because Scholar
+    throttles heavy use.
+    """
+
+    name = "scholar"
+    library = ("scholarly", "scholarly")
+    page_size = 3
+    requests_per_minute = 10
+    max_concurrency = 1
+    timeout = 30.0
+
+    def fetch(self, query: str, watermark: Dict, url: str = None) -> List[Dict]:
+        """
+        With a watermark, only publications from the last seen year on are
+        requested and ones already seen are skipped.
+        """
+        scholarly = self.client
+        if scholarly is None:
+            self.logger.warning("scholarly library not available, skipping Google Scholar")
+            return []
+
+        seen = set(watermark.get("seen_ids") or [])
+        last_year = (watermark.get("last_published") or "")[:4]
+
+        articles = []
+        try:
+            if last_year.isdigit():
+                search_query = scholarly.search_pubs(query, year_low=int(last_year))
+            else:
+                search_query = scholarly.search_pubs(query)
+
+            for i, pub in enumerate(search_query):
+                # Stop once we have enough new results, or have paged past plenty of seen ones
+                if len(articles) >= self.page_size or i >= self.page_size * MAX_SCAN_FACTOR:
+                    break
+
+                bib = pub.get('bib', {})
+                article_data = {
+                    "title": bib.get('title', 'Unknown Title'),
+                    "abstract": bib.get('abstract', ''),
+                    "url": pub.get('pub_url', ''),
+                    "authors": [author for author in bib.get('author', [])],
+                    "published_date": str(bib.get('pub_year', ''))
+                }
+                if self.is_seen(article_data, seen):
+                    continue
+                articles.append(article_data)
+
+        except Exception as e:
+            SOURCE_FAILURES.inc(source=self.name, reason="error")
+            self.logger.error(f"Error fetching from Google Scholar: {str(e)}")
+
+        self.advance_watermark(watermark, articles)
+        return articles
+
+class ArxivAdapter(SourceAdapter):
+    """
+    The arXiv API, queried over the adapter's session and parsed with
+    feedparser. arXiv asks clients for no more than one request every three
+    seconds.
+    """
+
+    name = "arxiv"
+    library = ("feedparser", None)
+    page_size = 3
+    requests_per_minute = 20
+    max_concurrency = 2
+    timeout = 20.0
+
+    def fetch(self, query: str, watermark: Dict, url: str = None) -> List[Dict]:
+        """
+        With a watermark, results are requested newest first and reading stops
+        at the first submission older than the last one seen.
+        """
+        feedparser = self.client
+        if feedparser is None:
+            self.logger.warning("feedparser library not available, skipping arXiv")
+            return []
+
+        seen = set(watermark.get("seen_ids") or [])
+        last_published = watermark.get("last_published")
+
+        articles = []
+        try:
+            response = self.session.get(ARXIV_API_URL, timeout=self.timeout, params={
+                "search_query": query,
+                "start": 0,
+                "max_results": self.page_size,
+                "sortBy": "submittedDate" if last_published else "relevance",
+                "sortOrder": "descending",
+            })
+            response.raise_for_status()
+            feed = feedparser.parse(response.content)
+
+            for entry in feed.entries:
+                parsed = entry.get('published_parsed')
+                published = time.strftime('%Y-%m-%dT%H:%M:%S', parsed) if parsed else ''
+                if last_published and published and published < last_published:
+                    break
+
+                article_data = {
+                    # The API wraps long titles and abstracts across lines
+                    "title": " ".join(entry.get('title', '').split()),
+                    "abstract": " ".join(entry.get('summary', '').split()),
+                    "url": entry.get('id', ''),
+                    "authors": [author.get('name') for author in entry.get('authors', [])],
+                    "published_date": published[:10]
+                }
+                if self.is_seen(article_data, seen):
+                    continue
+                article_data["_published"] = published
+                articles.append(article_data)
+
+        except Exception as e:
+            SOURCE_FAILURES.inc(source=self.name, reason="error")
+            self.logger.error(f"Error fetching from arXiv: {str(e)}")
+
+        self.advance_watermark(watermark, articles)
+        return articles
+
+class RSSAdapter(SourceAdapter):
+    """
+    RSS and Atom feeds (including Substack), one fetch per feed URL, over the
+    adapter's session and parsed with feedparser. Feeds live on many hosts,
+    so the session keeps pools for more of them.
+    """
+
+    name = "rss"
+    library = ("feedparser", None)
+    page_size = 5
+    max_concurrency = 8
+    timeout = 10.0
+    per_url = True
+    pool_hosts = 32
+
+    def fetch(self, query: str, watermark: Dict, url: str = None) -> List[Dict]:
+        """
+        The feed is requested with a conditional GET (ETag / Last-Modified), and
+        entries already seen or older than the last run are skipped.
+        """
+        feedparser = self.client
+        if feedparser is None:
+            self.logger.warning(f"feedparser library not available, skipping RSS feed {url}")
+            return []
+
+        seen = set(watermark.get("seen_ids") or [])
+        last_published = watermark.get("last_published")
+
+        headers = {}
+        if watermark.get("etag"):
+            headers["If-None-Match"] = watermark["etag"]
+        if watermark.get("last_modified"):
+            headers["If-Modified-Since"] = watermark["last_modified"]
+
+        articles = []
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                self.logger.info(f"RSS feed {url} not modified since last fetch")
+                return []
+            response.raise_for_status()
+            feed = feedparser.parse(response.content, response_headers={
+                "content-location": url,
+                "content-type": response.headers.get("Content-Type", ""),
+            })
+
+            for entry in feed.entries[:self.page_size]:
+                parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+                published = time.strftime('%Y-%m-%dT%H:%M:%S', parsed) if parsed else ''
+                if last_published and published and published < last_published:
+                    continue
+
+                article_data = {
+                    "title": entry.get('title', 'Unknown Title'),
+                    "abstract": entry.get('summary', ''),
+                    "url": entry.get('link', ''),
+                    "authors": [entry.get('author', 'Unknown Author')],
+                    "published_date": entry.get('published', '')
+                }
+                if self.is_seen(article_data, seen):
+                    continue
+                article_data["_published"] = published
+                articles.append(article_data)
+
+            watermark["etag"] = response.headers.get("ETag") or watermark.get("etag")
+            watermark["last_modified"] = response.headers.get("Last-Modified") or watermark.get("last_modified")
+
+        except Exception as e:
+            SOURCE_FAILURES.inc(source=self.name, reason="error")
+            self.logger.error(f"Error fetching RSS feed {url}: {str(e)}")
+
+        self.advance_watermark(watermark, articles)
+        return articles
+
+# Adapters by source type, as stored in a feed's sources
+_adapters: Dict[str, SourceAdapter] = {}
+_adapters_lock = threading.Lock()
+
+def register_adapter(adapter: SourceAdapter) -> Optional[SourceAdapter]:
+    """Make adapter the one used for its source type; returns the adapter it replaces, if any"""
+    with _adapters_lock:
+        previous = _adapters.get(adapter.name)
+        _adapters[adapter.name] = adapter
+    return previous
+
+def get_adapter(name: str) -> Optional[SourceAdapter]:
+    return _adapters.get(name)
+
+def registered_adapters() -> Dict[str, SourceAdapter]:
+    with _adapters_lock:
+        return dict(_adapters)
+
+for _adapter in (ScholarAdapter(), ArxivAdapter(), RSSAdapter()):
+    register_adapter(_adapter)
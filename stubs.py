@@ -0,0 +1,251 @@
+import time
+import zlib
+import random
+import itertools
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import formatdate
+from types import SimpleNamespace
+from typing import List, Dict, Iterator
+from xml.sax.saxutils import escape
+from .seeker import SeekerAgent
+from .sources import SourceAdapter, ScholarAdapter, ArxivAdapter, RSSAdapter, register_adapter
+
+class StubAdapter(SourceAdapter):
+    """
+    Source adapter that is local and deterministic, for tests, benchmarks and
+    offline scheduler runs. Every fetch sleeps for `latency` seconds (plus up
+    to `latency_jitter`) and then returns `per_call` articles the watermark
+    has not seen yet, so repeated seeks keep finding new items.
+    """
+
+    def __init__(self, name: str, latency: float = 0.1, latency_jitter: float = 0.0, per_call: int = 3,
+                 per_url: bool = False):
+        super().__init__(name=name, page_size=per_call, per_url=per_url)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+
+    def fetch(self, query: str, watermark: Dict, url: str = None) -> List[Dict]:
+        time.sleep(self.latency + random.uniform(0, self.latency_jitter))
+        query = url or query
+        # Continue numbering after the last article this source's watermark has seen
+        seen_ids = watermark.get("seen_ids") or []
+        start = int(seen_ids[-1].rsplit("/", 1)[-1]) + 1 if seen_ids else 0
+        articles = []
+        for n in range(start, start + self.page_size):
+            articles.append({
+                "title": f"{query}: {self.name} study number {n}",
+                "abstract": f"Stub {self.name} abstract {n} discussing {query}, its methods and open questions.",
+                "url": f"https://stub.example/{self.name}/{zlib.crc32(query.encode('utf-8'))}/{n}",
+                "authors": [f"Stub Author {n % 7}", f"Stub Author {(n + 3) % 7}"],
+                "published_date": time.strftime('%Y-%m-%d'),
+            })
+        self.advance_watermark(watermark, articles)
+        return articles
+
+class StubSeekerAgent(SeekerAgent):
+    """SeekerAgent whose scholar, arxiv and rss sources are StubAdapters"""
+
+    def __init__(self, latency: float = 0.1, latency_jitter: float = 0.0, per_call: int = 3, **kwargs):
+        kwargs.setdefault("adapters", {
+            name: StubAdapter(name, latency, latency_jitter, per_call, per_url=(name == "rss"))
+            for name in ("scholar", "arxiv", "rss")
+        })
+        super().__init__(**kwargs)
+
+STUB_NARRATIVE = """# Threads Through the Literature
+
+The articles gathered here circle a shared question from different directions. Some approach it through method, others through consequence, and together they suggest a field still deciding what it values.
+
+What emerges is less a single answer than a set of tensions worth sitting with: between speed and care, between the general and the particular, between what can be measured and what matters."""
+
+class FakeAPIError(Exception):
+    """Error carrying an HTTP status, like the OpenAI library's APIStatusError"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+class FakeOpenAIClient:
+    """
+    Stand-in for the OpenAI client's chat.completions.create, with or without
+    stream=True. Replies with a fixed narrative after `first_token_latency`
+    seconds; streamed replies then arrive word by word, `token_delay` apart.
+    A fraction `error_rate` of calls fail with `error_status` instead.
+    """
+
+    def __init__(self, text: str = None, first_token_latency: float = 0.2, token_delay: float = 0.01,
+                 error_rate: float = 0.0, error_status: int = 429):
+        self.text = text or STUB_NARRATIVE
+        self.first_token_latency = first_token_latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict], stream: bool = False, **params):
+        self.calls += 1
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeAPIError(self.error_status)
+        time.sleep(self.first_token_latency)
+        if stream:
+            return self._stream()
+        words = self.text.split(" ")
+        time.sleep(self.token_delay * len(words))
+        message = SimpleNamespace(content=self.text)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=sum(len(m["content"]) // 4 for m in messages),
+                                  completion_tokens=len(words), total_tokens=0)
+        )
+
+    def _stream(self) -> Iterator[SimpleNamespace]:
+        for i, word in enumerate(self.text.split(" ")):
+            if i:
+                time.sleep(self.token_delay)
+            delta = SimpleNamespace(content=word if i == 0 else " " + word)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+# Words the fake sources build titles and abstracts from, so relevance ranking has something to work with
+FAKE_VOCABULARY = tuple("""
+learning model data network inference attention memory graph language vision robust scaling transfer
+benchmark evaluation bias privacy federated sparse causal reasoning agent policy reward planning
+retrieval compression latency hardware energy theory proof optimisation gradient noise uncertainty
+""".split())
+
+# Article numbers shared by every fake source, so each result is new to the feed's watermarks
+_fake_article_numbers = itertools.count()
+
+def _fake_text(number: int, words: int) -> str:
+    return " ".join(FAKE_VOCABULARY[(number * 7 + i * 13) % len(FAKE_VOCABULARY)] for i in range(words))
+
+def _fake_delay(latency: float, latency_jitter: float):
+    time.sleep(latency + random.uniform(0, latency_jitter))
+
+class FakeScholarly:
+    """
+    Stand-in for scholarly.scholarly. search_pubs yields an endless stream of
+    publication dicts, waiting `latency` seconds (plus up to `latency_jitter`)
+    before each page of ten, as the real library fetches results page by page.
+    """
+
+    def __init__(self, latency: float = 0.1, latency_jitter: float = 0.0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.calls = 0
+
+    def search_pubs(self, query: str, year_low: int = None) -> Iterator[Dict]:
+        self.calls += 1
+        for i in itertools.count():
+            if i % 10 == 0:
+                _fake_delay(self.latency, self.latency_jitter)
+            n = next(_fake_article_numbers)
+            yield {
+                "bib": {
+                    "title": f"{query}: {_fake_text(n, 4)}",
+                    "abstract": f"We study {query}. {_fake_text(n, 60)}",
+                    "author": [f"Fake Author {n % 11}", f"Fake Author {(n + 5) % 11}"],
+                    "pub_year": str(max(year_low or 0, datetime.now().year)),
+                },
+                "pub_url": f"https://scholar.fake.example/pub/{n}",
+            }
+
+class FakeResponse:
+    """The parts of requests.Response the source adapters use"""
+
+    def __init__(self, url: str, content: bytes, status_code: int = 200, headers: Dict = None):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"{self.status_code} error for {self.url}")
+
+class FakeSession:
+    """
+    Stand-in for an adapter's requests.Session: get() waits `latency` seconds
+    (plus up to `latency_jitter`) and answers with the document render(url,
+    params) builds, so the adapter still parses a real feed.
+    """
+
+    def __init__(self, render, latency: float = 0.1, latency_jitter: float = 0.0):
+        self.render = render
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.calls = 0
+
+    def get(self, url: str, params: Dict = None, headers: Dict = None, timeout: float = None) -> FakeResponse:
+        self.calls += 1
+        _fake_delay(self.latency, self.latency_jitter)
+        return FakeResponse(url, self.render(url, params or {}).encode("utf-8"), headers={
+            "Content-Type": "application/xml",
+            "ETag": f'"fake-{self.calls}"',
+            "Last-Modified": formatdate(usegmt=True),
+        })
+
+    def close(self):
+        pass
+
+def fake_arxiv_feed(url: str, params: Dict) -> str:
+    """An arXiv API Atom response with max_results new submissions dated now"""
+    published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    query = params.get("search_query", "")
+    entries = []
+    for _ in range(int(params.get("max_results", 10))):
+        n = next(_fake_article_numbers)
+        entries.append(f"""<entry>
+<id>http://arxiv.fake.example/abs/{n}v1</id>
+<published>{published}</published>
+<updated>{published}</updated>
+<title>{escape(f"{query}: {_fake_text(n, 5)}")}</title>
+<summary>{escape(f"This submission addresses {query}. {_fake_text(n, 80)}")}</summary>
+<author><name>Fake Author {n % 13}</name></author>
+</entry>""")
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n'
+            f'<title>arXiv Query: {escape(query)}</title>\n' + "\n".join(entries) + "\n</feed>\n")
+
+def fake_rss_feed(url: str, params: Dict, entries: int = 5) -> str:
+    """An RSS 2.0 document of `entries` new posts published now"""
+    published = formatdate(usegmt=True)
+    items = []
+    for _ in range(entries):
+        n = next(_fake_article_numbers)
+        items.append(f"""<item>
+<title>{escape(f"Notes on {_fake_text(n, 4)}")}</title>
+<link>{escape(f"{url.rstrip('/')}/p/{n}")}</link>
+<description>{escape(f"An essay from {url}. {_fake_text(n, 50)}")}</description>
+<dc:creator>Fake Writer {n % 5}</dc:creator>
+<pubDate>{published}</pubDate>
+</item>""")
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>\n'
+            f'<title>{escape(url)}</title>\n<link>{escape(url)}</link>\n' + "\n".join(items) + "\n</channel></rss>\n")
+
+@contextmanager
+def install_fake_sources(latency: float = 0.1, latency_jitter: float = 0.0):
+    """
+    Register scholar, arxiv and rss adapters backed by the local fakes above
+    (FakeScholarly in place of the scholarly library, FakeSessions in place
+    of the HTTP sessions) and put the registered adapters back on exit. The
+    fakes have no rate or concurrency limits, so benchmarks measure the
+    pipeline rather than the limits; arxiv and rss still need feedparser.
+    Yields the fakes, e.g. to read their call counts. Affects every
+    SeekerAgent in the process while active.
+    """
+    fakes = SimpleNamespace(scholarly=FakeScholarly(latency, latency_jitter),
+                            arxiv=FakeSession(fake_arxiv_feed, latency, latency_jitter),
+                            rss=FakeSession(fake_rss_feed, latency, latency_jitter))
+    unlimited = dict(requests_per_minute=None, max_concurrency=None)
+    replaced = [register_adapter(adapter) for adapter in (
+        ScholarAdapter(client=fakes.scholarly, **unlimited),
+        ArxivAdapter(session=fakes.arxiv, **unlimited),
+        RSSAdapter(session=fakes.rss, **unlimited),
+    )]
+    try:
+        yield fakes
+    finally:
+        for adapter in replaced:
+            register_adapter(adapter)
@@ -1,146 +1,284 @@
-from openai import OpenAI
-import json
 import os
+import time
 import logging
-from typing import List, Dict, Optional
-from ..db.models import Database, Narrative, Article, MCPEntry
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Iterator, Tuple
+from ..db.models import Database, Feed, Narrative, Article, MCPEntry, decode_authors, decompress_text
+from .response_cache import ResponseCache, get_response_cache
+from .prompt import PromptBuilder, cluster_articles
+from .llm import LLMClient, LLMError, get_llm_client
+from ..metrics import histogram, span, in_context
+
+SYNTHESIS_STAGE_SECONDS = histogram('blackstrap_synthesis_stage_seconds',
+                                    'Time in each stage of narrative synthesis', ['stage'])
+
+SYNTHESIS_MODEL = "gpt-3.5-turbo"
+SYNTHESIS_PARAMS = {"max_tokens": 2000, "temperature": 0.7}
+# Fewest articles a narrative is synthesized from, when the feed has that many
+MIN_SYNTHESIS_ARTICLES = 6
+# Cluster summaries in hierarchical synthesis are short, so the map step stays fast
+SUMMARY_PARAMS = {"max_tokens": 350, "temperature": 0.3}
+SYSTEM_PROMPT = "You are a thoughtful academic writer who creates contemplative, well-structured narratives."
 
 class SynthesizerAgent:
     """
     The Synthesizer Agent takes articles and creates narrative summaries using LLM.
     It also updates the Master Context Profile with new insights.
+    
+    Article sets too large for one prompt are synthesized hierarchically:
+    clusters of up to fan_out articles (SYNTHESIS_FAN_OUT) are summarized in
+    parallel, at most map_concurrency at once (SYNTHESIS_MAP_CONCURRENCY),
+    and the summaries are then woven into the narrative, so latency stays
+    near two sequential completions however many articles there are.
     """
     
-    def __init__(self):
+    def __init__(self, client=None, fan_out: int = None, map_concurrency: int = None,
+                 llm: LLMClient = None, seeker=None):
+        """
+        client replaces the OpenAI client, e.g. with stubs.FakeOpenAIClient;
+        by default the process-wide LLMClient is used (SYNTHESIS_FAKE_LLM=1
+        backs that with the fake for local runs of the web app). llm replaces
+        that LLMClient, e.g. with one holding a batch run's own budgets, and
+        seeker the SeekerAgent used to fetch fresh articles.
+        """
         self.db = Database()
-        # Set up OpenAI client - will use environment variable OPENAI_API_KEY
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise RuntimeError("OPENAI_API_KEY environment variable is required but not set")
-        
-        self.client = OpenAI(api_key=api_key)
-        logging.info("SynthesizerAgent initialized with OpenAI client")
+        self.fan_out = fan_out or int(os.environ.get('SYNTHESIS_FAN_OUT', '20'))
+        self.map_concurrency = map_concurrency or int(os.environ.get('SYNTHESIS_MAP_CONCURRENCY', '10'))
+        if llm is not None:
+            self.llm = llm
+        else:
+            self.llm = LLMClient(client) if client is not None else get_llm_client()
+        self.seeker = seeker
+        self.cache = get_response_cache()
+        logging.info("SynthesizerAgent initialized")
     
-    def synthesize_narrative(self, feed_id: str, topic: str, guidance: str = "") -> str:
+    def synthesize_narrative(self, feed_id: str, topic: str, guidance: str = "", seek: bool = None,
+                             hierarchical: bool = None) -> str:
         """
         Main entry point: synthesize articles into a narrative for a feed.
-        Returns narrative ID.
+        Returns narrative ID. Raises LLMError, saving nothing, if the LLM fails.
+        With seek=False (or SYNTHESIS_SEEK=0, for deployments running the
+        refresh scheduler) no sources are queried and only stored articles are used.
+        hierarchical forces map-reduce synthesis on or off; by default
+        (SYNTHESIS_HIERARCHICAL=auto) it is used when the articles don't fit one prompt.
+        """
+        article_ids, prompt = self._prepare_synthesis(feed_id, topic, guidance, seek, hierarchical)
+        
+        # Generate narrative using OpenAI
+        with span(SYNTHESIS_STAGE_SECONDS, "synthesis generate", stage="generate"):
+            narrative_content = self._generate_with_openai(prompt)
+        
+        return self._save_narrative(feed_id, topic, narrative_content, article_ids)
+    
+    def stream_narrative(self, feed_id: str, topic: str, guidance: str = "", seek: bool = None,
+                         hierarchical: bool = None) -> Iterator[Tuple[str, str]]:
+        """
+        Streaming variant of synthesize_narrative. Yields ("token", text) pairs
+        as the completion arrives, then ("done", narrative_id) once the narrative
+        has been saved. Time to first token, not total generation time, is what
+        the reader waits for. In hierarchical mode only the final step streams.
         """
+        article_ids, prompt = self._prepare_synthesis(feed_id, topic, guidance, seek, hierarchical)
+        
+        parts = []
+        for text in self._stream_with_openai(prompt):
+            parts.append(text)
+            yield "token", text
+        
+        narrative_id = self._save_narrative(feed_id, topic, "".join(parts).strip(), article_ids)
+        yield "done", narrative_id
+    
+    def _prepare_synthesis(self, feed_id: str, topic: str, guidance: str, seek: Optional[bool],
+                           hierarchical: Optional[bool] = None) -> Tuple[List[str], str]:
+        """Gather the feed's articles and build the synthesis prompt"""
         logging.info(f"Starting narrative synthesis for feed {feed_id}, topic: {topic}")
+        if seek is None:
+            seek = os.environ.get('SYNTHESIS_SEEK', '1') != '0'
         
-        # First, use Seeker to get fresh articles
-        from .seeker import SeekerAgent
-        seeker = SeekerAgent()
-        article_ids = seeker.seek_articles(feed_id, topic)
-        logging.info(f"Retrieved {len(article_ids)} articles for synthesis")
+        article_ids = []
+        if seek:
+            # First, use Seeker to get fresh articles
+            from .seeker import SeekerAgent
+            seeker = self.seeker or SeekerAgent()
+            with span(SYNTHESIS_STAGE_SECONDS, "synthesis seek", stage="seek"):
+                # Only the sources (and RSS URLs) the feed was set up with
+                feed = Feed.get(feed_id)
+                if feed:
+                    article_ids = seeker.seek_feed(dict(feed, topic=topic))
+                else:
+                    article_ids = seeker.seek_articles(feed_id, topic)
+            logging.info(f"Retrieved {len(article_ids)} new articles for synthesis")
+        
+        if hierarchical is None:
+            mode = os.environ.get('SYNTHESIS_HIERARCHICAL', 'auto')
+            hierarchical = {'0': False, '1': True}.get(mode)
+        
+        # Seeks are incremental, so top up with the feed's recent articles when little is new.
+        # Unless hierarchical synthesis is off, draw on as many as one round of cluster summaries covers
+        seeked = len(article_ids)
+        wanted = MIN_SYNTHESIS_ARTICLES if hierarchical is False else self.fan_out * self.map_concurrency
+        if len(article_ids) < wanted:
+            for article_id in Article.get_recent_ids(feed_id, limit=wanted * 2):
+                if len(article_ids) >= wanted:
+                    break
+                if article_id not in article_ids:
+                    article_ids.append(article_id)
         
         # Get article content
-        articles = self._get_articles_content(article_ids)
+        with span(SYNTHESIS_STAGE_SECONDS, "synthesis load articles", stage="load_articles"):
+            articles = self._get_articles_content(article_ids)
+        if hierarchical is None and seek:
+            # Auto mode with a seek: stored articles only fill what's left of one prompt, so
+            # map-reduce starts when the fetched articles themselves overflow it
+            fits = PromptBuilder(SYNTHESIS_MODEL).fitting(topic, articles, guidance)
+            articles = articles[:max(fits, seeked)]
         logging.info(f"Loaded content for {len(articles)} articles")
         
-        # Create synthesis prompt
-        prompt = self._create_synthesis_prompt(topic, articles, guidance)
+        # Create synthesis prompt; the narrative cites only the articles that fit the budget
+        built = self._create_synthesis_prompt(topic, articles, guidance)
+        if self._use_hierarchical(hierarchical, articles, built):
+            with span(SYNTHESIS_STAGE_SECONDS, "synthesis map-reduce", stage="map_reduce"):
+                built = self._map_reduce_prompt(topic, articles, guidance) or built
+        return built["article_ids"], built["prompt"]
+    
+    def _use_hierarchical(self, hierarchical: Optional[bool], articles: List[Dict], built: Dict) -> bool:
+        if hierarchical is None:
+            # Automatic: only when the single prompt had to leave articles out
+            hierarchical = built["report"]["articles_dropped"] > 0
+        return hierarchical and len(articles) > 1
+    
+    def _map_reduce_prompt(self, topic: str, articles: List[Dict], guidance: str) -> Optional[Dict]:
+        """
+        Summarize clusters of articles in parallel, then build the final prompt
+        from the summaries. Returns None if every cluster summary failed.
+        """
+        builder = PromptBuilder(SYNTHESIS_MODEL)
+        clusters = cluster_articles(builder.rank(topic, guidance, articles), self.fan_out)
+        started = time.monotonic()
+        logging.info(f"Hierarchical synthesis: {len(articles)} articles in {len(clusters)} clusters")
         
-        # Generate narrative using OpenAI
-        narrative_content = self._generate_with_openai(prompt)
+        def summarize(cluster: List[Dict]) -> Tuple[Optional[str], List[str]]:
+            built = builder.build_cluster_summary(topic, cluster, guidance)
+            try:
+                return self._complete(built["prompt"], SUMMARY_PARAMS), built["article_ids"]
+            except LLMError as e:
+                logging.warning(f"Cluster summary failed, leaving {len(cluster)} articles out: {type(e).__name__}: {str(e)}")
+                return None, []
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(self.map_concurrency, len(clusters))),
+                                thread_name_prefix="synthesis-map") as executor:
+            # Each cluster gets its own copy of the caller's context, so its timings join the caller's trace
+            futures = [executor.submit(in_context(summarize), cluster) for cluster in clusters]
+            results = [result for result in (future.result() for future in futures) if result[0]]
+        logging.info(f"Summarized {len(results)}/{len(clusters)} clusters in {time.monotonic() - started:.1f}s")
+        if not results:
+            return None
         
+        built = builder.build_from_summaries(topic, [summary for summary, _ in results], guidance)
+        built["article_ids"] = [article_id for _, article_ids in results for article_id in article_ids]
+        return built
+    
+    def _save_narrative(self, feed_id: str, topic: str, narrative_content: str, article_ids: List[str]) -> str:
+        """Store the generated narrative and record it in the MCP; returns narrative ID"""
         # Create title from first line of content
         lines = narrative_content.split('\n')
         title = lines[0].replace('# ', '').strip() if lines else "Untitled Narrative"
         content = '\n'.join(lines[1:]).strip() if len(lines) > 1 else narrative_content
         
-        # Save narrative
-        narrative_id = Narrative.create(feed_id, title, content, article_ids)
-        logging.info(f"Created narrative {narrative_id} with title: {title}")
-        
-        # Update MCP with new insights
-        self._update_mcp(narrative_content, topic)
+        with span(SYNTHESIS_STAGE_SECONDS, "synthesis save", stage="save"):
+            # Save narrative
+            narrative_id = Narrative.create(feed_id, title, content, article_ids)
+            logging.info(f"Created narrative {narrative_id} with title: {title}")
+            
+            # Update MCP with new insights
+            self._update_mcp(narrative_content, topic)
         
         return narrative_id
     
     def _get_articles_content(self, article_ids: List[str]) -> List[Dict]:
-        """Get full article content for synthesis"""
+        """Get full article content for synthesis, in the order of article_ids"""
+        if not article_ids:
+            return []
         conn = self.db.get_connection()
-        articles = []
+        placeholders = ",".join("?" * len(article_ids))
+        rows = conn.execute(
+            f'SELECT id, title, abstract, authors, url FROM articles WHERE id IN ({placeholders})',
+            article_ids
+        ).fetchall()
+        conn.close()
         
+        by_id = {row['id']: row for row in rows}
+        articles = []
         for article_id in article_ids:
-            row = conn.execute(
-                'SELECT title, abstract, authors, url FROM articles WHERE id = ?',
-                (article_id,)
-            ).fetchone()
-            
+            row = by_id.get(article_id)
             if row:
                 articles.append({
+                    'id': row['id'],
                     'title': row['title'],
-                    'abstract': row['abstract'],
-                    'authors': json.loads(row['authors']) if row['authors'] else [],
+                    'abstract': decompress_text(row['abstract']),
+                    'authors': decode_authors(row['authors']),
                     'url': row['url']
                 })
-        
-        conn.close()
         return articles
     
-    def _create_synthesis_prompt(self, topic: str, articles: List[Dict], guidance: str) -> str:
-        """Create the synthesis prompt for OpenAI"""
-        articles_text = ""
-        for i, article in enumerate(articles, 1):
-            authors_str = ", ".join(article['authors']) if article['authors'] else "Unknown"
-            articles_text += f"\n\n--- Article {i} ---\n"
-            articles_text += f"Title: {article['title']}\n"
-            articles_text += f"Authors: {authors_str}\n"
-            articles_text += f"Abstract: {article['abstract']}\n"
-            if article['url']:
-                articles_text += f"URL: {article['url']}\n"
-        
-        guidance_text = f"\n\nSynthesis guidance: {guidance}" if guidance else ""
-        
-        return f"""You are a contemplative academic synthesizer. Create a thoughtful narrative that weaves together insights from these research articles about {topic}.
-
-Your narrative should:
-- Begin with a compelling title (start with #)
-- Synthesize themes and connections across the articles
-- Highlight practical implications and future directions
-- Be written in a contemplative, readable style that invites deep thinking
-- Include relevant citations and links where appropriate
-- Be substantive but not overwhelming (aim for 800-1200 words)
-
-Articles to synthesize:{articles_text}{guidance_text}
-
-Create a narrative that helps readers understand the current state and future possibilities in this field:"""
+    def _create_synthesis_prompt(self, topic: str, articles: List[Dict], guidance: str) -> Dict:
+        """Build the token-budgeted synthesis prompt; see PromptBuilder.build for the result"""
+        return PromptBuilder(SYNTHESIS_MODEL).build(topic, articles, guidance)
+    
+    def _messages(self, prompt: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
     
     def _generate_with_openai(self, prompt: str) -> str:
-        """Generate narrative using OpenAI GPT"""
+        """Generate narrative using OpenAI GPT; raises LLMError"""
+        return self._complete(prompt, SYNTHESIS_PARAMS)
+    
+    def _complete(self, prompt: str, params: Dict) -> str:
+        """One chat completion, reusing a cached response for an identical request; raises LLMError"""
+        messages = self._messages(prompt)
+        cache_key = ResponseCache.make_key(SYNTHESIS_MODEL, params, messages)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logging.info(f"Using cached OpenAI response ({len(cached)} characters)")
+            return cached
+        
         logging.info("Sending request to OpenAI API")
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a thoughtful academic writer who creates contemplative, well-structured narratives."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.7
-            )
-            content = response.choices[0].message.content.strip()
-            logging.info(f"OpenAI API request successful, generated {len(content)} characters")
-            return content
-        except Exception as e:
-            logging.error(f"OpenAI API request failed: {type(e).__name__}: {str(e)}")
-            # Fallback content if OpenAI fails
-            return f"""# Synthesis Pending
-            
-The Synthesizer encountered an issue generating content: {str(e)}
-
-Please check your OpenAI API key configuration. In the meantime, here's a placeholder narrative about the gathered research.
-
-This synthesis would normally weave together insights from the collected articles, highlighting key themes, practical applications, and future research directions in a contemplative format that invites deep reading and reflection.
-
-*Note: Set your OPENAI_API_KEY environment variable to enable full synthesis capabilities.*"""
+        response = self.llm.chat(SYNTHESIS_MODEL, messages, **params)
+        content = (response.choices[0].message.content or "").strip()
+        if not content:
+            raise LLMError("The model returned an empty completion")
+        logging.info(f"OpenAI API request successful, generated {len(content)} characters")
+        self.cache.put(cache_key, SYNTHESIS_MODEL, content)
+        return content
+    
+    def _stream_with_openai(self, prompt: str) -> Iterator[str]:
+        """Yield the completion in pieces as OpenAI streams it (a cached response arrives whole); raises LLMError"""
+        messages = self._messages(prompt)
+        cache_key = ResponseCache.make_key(SYNTHESIS_MODEL, SYNTHESIS_PARAMS, messages)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logging.info(f"Using cached OpenAI response ({len(cached)} characters)")
+            yield cached
+            return
+        
+        logging.info("Sending streaming request to OpenAI API")
+        parts = []
+        for text in self.llm.stream_chat(SYNTHESIS_MODEL, messages, **SYNTHESIS_PARAMS):
+            parts.append(text)
+            yield text
+        
+        content = "".join(parts).strip()
+        if not content:
+            raise LLMError("The model returned an empty completion")
+        logging.info(f"OpenAI streaming request successful, generated {len(content)} characters")
+        self.cache.put(cache_key, SYNTHESIS_MODEL, content)
     
     def _update_mcp(self, narrative_content: str, topic: str):
         """Update Master Context Profile with new insights"""
-        # For now, just store the narrative text
-        # Later we can add embedding generation and more sophisticated context tracking
+        # Store the narrative text; its embedding is backfilled in batches by
+        # the embedding pipeline (python -m app.agents.embeddings)
         MCPEntry.create(
             content_type="narrative",
             content_text=narrative_content,
@@ -0,0 +1,330 @@
+import os
+import json
+import logging
+import threading
+from typing import List, Dict, Optional, Set, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .models import MCPEntry, register_hook
+
+# Grow the vector matrix by this factor when it fills up
+GROWTH_FACTOR = 2
+# Retrain the approximate index once it holds this many times the vectors it was trained on
+RETRAIN_FACTOR = 4
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    """Scale rows to unit length so a dot product is the cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _top_k(scores: "np.ndarray", k: int) -> "np.ndarray":
+    """Indices of the k highest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+class IVFIndex:
+    """
+    Inverted-file approximate index. Vectors are bucketed by their nearest
+    k-means centroid, and a query only scores the vectors in the nprobe
+    buckets closest to it. New vectors are assigned to the existing
+    centroids, so adding rows never requires a full rebuild. Re-adding a
+    row moves it to its new bucket; the old bucket drops it when next read.
+    """
+
+    def __init__(self, nlist: int = None, nprobe: int = 8):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.trained_size = 0
+        self._lists: List[List["np.ndarray"]] = []
+        # Row -> the bucket it currently belongs to (-1 for none), and buckets still listing moved rows
+        self._bucket_of = np.empty(0, dtype=np.int32) if NUMPY_AVAILABLE else None
+        self._stale: Set[int] = set()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: "np.ndarray", iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """Spherical k-means over (a sample of) the normalised vectors, then bucket all of them"""
+        n = len(vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        sample = vectors if n <= sample_size else vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+        self.centroids = centroids
+        self._lists = [[] for _ in range(nlist)]
+        self._bucket_of = np.full(n, -1, dtype=np.int32)
+        self._stale = set()
+        self.trained_size = n
+        self.add(0, vectors)
+
+    def add(self, start_row: int, vectors: "np.ndarray", chunk_size: int = 100000):
+        """Bucket vectors that occupy rows start_row.. of the owning matrix, moving rows already bucketed"""
+        end = start_row + len(vectors)
+        if end > len(self._bucket_of):
+            grown = np.full(max(end, len(self._bucket_of) * GROWTH_FACTOR), -1, dtype=np.int32)
+            grown[:len(self._bucket_of)] = self._bucket_of
+            self._bucket_of = grown
+        for offset in range(0, len(vectors), chunk_size):
+            chunk = vectors[offset:offset + chunk_size]
+            assignment = np.argmax(chunk @ self.centroids.T, axis=1)
+            rows = np.arange(start_row + offset, start_row + offset + len(chunk), dtype=np.int64)
+            previous = self._bucket_of[rows]
+            self._stale.update(previous[(previous >= 0) & (previous != assignment)].tolist())
+            self._bucket_of[rows] = assignment
+            order = np.argsort(assignment, kind="stable")
+            lists, starts = np.unique(assignment[order], return_index=True)
+            for c, members in zip(lists, np.split(rows[order], starts[1:])):
+                self._lists[c].append(members)
+
+    def candidates(self, query: "np.ndarray", nprobe: int = None) -> "np.ndarray":
+        """Rows in the buckets nearest to query"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = _top_k(self.centroids @ query, nprobe)
+        parts = []
+        for c in probes:
+            chunks = self._lists[c]
+            if len(chunks) > 1 or c in self._stale:
+                # Compact the posting list on first read after incremental adds, dropping rows moved elsewhere
+                members = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+                self._lists[c] = chunks = [np.unique(members[self._bucket_of[members] == c])]
+                self._stale.discard(c)
+            if chunks:
+                parts.append(chunks[0])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+class VectorIndex:
+    """
+    Cosine-similarity index over a growable float32 matrix of unit vectors.
+    search() is an exact, vectorised top-k scan; with approximate=True an
+    IVF index narrows the scan to the nearest buckets once there are enough
+    vectors to make that worthwhile.
+    """
+
+    def __init__(self, dim: int = None, approximate: bool = False, nlist: int = None,
+                 nprobe: int = 8, min_train_size: int = 10000):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for vector search")
+        self.dim = dim
+        self.ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._matrix = None
+        self._size = 0
+        self.min_train_size = min_train_size
+        self.ivf = IVFIndex(nlist=nlist, nprobe=nprobe) if approximate else None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> "np.ndarray":
+        """The live (size x dim) block of unit vectors"""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def add(self, ids: List[str], vectors):
+        """Add or replace vectors; ids already in the index are updated in place"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+        vectors = _normalize(vectors)
+
+        with self._lock:
+            new_ids, new_rows = [], []
+            for entry_id, vector in zip(ids, vectors):
+                position = self._positions.get(entry_id)
+                if position is None:
+                    new_ids.append(entry_id)
+                    new_rows.append(vector)
+                else:
+                    self._writable()[position] = vector
+                    if self.ivf is not None and self.ivf.is_trained:
+                        self.ivf.add(position, vector[None, :])
+
+            if new_ids:
+                self._append(new_ids, np.stack(new_rows))
+
+    def _writable(self) -> "np.ndarray":
+        """Make sure the matrix is an in-memory array (it may be a read-only memory map)"""
+        if self._matrix is not None and not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix)
+        return self._matrix
+
+    def _append(self, ids: List[str], vectors: "np.ndarray"):
+        start = self._size
+        needed = start + len(vectors)
+        if self._matrix is None or needed > len(self._matrix) or not self._matrix.flags.writeable:
+            capacity = max(needed, int(len(self._matrix) * GROWTH_FACTOR) if self._matrix is not None else 0, 1024)
+            grown = np.empty((capacity, self.dim), dtype=np.float32)
+            grown[:start] = self.matrix
+            self._matrix = grown
+        self._matrix[start:needed] = vectors
+
+        for offset, entry_id in enumerate(ids):
+            self._positions[entry_id] = start + offset
+        self.ids.extend(ids)
+        self._size = needed
+
+        if self.ivf is not None:
+            if self.ivf.is_trained and self._size < self.ivf.trained_size * RETRAIN_FACTOR:
+                self.ivf.add(start, vectors)
+            elif self._size >= self.min_train_size:
+                self.ivf.train(self.matrix)
+
+    def search(self, query, k: int = 10, nprobe: int = None) -> List[Tuple[str, float]]:
+        """Top-k (id, cosine similarity) pairs, most similar first"""
+        if not self._size:
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32)[None, :])[0]
+
+        with self._lock:
+            if self.ivf is not None and self.ivf.is_trained:
+                rows = self.ivf.candidates(query, nprobe)
+                scores = self._matrix[rows] @ query
+                top = _top_k(scores, k)
+                best, best_scores = rows[top], scores[top]
+            else:
+                scores = self.matrix @ query
+                best = _top_k(scores, k)
+                best_scores = scores[best]
+            return [(self.ids[row], float(score)) for row, score in zip(best, best_scores)]
+
+    def save(self, path: str):
+        """Write the matrix as .npy (memory-mappable) with ids alongside as JSON"""
+        np.save(f"{path}.npy", self.matrix)
+        with open(f"{path}.ids.json", "w") as f:
+            json.dump(self.ids, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs) -> "VectorIndex":
+        """Load a saved index; with mmap=True the matrix is paged in from disk on demand"""
+        matrix = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        with open(f"{path}.ids.json") as f:
+            ids = json.load(f)
+
+        index = cls(dim=matrix.shape[1], **kwargs)
+        index._matrix = matrix
+        index._size = len(ids)
+        index.ids = ids
+        index._positions = {entry_id: position for position, entry_id in enumerate(ids)}
+        if index.ivf is not None and index._size >= index.min_train_size:
+            index.ivf.train(index.matrix)
+        return index
+
+class MCPVectorIndex:
+    """
+    Nearest-neighbour retrieval over the Master Context Profile.
+    Loads every stored embedding once, then stays current through the
+    mcp_entry_created / mcp_embeddings_updated model hooks. The hooks are
+    registered before loading, and embeddings they deliver while a rebuild
+    reads its snapshot are replayed into the rebuilt index before it goes live.
+    """
+
+    def __init__(self, approximate: bool = False, **index_options):
+        self.approximate = approximate
+        self.index_options = index_options
+        self.index = VectorIndex(approximate=approximate, **index_options)
+        self.logger = logging.getLogger(__name__)
+        # Guards the swap to a rebuilt index; _pending collects hook adds while a rebuild runs
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._pending: Optional[List[Tuple[List[str], List]]] = None
+        register_hook("mcp_entry_created", self._on_entry_created)
+        register_hook("mcp_embeddings_updated", self._on_embeddings_updated)
+        self.rebuild()
+
+    def rebuild(self, batch_size: int = 10000):
+        """Reload every embedding from mcp_entries"""
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                fresh = self._load(batch_size)
+                with self._lock:
+                    for ids, vectors in self._pending:
+                        fresh.add(ids, vectors)
+                    self.index = fresh
+            finally:
+                with self._lock:
+                    self._pending = None
+        self.logger.info(f"Loaded {len(fresh)} MCP embeddings into the vector index")
+
+    def _load(self, batch_size: int) -> VectorIndex:
+        fresh = VectorIndex(approximate=self.approximate, **self.index_options)
+        ids, vectors = [], []
+        for entry_id, stored in MCPEntry.iter_embeddings(batch_size):
+            ids.append(entry_id)
+            if isinstance(stored, str):
+                vectors.append(np.asarray(json.loads(stored), dtype=np.float32))
+            else:
+                vectors.append(np.frombuffer(stored, dtype=np.float32))
+            if len(ids) >= batch_size:
+                fresh.add(ids, np.stack(vectors))
+                ids, vectors = [], []
+        if ids:
+            fresh.add(ids, np.stack(vectors))
+        return fresh
+
+    def _add(self, ids: List[str], vectors: List):
+        """Add to the live index, and to the one being rebuilt if a rebuild is reading its snapshot"""
+        with self._lock:
+            self.index.add(ids, vectors)
+            if self._pending is not None:
+                self._pending.append((ids, vectors))
+
+    def _on_entry_created(self, entry_id: str, embedding: Optional[List[float]]):
+        if embedding:
+            self._add([entry_id], [embedding])
+
+    def _on_embeddings_updated(self, embeddings: Dict[str, List[float]]):
+        if embeddings:
+            self._add(list(embeddings.keys()), list(embeddings.values()))
+
+    def search(self, query_embedding: List[float], k: int = 5) -> List[Dict]:
+        """The k MCP entries most similar to query_embedding, with a similarity score"""
+        matches = self.index.search(query_embedding, k)
+        entries = MCPEntry.get_many([entry_id for entry_id, _ in matches])
+        results = []
+        for entry_id, score in matches:
+            if entry_id in entries:
+                results.append(dict(entries[entry_id], score=score))
+        return results
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+def get_mcp_index() -> MCPVectorIndex:
+    """Process-wide MCP index; built on first use (MCP_APPROXIMATE_INDEX=1 enables IVF)"""
+    global _shared_index
+    if _shared_index is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                _shared_index = MCPVectorIndex(approximate=os.environ.get('MCP_APPROXIMATE_INDEX') == '1')
+    return _shared_index